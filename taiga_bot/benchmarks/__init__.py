@@ -0,0 +1,19 @@
+"""
+Benchmarks for the webhook handlers
+
+Run from the taiga_bot directory, e.g. python -m benchmarks.process_webhook
+"""
+import os
+import tempfile
+
+# The handlers read their configuration on import, the benchmarks never reach Discord or Taiga
+for _name, _value in {
+        'DISCORD_TOKEN': 'benchmark',
+        'FORUM_ID': '0',
+        'TAIGA_USERNAME': 'benchmark',
+        'TAIGA_PASSWORD': 'benchmark',
+        'TAIGA_BASE_URL': 'http://taiga.invalid',
+        'SECRET_KEY': 'benchmark',
+        # The handlers open their SQLite stores on import, keep them out of the tree
+        'DATA_DIR': tempfile.mkdtemp(prefix='taigabot-benchmark-')}.items():
+    os.environ.setdefault(_name, _value)
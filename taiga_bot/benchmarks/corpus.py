@@ -0,0 +1,146 @@
+"""
+Realistic Taiga webhook payloads for the benchmarks
+"""
+import copy
+
+# Webhook date, also the time of the description change in the history API
+DATE = '2024-05-20T09:15:00.123Z'
+
+PROJECT = {
+    'id': 3,
+    'name': 'Operations',
+    'permalink': 'https://taiga.example.com/project/operations',
+    'logo_big_url': None,
+}
+
+OWNER = {
+    'id': 10,
+    'full_name': 'Owner Example',
+    'username': 'owner',
+    'permalink': 'https://taiga.example.com/profile/owner',
+    'photo': None,
+}
+
+BY = {
+    'id': 11,
+    'full_name': 'Editor Example',
+    'username': 'editor',
+    'permalink': 'https://taiga.example.com/profile/editor',
+    'photo': 'https://taiga.example.com/media/user/editor.png',
+}
+
+DESCRIPTION = (
+    "#### Summary\n"
+    "The nightly export stops after the first batch when the queue is empty.\n\n"
+    "#### Steps to reproduce\n"
+    "1. Start an export with **no** pending items\n"
+    "2. Wait for the `batch_done` event\n"
+    "3. Check the export log\n\n"
+    "#### Expected\n"
+    "The export finishes and reports *0 items*.\n"
+)
+
+USERSTORY = {
+    'id': 1201,
+    'ref': 87,
+    'subject': 'Export stops after the first batch',
+    'description': DESCRIPTION,
+    'permalink': 'https://taiga.example.com/project/operations/us/87',
+    'project': PROJECT,
+    'owner': OWNER,
+    'assigned_to': {'id': 12, 'full_name': 'Assignee Example'},
+    'assigned_users': [12, 13],
+    'watchers': [10, 12, 14],
+    'status': {'id': 5, 'name': 'In progress', 'slug': 'in-progress', 'color': '#ff9900',
+               'is_closed': False},
+    'milestone': {'id': 4, 'name': 'Sprint 12'},
+    'swimlane': None,
+    'tags': [['backend', None], ['export', '#336699']],
+    'due_date': '2024-06-01',
+    'due_date_reason': '',
+    'is_blocked': False,
+    'blocked_note': '',
+    'client_requirement': False,
+    'team_requirement': False,
+    'has_client_requirement': False,
+    'has_team_requirement': False,
+}
+
+NO_COMMENT = {
+    'comment': '',
+    'comment_html': '',
+    'edit_comment_date': None,
+    'delete_comment_date': None,
+}
+
+
+def webhook(action, change=None, **data):
+    """Build a user story webhook, data overrides fields of the user story"""
+    payload = {
+        'action': action,
+        'type': 'userstory',
+        'by': copy.deepcopy(BY),
+        'date': DATE,
+        'data': {**copy.deepcopy(USERSTORY), **data},
+    }
+    if change is not None:
+        payload['change'] = change
+    return payload
+
+
+def task_webhook(action, **data):
+    """Build a task webhook of the corpus user story, data overrides fields of the task"""
+    return {
+        'action': action,
+        'type': 'task',
+        'by': copy.deepcopy(BY),
+        'date': DATE,
+        'data': {
+            'id': 5301,
+            'ref': 91,
+            'subject': 'Retry the export when the queue is empty',
+            'project': copy.deepcopy(PROJECT),
+            'user_story': {key: USERSTORY[key] for key in ('id', 'ref', 'subject', 'permalink')},
+            'status': {'id': 21, 'name': 'New', 'is_closed': False},
+            'assigned_to': {'id': 12, 'full_name': 'Assignee Example'},
+            'is_blocked': False,
+            **data,
+        },
+    }
+
+
+def change(diff=None, **comment):
+    """Build the change section of a change webhook"""
+    return {**NO_COMMENT, **comment, 'diff': diff or {}}
+
+
+CORPUS = {
+    'create': webhook('create'),
+    'comment': webhook('change', change(
+        comment='Reproduced on staging, the worker exits with code 0.',
+        comment_html='<p>Reproduced on staging, the worker exits with code 0.</p>')),
+    'comment_edit': webhook('change', change(
+        comment='Reproduced on staging and production.',
+        edit_comment_date='2024-05-20T09:16:00.000Z')),
+    'delete': webhook('delete'),
+    'status': webhook('change', change({'status': {'from': 'New', 'to': 'In progress'}})),
+    'swimlane': webhook('change', change({'swimlane': {'from': 'Backlog', 'to': 'Backend'}})),
+    'due_date': webhook('change', change({'due_date': {'from': '2024-05-25', 'to': '2024-06-01'}})),
+    'blocked': webhook('change', change({'is_blocked': {'from': False, 'to': True}}),
+                       is_blocked=True, blocked_note='Waiting for the storage migration'),
+    'description_diff': webhook('change', change(
+        {'description_diff': 'Check the history API for the exact diff'})),
+    'long_description': webhook('create', description=DESCRIPTION * 12),
+    'large_watchers': webhook('change', change({'status': {'from': 'New', 'to': 'Done'}}),
+                              assigned_users=list(range(100, 110)),
+                              watchers=list(range(100, 600))),
+}
+
+# Task webhooks, rolled up into the checklist of their user story instead of a post each
+TASKS = {
+    'task_create': task_webhook('create'),
+    'task_status': task_webhook('change', status={'id': 22, 'name': 'In progress',
+                                                  'is_closed': False}),
+    'task_done': task_webhook('change', status={'id': 23, 'name': 'Done', 'is_closed': True}),
+    'task_delete': task_webhook('delete'),
+}
@@ -0,0 +1,142 @@
+"""
+Benchmark of the webhook ingress path: signature check and payload parsing
+
+Compares the previous respond() steps with handlers.ingress for valid and
+forged webhooks, on the raw functions and through Flask's test client.
+
+Usage:
+    python -m benchmarks.ingress [--iterations N] [--json results.json]
+                                 [--baseline results.json]
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+from unittest import mock
+from flask import Flask, request, abort
+from werkzeug.datastructures import EnvironHeaders
+from handlers.ingress import signature_valid, parse_payload, sign
+from .corpus import CORPUS
+from .process_webhook import measure, report
+
+# SECRET_KEY set by the benchmark package, the secret of the default route
+SECRET = os.environ['SECRET_KEY']
+KEY = SECRET.encode('utf-8')
+
+
+def legacy_ingress(headers, body):
+    """The steps respond() took before: header copy, str round-trip, == and an unconditional parse"""
+    headers = dict(headers)
+    if 'X-Taiga-Webhook-Signature' not in headers:
+        return None
+    signature = headers['X-Taiga-Webhook-Signature']
+    raw_data = body.decode('utf-8')
+    mac = hmac.new(SECRET.encode("utf-8"), msg=raw_data.encode("utf8"), digestmod=hashlib.sha1)
+    valid = mac.hexdigest() == signature
+    payload = json.loads(body)
+    return payload if valid else None
+
+
+def current_ingress(headers, body):
+    """The steps respond() takes now"""
+    signature = headers.get('X-Taiga-Webhook-Signature')
+    if signature is None or not signature_valid(body, signature, KEY):
+        return None
+    return parse_payload(body)
+
+
+def legacy_app():
+    """A Flask app whose webhook view works like respond() did"""
+    app = Flask(__name__)
+
+    @app.route('/webhook', methods=['POST'])
+    def respond():
+        headers = dict(request.headers)
+        if 'X-Taiga-Webhook-Signature' not in headers:
+            abort(401)
+        raw_data = request.get_data().decode('utf-8')
+        mac = hmac.new(SECRET.encode("utf-8"), msg=raw_data.encode("utf8"), digestmod=hashlib.sha1)
+        valid = mac.hexdigest() == headers['X-Taiga-Webhook-Signature']
+        payload = request.json
+        if not valid:
+            abort(401)
+        return '', 202 if payload is not None else 400
+
+    return app
+
+
+def scenarios():
+    """Bodies and headers to run, valid and forged"""
+    cases = {}
+    for name in ('comment', 'long_description', 'large_watchers'):
+        body = json.dumps(CORPUS[name]).encode('utf-8')
+        cases[f'{name}_valid'] = (body, sign(body, KEY))
+    cases['large_watchers_forged'] = (cases['large_watchers_valid'][0], '0' * 40)
+    return cases
+
+
+def environ_headers(signature, body):
+    """Headers as Werkzeug hands them to a view"""
+    return EnvironHeaders({
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'HTTP_HOST': 'localhost',
+        'HTTP_USER_AGENT': 'Taiga webhook',
+        'HTTP_X_TAIGA_WEBHOOK_SIGNATURE': signature,
+    })
+
+
+def run(iterations, warmup):
+    """Benchmark every scenario on the functions and through Flask
+
+    Returns:
+        dict: {'scenario/path': measurements}
+    """
+    # Imported late: the benchmark package sets the configuration main needs
+    import main # pylint: disable=import-outside-toplevel
+    results = {}
+    clients = {'legacy': legacy_app().test_client(), 'current': main.app.test_client()}
+    functions = {'legacy': legacy_ingress, 'current': current_ingress}
+    with mock.patch.object(main.webhook_pipeline, 'submit', return_value=True), \
+         mock.patch.object(main.logger, 'disabled', True):
+        for name, (body, signature) in scenarios().items():
+            headers = environ_headers(signature, body)
+            for path, function in functions.items():
+                results[f'{name}/{path}_function'] = measure(
+                    lambda function=function: function(headers, body), iterations, warmup)
+            request_headers = {'X-Taiga-Webhook-Signature': signature,
+                               'Content-Type': 'application/json'}
+            for path, client in clients.items():
+                results[f'{name}/{path}_request'] = measure(
+                    lambda client=client: client.post(
+                        '/webhook', data=body, headers=request_headers),
+                    max(iterations // 10, 1), warmup)
+    return results
+
+
+def main(argv=None):
+    """Parse arguments, run the benchmarks and report them"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=5000,
+                        help='Timed function calls per benchmark, a tenth of it for requests '
+                             '(default 5000)')
+    parser.add_argument('--warmup', type=int, default=100,
+                        help='Untimed calls before timing (default 100)')
+    parser.add_argument('--json', help='Write the results to this file')
+    parser.add_argument('--baseline', help='Compare against results written by an earlier run')
+    args = parser.parse_args(argv)
+
+    results = run(args.iterations, args.warmup)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)['results']
+    report(results, baseline)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump({'iterations': args.iterations, 'results': results}, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
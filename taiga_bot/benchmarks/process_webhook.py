@@ -0,0 +1,156 @@
+"""
+Microbenchmark of process_webhook, process_webhook_async and build_userstory over the payload corpus
+
+Usage:
+    python -m benchmarks.process_webhook [--iterations N] [--scenario NAME ...]
+                                         [--json results.json] [--baseline results.json]
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+import tracemalloc
+from handlers.data_handler import (
+    process_webhook,
+    process_webhook_async,
+    build_userstory,
+    fetch_userstory_lookups
+)
+from .corpus import CORPUS
+from .stubs import stub_taiga_api
+
+
+def percentile(samples, p):
+    """Get a percentile of sorted samples"""
+    return samples[min(int(len(samples) * p), len(samples) - 1)]
+
+
+def targets(payload, loop):
+    """Functions to time for one payload, each called without arguments
+
+    The async handler, which the bot runs, is driven to completion on loop
+    by each call, so its timings include one pass of the event loop.
+    """
+    lookups = fetch_userstory_lookups(payload)
+    return {
+        'process_webhook': lambda: process_webhook(payload),
+        'process_webhook_async': lambda: loop.run_until_complete(process_webhook_async(payload)),
+        'build_userstory': lambda: build_userstory(payload, lookups),
+    }
+
+
+def measure(call, iterations, warmup):
+    """Time a call and measure its memory allocations
+
+    Returns:
+        dict: Latency percentiles in microseconds, throughput in calls per second,
+            peak and retained bytes per call
+    """
+    for _ in range(warmup):
+        call()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        begin = time.perf_counter_ns()
+        call()
+        latencies.append(time.perf_counter_ns() - begin)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+
+    # Allocations are traced in a separate pass, tracing slows every call down
+    traced = max(iterations // 10, 1)
+    tracemalloc.start()
+    peaks = []
+    retained_before = tracemalloc.get_traced_memory()[0]
+    for _ in range(traced):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        call()
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    retained = tracemalloc.get_traced_memory()[0] - retained_before
+    tracemalloc.stop()
+
+    return {
+        'p50_us': round(percentile(latencies, 0.50) / 1000, 2),
+        'p95_us': round(percentile(latencies, 0.95) / 1000, 2),
+        'p99_us': round(percentile(latencies, 0.99) / 1000, 2),
+        'max_us': round(latencies[-1] / 1000, 2),
+        'calls_per_s': round(iterations / elapsed, 1),
+        'peak_bytes': round(sum(peaks) / len(peaks)),
+        'retained_bytes': round(retained / traced),
+    }
+
+
+def run(scenarios, iterations, warmup):
+    """Benchmark every scenario and target
+
+    Returns:
+        dict: {'scenario/target': measurements}
+    """
+    results = {}
+    loop = asyncio.new_event_loop()
+    try:
+        with stub_taiga_api():
+            for scenario in scenarios:
+                calls = targets(CORPUS[scenario], loop)
+                for target, call in calls.items():
+                    results[f'{scenario}/{target}'] = measure(call, iterations, warmup)
+    finally:
+        loop.close()
+    return results
+
+
+def change(current, previous):
+    """Format the relative change of a measurement"""
+    if not previous:
+        return ''
+    return f'{(current - previous) / previous * 100:+.1f}%'
+
+
+def report(results, baseline=None):
+    """Print a results table, with p50 and throughput changes against a baseline"""
+    baseline = baseline or {}
+    header = (f"{'benchmark':<40}{'p50 us':>10}{'p95 us':>10}{'p99 us':>10}"
+              f"{'max us':>10}{'calls/s':>11}{'peak B':>10}{'kept B':>8}")
+    if baseline:
+        header += f"{'p50 chg':>10}{'calls chg':>11}"
+    print(header)
+    for name, result in results.items():
+        line = (f"{name:<40}{result['p50_us']:>10}{result['p95_us']:>10}"
+                f"{result['p99_us']:>10}{result['max_us']:>10}{result['calls_per_s']:>11}"
+                f"{result['peak_bytes']:>10}{result['retained_bytes']:>8}")
+        if baseline:
+            previous = baseline.get(name, {})
+            line += (f"{change(result['p50_us'], previous.get('p50_us')):>10}"
+                     f"{change(result['calls_per_s'], previous.get('calls_per_s')):>11}")
+        print(line)
+
+
+def main(argv=None):
+    """Parse arguments, run the benchmarks and report them"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=2000,
+                        help='Timed calls per benchmark (default 2000)')
+    parser.add_argument('--warmup', type=int, default=100,
+                        help='Untimed calls before timing (default 100)')
+    parser.add_argument('--scenario', action='append', choices=sorted(CORPUS),
+                        help='Payload to run, repeat for several (default all)')
+    parser.add_argument('--json', help='Write the results to this file')
+    parser.add_argument('--baseline', help='Compare against results written by an earlier run')
+    args = parser.parse_args(argv)
+
+    results = run(args.scenario or list(CORPUS), args.iterations, args.warmup)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)['results']
+    report(results, baseline)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump({'python': sys.version.split()[0], 'iterations': args.iterations,
+                       'results': results}, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+In-process stand-ins for the Taiga API calls made while handling a webhook
+"""
+from contextlib import contextmanager
+from unittest import mock
+from handlers import data_handler, taiga_api_async, project_index as project_index_module
+from handlers.description_store import DescriptionStore
+from handlers.task_digest import TaskBoard
+from handlers.mention_cache import mention_cache
+from handlers.project_index import project_index
+from .corpus import USERSTORY, DESCRIPTION
+
+SWIMLANES = [{'id': 900, 'name': 'Backlog'}, {'id': 901, 'name': 'Backend'}]
+
+
+def get_user_story(user_story_id, retries=3): # pylint: disable=unused-argument
+    """Return the corpus user story"""
+    return {**USERSTORY, 'id': user_story_id, 'swimlane': 900}
+
+
+def get_swimlane(swimlane_id, retries=3): # pylint: disable=unused-argument
+    """Return a swimlane by id"""
+    return next((swimlane for swimlane in SWIMLANES if swimlane['id'] == swimlane_id), None)
+
+
+def get_user(user_id, retries=3): # pylint: disable=unused-argument
+    """Return a user whose bio carries a Discord mention"""
+    return {'id': user_id, 'full_name': f'User {user_id}', 'bio': f'Discord: @user{user_id}'}
+
+
+def get_user_story_history(user_story_id, target_time=None, # pylint: disable=unused-argument
+                           time_threshold_ms=500, limit=5, retries=3):
+    """Return the history entry of a description change"""
+    return {
+        'created_at': target_time,
+        'diff': {'description': [DESCRIPTION, DESCRIPTION + "\n#### Update\nFixed in 2.4.1\n"]},
+    }
+
+
+async def get_user_story_async(user_story_id, retries=3):
+    """Return the corpus user story"""
+    return get_user_story(user_story_id, retries)
+
+
+async def get_swimlane_async(swimlane_id, retries=3):
+    """Return a swimlane by id"""
+    return get_swimlane(swimlane_id, retries)
+
+
+async def get_user_async(user_id, retries=3):
+    """Return a user whose bio carries a Discord mention"""
+    return get_user(user_id, retries)
+
+
+async def get_user_story_history_async(user_story_id, target_time=None,
+                                       time_threshold_ms=500, limit=5, retries=3):
+    """Return the history entry of a description change"""
+    return get_user_story_history(user_story_id, target_time, time_threshold_ms, limit, retries)
+
+
+def list_swimlanes(project_id, retries=3): # pylint: disable=unused-argument
+    """Return the project swimlanes"""
+    return SWIMLANES
+
+
+def list_userstory_statuses(project_id, retries=3): # pylint: disable=unused-argument
+    """Return the project statuses"""
+    return [USERSTORY['status']]
+
+
+def list_memberships(project_id, retries=3): # pylint: disable=unused-argument
+    """Return the project memberships"""
+    return [{'id': user, 'user': user} for user in (10, 11, 12, 13, 14)]
+
+
+def list_user_stories(project_id, retries=3, page_size=100): # pylint: disable=unused-argument
+    """Return the project user stories"""
+    return [{'id': USERSTORY['id'], 'swimlane': 900}]
+
+
+@contextmanager
+def stub_taiga_api():
+    """Replace every Taiga API call of the webhook handlers and reset their caches"""
+    with mock.patch.multiple(
+            data_handler,
+            get_user_story=get_user_story,
+            get_swimlane=get_swimlane,
+            get_user=get_user,
+            get_user_story_history=get_user_story_history,
+            description_store=DescriptionStore(':memory:', max_stories=100),
+            task_board=TaskBoard(':memory:')), \
+         mock.patch.multiple(
+            taiga_api_async,
+            get_user_story=get_user_story_async,
+            get_swimlane=get_swimlane_async,
+            get_user=get_user_async,
+            get_user_story_history=get_user_story_history_async), \
+         mock.patch.multiple(
+            project_index_module,
+            list_swimlanes=list_swimlanes,
+            list_userstory_statuses=list_userstory_statuses,
+            list_memberships=list_memberships,
+            list_user_stories=list_user_stories):
+        project_index._projects.clear() # pylint: disable=protected-access
+        mention_cache._entries.clear() # pylint: disable=protected-access
+        yield
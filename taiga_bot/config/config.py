@@ -1,4 +1,5 @@
 """Configuration for the TaigaBot"""
+import json
 import os
 from typing import Final
 #from dotenv import load_dotenv # pylint: disable=import-error # pyright: ignore[reportMissingImports]
@@ -6,18 +7,73 @@ from typing import Final
 #load_dotenv()
 
 # Discord configuration
-DISCORD_TOKEN: Final[str] = os.environ['DISCORD_TOKEN']
-FORUM_ID: Final[int] = int(os.environ['FORUM_ID'])
+# Not needed by ingress processes, see BOT_ROLE
+DISCORD_TOKEN: Final[str] = os.getenv('DISCORD_TOKEN', '')
+# Forum of projects missing from TAIGA_PROJECTS (optional when TAIGA_PROJECTS is set)
+FORUM_ID: Final[int | None] = int(os.environ['FORUM_ID']) if os.getenv('FORUM_ID') else None
+# Maximum Discord requests running at once, bursts beyond it wait in the scheduler
+DISCORD_MAX_IN_FLIGHT: Final[int] = int(os.getenv('DISCORD_MAX_IN_FLIGHT', '8'))
 
 # Taiga configuration
 TAIGA_USERNAME: Final[str] = os.environ['TAIGA_USERNAME']
 TAIGA_PASSWORD: Final[str] = os.environ['TAIGA_PASSWORD']
 TAIGA_BASE_URL: Final[str] = os.environ['TAIGA_BASE_URL']
+# Project whose metadata is loaded at startup (optional, other projects load on first webhook)
+TAIGA_PROJECT_ID: Final[int | None] = (
+    int(os.environ['TAIGA_PROJECT_ID']) if os.getenv('TAIGA_PROJECT_ID') else None
+)
+# Seconds before token expiry at which the token is refreshed in the background
+TAIGA_TOKEN_REFRESH_MARGIN: Final[int] = int(os.getenv('TAIGA_TOKEN_REFRESH_MARGIN', '300'))
+# HTTP connection pooling for the Taiga REST client
+TAIGA_HTTP_POOL_CONNECTIONS: Final[int] = int(os.getenv('TAIGA_HTTP_POOL_CONNECTIONS', '4'))
+TAIGA_HTTP_POOL_MAXSIZE: Final[int] = int(os.getenv('TAIGA_HTTP_POOL_MAXSIZE', '10'))
+TAIGA_HTTP_KEEP_ALIVE: Final[bool] = os.getenv('TAIGA_HTTP_KEEP_ALIVE', 'true').lower() == 'true'
+# Taiga user to Discord mention cache
+MENTION_CACHE_SIZE: Final[int] = int(os.getenv('MENTION_CACHE_SIZE', '1000'))
+MENTION_CACHE_TTL: Final[float] = float(os.getenv('MENTION_CACHE_TTL', '3600'))
+# User stories whose history entries are cached for description diffs
+HISTORY_CACHE_SIZE: Final[int] = int(os.getenv('HISTORY_CACHE_SIZE', '500'))
+# User stories whose last description is kept to diff description changes locally
+DESCRIPTION_STORE_SIZE: Final[int] = int(os.getenv('DESCRIPTION_STORE_SIZE', '10000'))
 
 
 # Webhook configuration
-SECRET_KEY: Final[str] = os.environ['SECRET_KEY']
+# Secret of webhooks posted to WEBHOOK_ROUTE itself (optional when TAIGA_PROJECTS is set)
+SECRET_KEY: Final[str | None] = os.getenv('SECRET_KEY')
+# Routing table {"<taiga project id>": {"forum_id": <forum channel id>, "secret_key": "<secret>"}},
+# each project posts its webhooks to WEBHOOK_ROUTE/<taiga project id>
+TAIGA_PROJECTS: Final[dict] = json.loads(os.getenv('TAIGA_PROJECTS') or '{}')
 WEBHOOK_ROUTE: Final[str] = os.getenv('WEBHOOK_ROUTE', '/webhook')
+# Webhook bodies above this many bytes are rejected with 413
+WEBHOOK_MAX_BODY_SIZE: Final[int] = int(os.getenv('WEBHOOK_MAX_BODY_SIZE', str(1024 * 1024)))
+# Webhooks are acknowledged immediately and processed by a pool of workers
+WEBHOOK_WORKERS: Final[int] = int(os.getenv('WEBHOOK_WORKERS', '4'))
+WEBHOOK_QUEUE_SIZE: Final[int] = int(os.getenv('WEBHOOK_QUEUE_SIZE', '1000'))
+# Unfinished webhooks are replayed on restart at most this many times
+WEBHOOK_MAX_ATTEMPTS: Final[int] = int(os.getenv('WEBHOOK_MAX_ATTEMPTS', '5'))
+# Seconds to collect change webhooks for one user story into a single update, 0 disables
+STORY_DEBOUNCE_WINDOW: Final[float] = float(os.getenv('STORY_DEBOUNCE_WINDOW', '3'))
+# Minimum seconds between two edits of a user story's task checklist, changes in between are merged
+TASK_DIGEST_INTERVAL: Final[float] = float(os.getenv('TASK_DIGEST_INTERVAL', '10'))
+
+# Local state (webhook queue and caches), mount a volume here to keep it across restarts
+DATA_DIR: Final[str] = os.getenv('DATA_DIR', 'state')
+
+# Process role: 'all' runs the whole bot in one process. 'ingress' verifies webhooks and writes
+# them to the outbox, any number of them can run. 'sender' is the single process connected to
+# Discord, it fetches from Taiga and posts the webhooks the ingress processes wrote.
+BOT_ROLE: Final[str] = os.getenv('BOT_ROLE', 'all').lower()
+# Queue between ingress and sender processes, on a volume of the host they all mount
+OUTBOX_PATH: Final[str] = os.getenv('OUTBOX_PATH', os.path.join(DATA_DIR, 'outbox.db'))
+# Seconds the sender waits before checking an empty outbox again
+OUTBOX_POLL_INTERVAL: Final[float] = float(os.getenv('OUTBOX_POLL_INTERVAL', '0.2'))
+
+# Logging
+LOG_LEVEL: Final[str] = os.getenv('LOG_LEVEL', 'INFO').upper()
+# 'json' for one JSON object per line, 'text' for human readable lines
+LOG_FORMAT: Final[str] = os.getenv('LOG_FORMAT', 'json').lower()
+# Fraction of webhook payloads dumped at INFO level, all of them are dumped at DEBUG
+LOG_PAYLOAD_SAMPLE_RATE: Final[float] = float(os.getenv('LOG_PAYLOAD_SAMPLE_RATE', '0'))
 
 # Validate required environment variables
 def validate_config():
@@ -28,12 +84,15 @@ def validate_config():
         raise ValueError("TAIGA_PASSWORD must be set in environment")
     if not TAIGA_BASE_URL:
         raise ValueError("TAIGA_BASE_URL must be set in environment")
-    if not DISCORD_TOKEN:
+    if BOT_ROLE not in ('all', 'ingress', 'sender'):
+        raise ValueError("BOT_ROLE must be all, ingress or sender")
+    if BOT_ROLE != 'ingress' and not DISCORD_TOKEN:
         raise ValueError("DISCORD_TOKEN must be set in environment")
-    if not SECRET_KEY:
-        raise ValueError("SECRET_KEY must be set in environment")
-    if not FORUM_ID:
-        raise ValueError("FORUM_ID must be set in environment")
+    if not TAIGA_PROJECTS and not SECRET_KEY:
+        raise ValueError("SECRET_KEY or TAIGA_PROJECTS must be set in environment")
+    if not TAIGA_PROJECTS and not FORUM_ID:
+        raise ValueError("FORUM_ID or TAIGA_PROJECTS must be set in environment")
 
 # Validate on import
 #validate_config()
+
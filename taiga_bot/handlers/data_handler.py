@@ -1,17 +1,99 @@
 """
 Data handler for Taiga webhooks
 """
+import asyncio
 import datetime
+import difflib
+import logging
 import re
-from dataclasses import dataclass, field # pylint: disable=unused-import
-from pprint import pprint
+import time
+from dataclasses import dataclass, field
 import discord
+from . import taiga_api_async
+from .log import log_payload
+from .mention_cache import mention_cache, MISSING
+from .project_index import project_index, MISSING as NOT_INDEXED
+from .description_store import description_store, MISSING as NO_SNAPSHOT
+from .task_digest import task_board
 from .taiga_api import get_user_story_history, get_user_story, get_swimlane, get_user
 
+logger = logging.getLogger(__name__)
+
+# Seconds before a forum is fetched again because a tag name was missing from it
+TAG_MISS_REFRESH_SECONDS = 60
+
 @dataclass
 class ForumTags:
-    """Stores forum tags as a dictionary {tag_name: tag_id}."""
+    """Stores the tags of every routed forum as a dictionary {forum_id: {tag_name: tag_id}}.
+
+    Kept current from channel update events. A lookup of an unknown name
+    fetches the forum once, concurrent lookups share that fetch, and misses
+    fetch a forum at most once per TAG_MISS_REFRESH_SECONDS.
+    """
     tags: dict
+    refreshed_at: dict = field(default_factory=dict)
+    _refreshes: dict = field(default_factory=dict, repr=False)
+    # Counters
+    misses: int = 0
+    refreshes: int = 0
+
+    def update(self, forum):
+        """Store the tags of a forum channel"""
+        self.tags[forum.id] = {tag.name: tag.id for tag in forum.available_tags}
+        self.refreshed_at[forum.id] = time.monotonic()
+
+    async def lookup(self, forum_id, name, fetch):
+        """Get the id of a forum tag by name
+
+        Args:
+            forum_id: value[int]: The forum channel id
+            name: value[str]: The tag name, a swimlane name
+            fetch: value[coroutine function]: Fetches a channel by id
+
+        Returns:
+            int|None: The tag id, None if the forum has no such tag
+        """
+        tag_id = self.tags.get(forum_id, {}).get(name)
+        if tag_id is not None:
+            return tag_id
+        self.misses += 1
+        refreshed_at = self.refreshed_at.get(forum_id)
+        if (forum_id in self._refreshes or refreshed_at is None
+                or time.monotonic() - refreshed_at >= TAG_MISS_REFRESH_SECONDS):
+            await self.refresh(forum_id, fetch)
+        return self.tags.get(forum_id, {}).get(name)
+
+    async def refresh(self, forum_id, fetch):
+        """Fetch the tags of a forum, concurrent callers wait for the same fetch"""
+        task = self._refreshes.get(forum_id)
+        if task is None:
+            task = self._refreshes[forum_id] = asyncio.ensure_future(
+                self._refresh(forum_id, fetch))
+            task.add_done_callback(lambda _task: self._refreshes.pop(forum_id, None))
+        await asyncio.shield(task)
+
+    async def _refresh(self, forum_id, fetch):
+        """Fetch a forum and store its tags"""
+        self.refreshes += 1
+        try:
+            forum = await fetch(forum_id)
+            if not isinstance(forum, discord.ForumChannel):
+                logger.error("This is not a forum channel!")
+                return
+            self.update(forum)
+        except discord.HTTPException as e:
+            logger.warning("Could not fetch the tags of forum %s: %s", forum_id, e)
+        finally:
+            # Failed fetches of any kind wait out the interval before the next miss refetches
+            self.refreshed_at[forum_id] = time.monotonic()
+
+    def stats(self):
+        """Return tag counts per forum and counters"""
+        return {
+            'forums': {str(forum_id): len(tags) for forum_id, tags in self.tags.items()},
+            'misses': self.misses,
+            'refreshes': self.refreshes,
+        }
 
 #Singleton instance for global use
 forum_tags = ForumTags(tags={})
@@ -74,18 +156,15 @@ def process_webhook(payload):
     """Process webhook data into strings to send to bot"""
     is_test = False
 
-    print("\n\nProcessing Started on...")
-    pprint(payload)
+    log_payload(logger, payload)
 
     is_test = safe_get(payload, ['data', 'test'], False)
     if is_test:
         return None, None, None, {'is_test': is_test}
 
-    print("\n\nDeterminting payload type...")
-
     payload_type = safe_get(payload, ['type'])
     if not payload_type:
-        print("Malformed Webhook - Type not found")
+        logger.warning("Malformed Webhook - Type not found")
         return None, None, None, {'error': 'Malformed Webhook - Type not found'}
     if payload_type == 'userstory':
         return userstory_handler(payload)
@@ -93,31 +172,323 @@ def process_webhook(payload):
         return task_handler(payload)
     return None, None, None, {'error': 'invalid_payload'}
 
+async def process_webhook_async(payload):
+    """Process webhook data into strings to send to bot, fetching from Taiga asynchronously"""
+    log_payload(logger, payload)
+
+    is_test = safe_get(payload, ['data', 'test'], False)
+    if is_test:
+        return None, None, None, {'is_test': is_test}
+
+    payload_type = safe_get(payload, ['type'])
+    if not payload_type:
+        logger.warning("Malformed Webhook - Type not found")
+        return None, None, None, {'error': 'Malformed Webhook - Type not found'}
+    if payload_type == 'userstory':
+        return await userstory_handler_async(payload)
+    if payload_type == 'task':
+        return task_handler(payload)
+    return None, None, None, {'error': 'invalid_payload'}
+
 def task_handler(payload):
-    """Handle a task webhook"""
-    print("\n\nTask Webhook Received, Processing...")
-    is_test = True
+    """Handle a task webhook by rolling it into the task checklist of its user story"""
+    logger.debug("Task Webhook Received, Processing...")
+    action = safe_get(payload, ['action'])
+    if not action:
+        logger.warning("Malformed Webhook - Action not found")
+        return None, None, None, {'error': 'Malformed Webhook - Action not found'}
+
+    checklists = task_board.apply(payload)
+    if not checklists:
+        logger.debug("Task Webhook - Not part of a user story, Ignoring")
+        return None, None, None, {'ignore': True}
+    story_id = safe_get(payload, ['data', 'user_story', 'id'])
+    link = safe_get(payload, ['data', 'user_story', 'permalink'])
+    flags = {
+        'digest': True,
+        # Two checklists when the task moved from one user story to another
+        'checklists': [
+            {
+                'story_id': changed_id,
+                'ref': changed_ref,
+                'embed': build_task_digest(tasks, link if changed_id == story_id else None),
+            }
+            for changed_id, changed_ref, tasks in checklists
+        ],
+    }
+    return None, None, None, flags
 
-    if isinstance(payload, dict) and 'action' in payload:
-        action = payload['action']
-        if not action:
-            print("Malformed Webhook - Action not found")
-            return None
+def build_task_digest(tasks, url=None, limit=3900):
+    """Build the checklist embed of a user story's tasks
 
-    if action == 'create':
-        print("\n\nTask Webhook - Create, Processing...")
+    Args:
+        tasks: value[list]: The story's tasks from the task board, sorted by ref
+        url: Optional[value[str]]: Permalink of the user story
+        limit: Optional[value[int]]: Maximum length of the checklist
+    """
+    lines = []
+    for task in tasks:
+        if task['is_closed']:
+            icon = ':white_check_mark:'
+        elif task['is_blocked']:
+            icon = ':no_entry:'
+        else:
+            icon = ':white_large_square:'
+        line = f"{icon} **#{task['ref']}** {truncate_string(task['subject'] or '', 80)}"
+        details = [detail for detail in (task['status'], task['assigned']) if detail]
+        if details:
+            line += f" - {' | '.join(details)}"
+        lines.append(line)
+    checklist = ''
+    for index, line in enumerate(lines):
+        if len(checklist) + len(line) + 40 > limit:
+            checklist += f"... and {len(lines) - index} more tasks"
+            break
+        checklist += line + "\n"
+    done = sum(1 for task in tasks if task['is_closed'])
+    embed = discord.Embed(
+        title=f"Tasks ({done}/{len(tasks)} done)",
+        description=checklist or 'No tasks.',
+        url=url,
+        color=discord.Color.green() if tasks and done == len(tasks) else discord.Color.blue(),
+        timestamp=datetime.datetime.now(datetime.UTC),
+    )
+    embed.set_footer(
+        text='Powered by Taiga REST API | Coded by @Some1ellse',
+        icon_url="https://taiga.io/media/images/Logo-text.width-140.png"
+        )
+    return embed
+
+def mention_users(payload):
+    """List the assigned users and watchers of a user story, without duplicates"""
+    assigned_users = safe_get(payload, ['data', 'assigned_users']) or []
+    watchers = safe_get(payload, ['data', 'watchers']) or []
+    return assigned_users + [item for item in watchers if item not in assigned_users]
+
+def userstory_lookups_needed(payload):
+    """Work out which Taiga API lookups a user story webhook needs
+
+    Returns:
+        dict: {
+            'story_id': id whose swimlane must be fetched, or None,
+            'history': True if the description diff must be read from the history API,
+            'users': list of user ids to resolve to mention names
+        }
+    """
+    action = safe_get(payload, ['action'])
+    needed = {'story_id': None, 'history': False, 'users': []}
+    if not action:
+        return needed
+    if action != 'delete':
+        needed['story_id'] = safe_get(payload, ['data', 'id'])
+    if action == 'change':
+        description_diff = safe_get(payload, ['change', 'diff', 'description_diff'])
+        needed['history'] = description_diff == 'Check the history API for the exact diff'
+    if action in ['create', 'change']:
+        needed['users'] = mention_users(payload)
+    return needed
+
+def cached_mentions(user_ids):
+    """Split users into cached mention names and users that must be fetched
+
+    Returns:
+        tuple: ({user_id: mention_name}, [user_id to fetch])
+    """
+    names = {}
+    missing = []
+    for user in user_ids:
+        name = mention_cache.get(user)
+        if name is MISSING:
+            missing.append(user)
+        else:
+            names[user] = name
+    return names, missing
 
+def store_mention(names, user, api_data):
+    """Record the mention name found in a fetched Taiga user's bio"""
+    if not isinstance(api_data, dict):
+        # Failed lookups are not cached so they are retried next time
+        return
+    name = find_mention(api_data['bio']) if api_data.get('bio') else None
+    mention_cache.put(user, name)
+    names[user] = name
 
+# In-flight user fetches {user_id: task}, so a burst of webhooks fetches each user once
+_user_fetches = {}
 
-    return None, None, None, {'is_test': is_test}
+async def _fetch_mention(user):
+    """Fetch a Taiga user and cache the mention name in their bio
+
+    Returns:
+        str|None: The mention name, or MISSING if the lookup failed
+    """
+    names = {}
+    store_mention(names, user, await taiga_api_async.get_user(user))
+    return names.get(user, MISSING)
+
+async def fetch_mention(user):
+    """Get a Taiga user's mention name from Taiga, concurrent lookups of a user share one fetch
+
+    Returns:
+        str|None: The mention name, or MISSING if the lookup failed
+    """
+    task = _user_fetches.get(user)
+    if task is None:
+        task = _user_fetches[user] = asyncio.ensure_future(_fetch_mention(user))
+        task.add_done_callback(lambda _task: _user_fetches.pop(user, None))
+    return await asyncio.shield(task)
+
+def ordered_mentions(user_ids, names):
+    """List (user_id, mention_name) for users that have a mention name"""
+    return [(user, names[user]) for user in user_ids if names.get(user)]
+
+def resolve_swimlane(payload, story_id):
+    """Get (swimlane_id, swimlane_name) of a user story, from the project index if possible"""
+    project_id = safe_get(payload, ['data', 'project', 'id'])
+    project_index.ensure_loaded(project_id)
+    cached = project_index.story_swimlane(project_id, story_id)
+    if cached is NOT_INDEXED:
+        api_data = get_user_story(story_id)
+        if api_data is None:
+            return None, None
+        swimlane_id, swimlane = safe_get(api_data, ['swimlane']), None
+    else:
+        swimlane_id, swimlane = cached
+    if swimlane_id and swimlane is None:
+        swimlane = safe_get(get_swimlane(swimlane_id), ['name'])
+    project_index.record_story(project_id, story_id, swimlane_id, swimlane)
+    return swimlane_id, swimlane
+
+async def resolve_swimlane_async(payload, story_id):
+    """Get (swimlane_id, swimlane_name) of a user story, from the project index if possible"""
+    project_id = safe_get(payload, ['data', 'project', 'id'])
+    if project_id is not None and not project_index.is_loaded(project_id):
+        await asyncio.to_thread(project_index.ensure_loaded, project_id)
+    cached = project_index.story_swimlane(project_id, story_id)
+    if cached is NOT_INDEXED:
+        api_data = await taiga_api_async.get_user_story(story_id)
+        if api_data is None:
+            return None, None
+        swimlane_id, swimlane = safe_get(api_data, ['swimlane']), None
+    else:
+        swimlane_id, swimlane = cached
+    if swimlane_id and swimlane is None:
+        swimlane = safe_get(await taiga_api_async.get_swimlane(swimlane_id), ['name'])
+    project_index.record_story(project_id, story_id, swimlane_id, swimlane)
+    return swimlane_id, swimlane
+
+def record_description(payload):
+    """Snapshot the description of a user story webhook
+
+    Returns:
+        str: The description it replaces, or NO_SNAPSHOT if there was none
+            or the snapshot already held this one
+    """
+    story_id = safe_get(payload, ['data', 'id'])
+    data = payload.get('data')
+    if story_id is None or not isinstance(data, dict):
+        return NO_SNAPSHOT
+    if payload.get('action') == 'delete':
+        description_store.forget(story_id)
+        return NO_SNAPSHOT
+    if 'description' not in data:
+        return NO_SNAPSHOT
+    return description_store.swap(story_id, data['description'])
+
+def fetch_userstory_lookups(payload):
+    """Run the Taiga API lookups for a user story webhook
+
+    Returns:
+        dict: {
+            'swimlane': name (only if the story has one),
+            'history': entry,
+            'previous_description': text (only if a description change was diffed locally),
+            'mentions': [(user_id, mention_name)]
+        }
+    """
+    needed = userstory_lookups_needed(payload)
+    lookups = {'history': None, 'mentions': []}
+    project_index.patch(payload)
+    previous = record_description(payload)
+    if needed['history'] and previous is not NO_SNAPSHOT:
+        # The snapshot holds the old text, the webhook the new one
+        lookups['previous_description'] = previous
+        needed['history'] = False
+    if needed['story_id']:
+        swimlane_id, swimlane = resolve_swimlane(payload, needed['story_id'])
+        if swimlane_id:
+            lookups['swimlane'] = swimlane
+    if needed['history']:
+        lookups['history'] = get_user_story_history(
+            user_story_id=safe_get(payload, ['data', 'id']),
+            target_time=payload['date'], time_threshold_ms=500)
+    names, missing = cached_mentions(needed['users'])
+    for user in missing:
+        store_mention(names, user, get_user(user))
+    lookups['mentions'] = ordered_mentions(needed['users'], names)
+    return lookups
+
+async def fetch_userstory_lookups_async(payload):
+    """Run the Taiga API lookups for a user story webhook concurrently
+
+    Returns:
+        dict: Same shape as fetch_userstory_lookups
+    """
+    needed = userstory_lookups_needed(payload)
+    lookups = {'history': None, 'mentions': []}
+    project_index.patch(payload)
+    previous = record_description(payload)
+    if needed['history'] and previous is not NO_SNAPSHOT:
+        lookups['previous_description'] = previous
+        needed['history'] = False
+
+    async def swimlane_lookup():
+        swimlane_id, swimlane = await resolve_swimlane_async(payload, needed['story_id'])
+        if swimlane_id:
+            lookups['swimlane'] = swimlane
+
+    async def history_lookup():
+        lookups['history'] = await taiga_api_async.get_user_story_history(
+            user_story_id=safe_get(payload, ['data', 'id']),
+            target_time=payload['date'], time_threshold_ms=500)
+
+    async def users_lookup():
+        names, missing = cached_mentions(needed['users'])
+        fetched = await asyncio.gather(*(fetch_mention(user) for user in missing))
+        for user, name in zip(missing, fetched):
+            if name is not MISSING:
+                names[user] = name
+        lookups['mentions'] = ordered_mentions(needed['users'], names)
+
+    jobs = [users_lookup()]
+    if needed['story_id']:
+        jobs.append(swimlane_lookup())
+    if needed['history']:
+        jobs.append(history_lookup())
+    await asyncio.gather(*jobs)
+    return lookups
 
 def userstory_handler(payload):
     """Handle a user story webhook"""
-    print("\n\nUserstory Webhook Received, Processing...")
+    logger.debug("Userstory Webhook Received, Processing...")
+    return build_userstory(payload, fetch_userstory_lookups(payload))
+
+async def userstory_handler_async(payload):
+    """Handle a user story webhook, fetching from Taiga asynchronously"""
+    logger.debug("Userstory Webhook Received, Processing...")
+    return build_userstory(payload, await fetch_userstory_lookups_async(payload))
+
+def build_userstory(payload, lookups):
+    """Build the thread, embeds and flags for a user story webhook
+
+    Args:
+        payload: value[dict]: The webhook payload
+        lookups: value[dict]: Taiga API results from fetch_userstory_lookups
+    """
     user = userinfo.get(payload)  # Store the returned user info
     action = safe_get(payload, ['action'])
     if not action:
-        print("Malformed Webhook - Action not found")
+        logger.warning("Malformed Webhook - Action not found")
         return None, None, None, {'error': 'Malformed Webhook - Action not found'}
     # Define variables
     # TODO: Update description emoji to match status' like closed or blocked.
@@ -125,7 +496,6 @@ def userstory_handler(payload):
     action_diff = []
     api_data = None
     assigned = safe_get(payload, ['data', 'assigned_to', 'full_name'])
-    assigned_users = safe_get(payload, ['data', 'assigned_users'])
     blocked = safe_get(payload, ['data', 'is_blocked']) # pylint: disable=unused-variable
     blocked_reason = safe_get(
         payload,
@@ -157,13 +527,14 @@ def userstory_handler(payload):
     status = safe_get(payload, ['data', 'status', 'name'])
     story_id = safe_get(payload, ['data', 'id'])
     swimlane = safe_get(payload, ['data', 'swimlane'])
-    swimlane_id = safe_get(payload, ['data', 'swimlane_id'])
+    swimlane_id = safe_get(payload, ['data', 'swimlane_id']) # pylint: disable=unused-variable
     tags = safe_get(payload, ['data', 'tags'])
     thread = None
     ticket_number = safe_get(payload, ['data', 'ref'])
     title = safe_get(payload, ['data', 'subject'])
     title_plain = f"#{ticket_number} {title}"
-    to_from = {}
+    # One (field, from, to) entry per changed field, a merged burst can change several
+    to_from = []
     thumbnail_url = safe_get(
             payload,
             ['data', 'project', 'logo_big_url']
@@ -171,18 +542,11 @@ def userstory_handler(payload):
             "https://pm.ks-webserver.com/v-1721729942015"
             "/images/project-logos/project-logo-01.png"
         )
-    user_story_id = safe_get(payload, ['data', 'id'])
-    watchers = safe_get(payload, ['data', 'watchers'])
 
 
     # Initial API call to catch pre-existing objects.
-    if action != 'delete':
-        api_data = get_user_story(story_id)
-        swimlane_id = safe_get(api_data, ['swimlane'])
-        if swimlane_id:
-            api_data = get_swimlane(swimlane_id)
-            swimlane = safe_get(api_data, ['name'])
-        api_data = None
+    if 'swimlane' in lookups:
+        swimlane = lookups['swimlane']
 
     if action == 'create':
         action_diff.append("A new user story was created")
@@ -216,7 +580,7 @@ def userstory_handler(payload):
                 embed_color = discord.Color.red()
         diff = safe_get(change, ['diff'])
         if isinstance(diff, dict) and 'assigned_users' in diff and 'from' in diff['assigned_users']:
-            print("Assigned users changed")
+            logger.debug("Assigned users changed")
             action_diff.append(
                 "The assigned users were changed."
                 " Login to Tiaga to see the new assignements."
@@ -224,24 +588,29 @@ def userstory_handler(payload):
             embed_color = discord.Color.blue()
         if safe_get(diff, ['is_blocked', 'from']) is not None:
             action_diff.append("The blocked status was updated")
-            to_from['to'] = blocked
             embed_color = discord.Color.blue()
             if diff['is_blocked']['from']:
-                to_from['from'] = "Yes"
+                to_from.append(("Blocked", "Yes", blocked))
             else:
-                to_from['from'] = "No"
+                to_from.append(("Blocked", "No", blocked))
         if safe_get(diff, ['client_requirement', 'from']) is not None:
             action_diff.append("The client requirement was updated")
-            to_from['to'] = has_client_requirement
             embed_color = discord.Color.blue()
             if diff['client_requirement']['from'] is True:
-                to_from['from'] = "Yes"
+                to_from.append(("Client Requirement", "Yes", has_client_requirement))
             else:
-                to_from['from'] = "None"
+                to_from.append(("Client Requirement", "None", has_client_requirement))
         if safe_get(diff, ['description_diff']) is not None:
-            if diff['description_diff'] == 'Check the history API for the exact diff':
-                history = get_user_story_history(user_story_id=user_story_id,
-                    target_time=payload['date'], time_threshold_ms=500)
+            if ('previous_description' in lookups and
+                    diff['description_diff'] == 'Check the history API for the exact diff'):
+                action_diff.append("The description was updated. "
+                "Check pinned for new description!")
+                changes = line_diff(lookups['previous_description'], description or '')
+                if changes:
+                    action_diff.append(changes)
+                embed_color = discord.Color.blue()
+            elif diff['description_diff'] == 'Check the history API for the exact diff':
+                history = lookups['history']
                 if history is not None:
                     api_diff = history.get('diff', {})
                     if safe_get(api_diff, ['description']) is not None:
@@ -251,43 +620,29 @@ def userstory_handler(payload):
                     embed_color = discord.Color.blue()
                 else:
                     action_diff.append("Unknown Change was detected in the API")
-                    print("Unknown change detected in the API")
+                    logger.warning("Unknown change detected in the API")
         if safe_get(diff, ['due_date', 'to']) is not None:
             due_date = diff['due_date']['to']
-            to_from['from'] = diff['due_date']['from']
-            to_from['to'] = due_date
+            to_from.append(("Due Date", diff['due_date']['from'], due_date))
             action_diff.append("The due date was changed.")
         if safe_get(diff, ['swimlane', 'to']) is not None:
             swimlane = diff['swimlane']['to']
             action_diff.append("The swimlane was updated")
         if safe_get(diff, ['status', 'from']) is not None:
             action_diff.append("The status was updated")
-            to_from['to'] = status
-            to_from['from'] = diff['status']['from']
+            to_from.append(("Status", diff['status']['from'], status))
             embed_color = discord.Color.blue()
         if safe_get(diff, ['team_requirement', 'from']) is not None:
             action_diff.append("The team requirement was updated")
-            to_from['to'] = has_team_requirement
             if diff['team_requirement']['from'] is True:
-                to_from['from'] = "Yes"
+                to_from.append(("Team Requirement", "Yes", has_team_requirement))
             else:
-                to_from['from'] = "None"
+                to_from.append(("Team Requirement", "None", has_team_requirement))
             embed_color = discord.Color.blue()
 
     if (action in ['create', 'change']):
-        if assigned_users is None:
-            assigned_users = []
-        if watchers is None:
-            watchers = []
-        mention_users = assigned_users + [item for item in watchers if item not in assigned_users]
-        mention = []
-        for user in mention_users:
-            api_data = None
-            api_data = get_user(user)
-            if isinstance(api_data, dict) and 'bio' in api_data:
-                if find_mention(api_data['bio']) is not None:
-                    mention.append(find_mention(api_data['bio']))
-                print(mention)
+        mention = lookups['mentions']
+        logger.debug("Mentions: %s", mention)
         full_description = adjust_markdown(description)
 
         if len(full_description) > 2000:
@@ -298,40 +653,34 @@ def userstory_handler(payload):
         else:
             description = ":inbox_tray:\n\n" + full_description
 
-        if swimlane:
-            swimlane_id = forum_tags.tags[swimlane]
-        else:
-            swimlane_id = None
-        if action_diff[0] == "The description was updated. Check pinned for new description!":
+        if "The description was updated. Check pinned for new description!" in action_diff:
             description_new = True
         if not description:
             description = "No description provided."
-        if swimlane_id:
-            thread = {
-            "name": title_plain,
-            "content": description,
-            "applied_tags": [swimlane_id],
-            "auto_archive_duration": 4320
-            }
-        else:
-            thread = {
-            "name": title_plain,
-            "content": description,
-            "auto_archive_duration": 4320
-            }
+        thread = {
+        "name": title_plain,
+        "content": description,
+        "auto_archive_duration": 4320
+        }
+        if swimlane:
+            # Applied as a forum tag by the process posting to Discord, which holds the tags
+            thread["swimlane"] = swimlane
 
     flags = {}
     flags['user_story'] = title_plain
+    flags['story_id'] = story_id
+    flags['ref'] = ticket_number
     if description_new:
         flags['description_new'] = description_new
     else:
         flags['description_new'] = None
-    if swimlane_id:
-        flags['swimlane'] = swimlane_id
+    if swimlane:
+        flags['swimlane'] = swimlane
     else:
         flags['swimlane'] = None
     if action == 'delete':
         flags['delete'] = True
+        task_board.forget_story(story_id)
     if mention:
         flags['mention'] = mention
 
@@ -349,9 +698,10 @@ def userstory_handler(payload):
             inline=False
             )
         if len(action_diff) > 1:
+            # Merged bursts carry several changes, list them all in one message
             embed.add_field(
                 name='',
-                value=action_diff[1],
+                value='\n'.join(action_diff[1:]),
                 inline=False
                 )
 #            embed.add_field(
@@ -365,15 +715,10 @@ def userstory_handler(payload):
             icon_url=userinfo.avatar
             )
         embed.set_thumbnail(url=thumbnail_url)
-        if to_from:
-            embed.add_field(
-                name="From",
-                value=to_from['from'],
-                inline=True
-                )
+        for field, old, new in to_from:
             embed.add_field(
-                name="To",
-                value=to_from['to'],
+                name=field,
+                value=f"From: {old}\nTo: {new}",
                 inline=True
                 )
         embed.set_footer(
@@ -494,6 +839,28 @@ def split_content(content, limit=1900):
 
     return content[:split_index], content[split_index:].lstrip()
 
+def line_diff(previous, current, limit=700):
+    """Render the changed lines between two descriptions as a diff code block
+
+    Args:
+        previous: value[str]: The old description
+        current: value[str]: The new description
+        limit: Optional[value[int]]: Maximum characters of changed lines
+
+    Returns:
+        str: The code block, empty if no line changed
+    """
+    lines = [line for line in difflib.unified_diff(
+        previous.splitlines(), current.splitlines(), lineterm='', n=0)
+        if line[:1] in ('+', '-') and not line.startswith(('+++', '---'))]
+    if not lines:
+        return ''
+    # A code fence inside the description would end the block early
+    changes = '\n'.join(lines).replace('```', '` ` `')
+    if len(changes) > limit:
+        changes = changes[:limit].rsplit('\n', 1)[0] + '\n...'
+    return f"```diff\n{changes}\n```"
+
 def thread_builder(payload):
     """ Build a thread from the provided data """
     thread = {
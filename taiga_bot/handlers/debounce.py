@@ -0,0 +1,111 @@
+"""
+Per-user-story debounce that coalesces bursts of change webhooks
+"""
+import asyncio
+from .data_handler import safe_get
+
+
+def is_coalescible(payload):
+    """Check whether a webhook can be merged with its neighbours
+
+    Only user story changes without a comment are merged. Creates, deletes
+    and comments act as barriers: they flush the pending burst first.
+    """
+    return (
+        safe_get(payload, ['type']) == 'userstory' and
+        safe_get(payload, ['action']) == 'change' and
+        not safe_get(payload, ['change', 'comment'])
+    )
+
+
+def merge_payloads(payloads):
+    """Merge change webhooks for one user story into a single webhook
+
+    The newest payload provides the story state. Diff entries are combined
+    so each field keeps its oldest 'from' and newest 'to'.
+
+    Args:
+        payloads: value[list]: Change webhooks for the same story, oldest first
+
+    Returns:
+        dict: One change webhook covering the whole burst
+    """
+    merged = dict(payloads[-1])
+    change = dict(safe_get(merged, ['change']) or {})
+    diff = {}
+    for payload in payloads:
+        for field, value in (safe_get(payload, ['change', 'diff']) or {}).items():
+            if isinstance(value, dict) and isinstance(diff.get(field), dict):
+                diff[field] = {**value, 'from': diff[field].get('from')}
+            else:
+                diff[field] = dict(value) if isinstance(value, dict) else value
+        if safe_get(payload, ['change', 'diff', 'description_diff']) is not None:
+            # The history API lookup matches on the date of the description change
+            merged['date'] = payload['date']
+    change['diff'] = diff
+    merged['change'] = change
+    return merged
+
+
+class StoryDebouncer:
+    """Collects coalescible webhooks per user story for a short window
+
+    Args:
+        window: value[float]: Seconds to wait for more changes after the first one
+        flush: value[callable]: Called with the key when a window ends, on the
+            event loop, the owner then takes the burst with take()
+    """
+    def __init__(self, window, flush):
+        self.window = window
+        self._flush = flush
+        self._bursts = {}
+        self._timers = {}
+
+        # Counters
+        self.bursts = 0
+        self.coalesced = 0
+
+    def add(self, key, item, payload):
+        """Hold a webhook back if it can join a burst
+
+        Returns:
+            bool: True if the item is now part of a pending burst
+        """
+        if key is None or not is_coalescible(payload):
+            return False
+        if key not in self._bursts:
+            self._bursts[key] = []
+            self._timers[key] = asyncio.get_running_loop().call_later(
+                self.window, self._expire, key)
+        self._bursts[key].append(item)
+        return True
+
+    def take(self, key):
+        """Remove and return the pending burst for a story, or None"""
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        items = self._bursts.pop(key, None)
+        if items:
+            self.bursts += 1
+            self.coalesced += len(items) - 1
+        return items
+
+    def _expire(self, key):
+        """Timer callback, signals the end of a window unless a barrier took the burst"""
+        self._timers.pop(key, None)
+        if key in self._bursts:
+            self._flush(key)
+
+    def pending(self):
+        """Number of webhooks held in open bursts"""
+        return sum(len(items) for items in self._bursts.values())
+
+    def stats(self):
+        """Return debounce counters"""
+        return {
+            'window': self.window,
+            'pending': self.pending(),
+            'bursts': self.bursts,
+            'coalesced': self.coalesced,
+        }
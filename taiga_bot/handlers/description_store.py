@@ -0,0 +1,126 @@
+"""
+Snapshots of the last seen description of each user story
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from config.config import DATA_DIR, DESCRIPTION_STORE_SIZE  # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+
+def digest(text):
+    """Content hash of a description"""
+    return hashlib.sha1(text.encode('utf-8')).digest()
+
+
+class DescriptionStore:
+    """Last description seen per user story, zlib compressed in SQLite
+
+    The content hashes are also held in memory, so a webhook whose
+    description did not change costs no database read. Only the most
+    recently updated max_stories stories are kept.
+
+    Args:
+        path: value[str]: SQLite database file, ':memory:' for a private store
+        max_stories: value[int]: Stories kept, the least recently updated are dropped
+    """
+    def __init__(self, path, max_stories):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_stories = max_stories
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        # No fsync per commit, a description lost in a crash is refetched from Taiga
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS descriptions ('
+            'story_id INTEGER PRIMARY KEY, '
+            'hash BLOB NOT NULL, '
+            'body BLOB NOT NULL, '
+            'updated_at REAL NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS descriptions_updated_at ON descriptions (updated_at)')
+        self._lock = threading.Lock()
+        self._hashes = dict(self._conn.execute('SELECT story_id, hash FROM descriptions'))
+
+        # Counters
+        self.unchanged = 0
+        self.changed = 0
+        self.unknown = 0
+
+    def swap(self, story_id, text):
+        """Store the current description of a story and return the one it replaces
+
+        Returns:
+            str: The previous description, or MISSING if the story had no
+                snapshot or the snapshot already holds text, e.g. for a
+                replayed webhook, where it says nothing about the text before
+        """
+        text = text or ''
+        text_hash = digest(text)
+        with self._lock:
+            previous_hash = self._hashes.get(story_id)
+            if previous_hash == text_hash:
+                self.unchanged += 1
+                return MISSING
+            previous = MISSING
+            if previous_hash is not None:
+                row = self._conn.execute(
+                    'SELECT body FROM descriptions WHERE story_id = ?', (story_id,)).fetchone()
+                if row is not None:
+                    previous = zlib.decompress(row[0]).decode('utf-8')
+            if previous is MISSING:
+                self.unknown += 1
+            else:
+                self.changed += 1
+            self._conn.execute(
+                'INSERT INTO descriptions (story_id, hash, body, updated_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(story_id) DO UPDATE SET '
+                'hash = excluded.hash, body = excluded.body, updated_at = excluded.updated_at',
+                (story_id, text_hash, zlib.compress(text.encode('utf-8')), time.time())
+            )
+            self._hashes[story_id] = text_hash
+            if len(self._hashes) > self.max_stories:
+                self._evict()
+            return previous
+
+    def _evict(self):
+        """Drop the least recently updated stories beyond max_stories"""
+        excess = len(self._hashes) - self.max_stories
+        stale = [row[0] for row in self._conn.execute(
+            'SELECT story_id FROM descriptions ORDER BY updated_at LIMIT ?', (excess,))]
+        self._conn.executemany(
+            'DELETE FROM descriptions WHERE story_id = ?', [(story_id,) for story_id in stale])
+        for story_id in stale:
+            self._hashes.pop(story_id, None)
+
+    def forget(self, story_id):
+        """Drop the snapshot of a deleted story"""
+        with self._lock:
+            if self._hashes.pop(story_id, None) is not None:
+                self._conn.execute('DELETE FROM descriptions WHERE story_id = ?', (story_id,))
+
+    def stats(self):
+        """Return snapshot count and counters"""
+        return {
+            'stories': len(self._hashes),
+            'unchanged': self.unchanged,
+            'changed': self.changed,
+            'unknown': self.unknown,
+        }
+
+
+#Singleton instance for global use
+description_store = DescriptionStore(
+    os.path.join(DATA_DIR, 'descriptions.db'),
+    max_stories=DESCRIPTION_STORE_SIZE
+)
@@ -0,0 +1,271 @@
+"""
+Rate-limit-aware scheduler for outbound Discord requests
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import re
+import time
+from collections import deque
+import aiohttp
+from config.config import DISCORD_MAX_IN_FLIGHT  # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+from .metrics import discord_request_seconds, http_responses_total, path_template, status_label
+
+# Lower runs first when several threads have work waiting
+PRIORITY_STATUS = 0
+PRIORITY_THREAD = 1
+PRIORITY_CHANGE = 2
+PRIORITY_NAMES = {PRIORITY_STATUS: 'status', PRIORITY_THREAD: 'thread', PRIORITY_CHANGE: 'change'}
+
+API_PREFIX = re.compile(r'^/api/v\d+')
+# Path segments followed by an id that is a major parameter of Discord's buckets
+MAJOR_PARAMETERS = ('channels', 'guilds', 'webhooks')
+
+
+def route_key(method, path):
+    """Get the rate limit route of a request, e.g. 'POST /channels/123/messages'
+
+    Ids are replaced by ':id' except the major parameter, because Discord
+    keeps separate buckets per channel but not per message.
+    """
+    segments = API_PREFIX.sub('', path).strip('/').split('/')
+    route = []
+    for index, segment in enumerate(segments):
+        if segment.isdigit() and (index == 0 or segments[index - 1] not in MAJOR_PARAMETERS):
+            segment = ':id'
+        route.append(segment)
+    return f"{method.upper()} /{'/'.join(route)}"
+
+
+class _Operation:
+    """One queued Discord request"""
+    __slots__ = ('queue_key', 'route', 'operation', 'priority', 'call', 'future', 'queued_at',
+                 'context')
+
+    def __init__(self, queue_key, route, priority, call, future):
+        self.queue_key = queue_key
+        self.route = route
+        # The route without its channel id, to keep metric labels bounded
+        self.operation = path_template(route)
+        self.priority = priority
+        self.call = call
+        self.future = future
+        self.queued_at = time.monotonic()
+        # Runs with the submitter's context so log lines keep its correlation id
+        self.context = contextvars.copy_context()
+
+
+class _Bucket:
+    """Rate limit state of one route, from Discord's response headers"""
+    __slots__ = ('remaining', 'reset_at', 'in_flight')
+
+    def __init__(self):
+        self.remaining = None
+        self.reset_at = 0.0
+        self.in_flight = 0
+
+    def available(self, now):
+        """Check whether another request may be sent, or when to try again"""
+        if self.reset_at <= now:
+            # Unknown or expired limits: probe with one request at a time
+            return self.in_flight == 0, None
+        if self.remaining is not None and self.in_flight < self.remaining:
+            return True, None
+        return False, self.reset_at
+
+
+class DiscordScheduler:
+    """Single queue for every thread create, edit, send and pin
+
+    Requests for the same thread run one at a time in the order they were
+    submitted. Between threads, status embed updates go ahead of thread edits
+    and change messages. A request is only dispatched while its route bucket
+    has requests left, as reported by the X-RateLimit headers of the previous
+    responses, so bursts wait here instead of running into 429s.
+
+    discord.py still retries any 429 itself, the scheduler reads the headers
+    through an aiohttp trace passed to the client.
+
+    Args:
+        max_in_flight: value[int]: Maximum Discord requests running at once
+    """
+    def __init__(self, max_in_flight):
+        self.max_in_flight = max_in_flight
+        self._queues = {}
+        self._ready = []
+        self._buckets = {}
+        self._global_reset = 0.0
+        self._in_flight = 0
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._dispatcher = None
+
+        # Counters
+        self.dispatched = 0
+        self.rate_limited = 0
+        self.global_rate_limited = 0
+        self._waits = {priority: deque(maxlen=1000) for priority in PRIORITY_NAMES}
+
+    def trace_config(self):
+        """Get an aiohttp trace config that feeds response headers to the scheduler"""
+        trace = aiohttp.TraceConfig()
+        trace.on_request_end.append(self._on_request_end)
+        return trace
+
+    async def _on_request_end(self, _session, _context, params):
+        """Update the route bucket from Discord's rate limit headers"""
+        headers = params.response.headers
+        route = route_key(params.method, params.url.path)
+        now = time.monotonic()
+        status = status_label(params.response.status)
+        if status is not None:
+            http_responses_total.inc(service='discord', status=status)
+        bucket = self._buckets.setdefault(route, _Bucket())
+        if 'X-RateLimit-Remaining' in headers:
+            bucket.remaining = int(headers['X-RateLimit-Remaining'])
+            bucket.reset_at = now + float(headers.get('X-RateLimit-Reset-After', 0))
+        if params.response.status == 429:
+            self.rate_limited += 1
+            retry_after = float(headers.get('Retry-After', 1))
+            if headers.get('X-RateLimit-Global'):
+                self.global_rate_limited += 1
+                self._global_reset = max(self._global_reset, now + retry_after)
+            else:
+                bucket.remaining = 0
+                bucket.reset_at = max(bucket.reset_at, now + retry_after)
+        self._wake()
+
+    async def run(self, queue_key, method, path, priority, call):
+        """Queue a Discord request and wait for its result
+
+        Args:
+            queue_key: value[int]: Thread or channel whose requests keep their order
+            method: value[str]: HTTP method of the request, for its rate limit route
+            path: value[str]: API path of the request, e.g. f'/channels/{thread.id}/messages'
+            priority: value[int]: PRIORITY_STATUS, PRIORITY_THREAD or PRIORITY_CHANGE
+            call: value[coroutine function]: Makes the request, called without arguments
+
+        Returns:
+            The result of call, exceptions raised by call are raised here
+        """
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+        operation = _Operation(queue_key, route_key(method, path), priority, call,
+                               asyncio.get_running_loop().create_future())
+        queue = self._queues.setdefault(queue_key, deque())
+        queue.append(operation)
+        if len(queue) == 1:
+            self._push(operation)
+        return await operation.future
+
+    def _push(self, operation):
+        """Make the first request of a thread's queue eligible for dispatch"""
+        heapq.heappush(self._ready, (operation.priority, next(self._seq), operation))
+        self._wake()
+
+    def _wake(self):
+        """Let the dispatcher look at the queue again"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _next_operation(self):
+        """Pop the most urgent request whose bucket is open
+
+        Returns:
+            tuple: (operation or None, monotonic time to check again or None)
+        """
+        now = time.monotonic()
+        if self._global_reset > now:
+            return None, self._global_reset
+        blocked = []
+        retry_at = None
+        found = None
+        while self._ready:
+            entry = heapq.heappop(self._ready)
+            bucket = self._buckets.setdefault(entry[2].route, _Bucket())
+            available, reset_at = bucket.available(now)
+            if available:
+                found = entry[2]
+                break
+            blocked.append(entry)
+            if reset_at is not None:
+                retry_at = reset_at if retry_at is None else min(retry_at, reset_at)
+        for entry in blocked:
+            heapq.heappush(self._ready, entry)
+        return found, retry_at
+
+    async def _dispatch(self):
+        """Start queued requests as their buckets allow"""
+        while True:
+            self._wakeup.clear()
+            operation, retry_at = (None, None)
+            if self._in_flight < self.max_in_flight:
+                operation, retry_at = self._next_operation()
+            if operation is None:
+                timeout = max(retry_at - time.monotonic(), 0) if retry_at is not None else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            bucket = self._buckets[operation.route]
+            bucket.in_flight += 1
+            self._in_flight += 1
+            self.dispatched += 1
+            self._waits[operation.priority].append(time.monotonic() - operation.queued_at)
+            asyncio.get_running_loop().create_task(
+                self._execute(operation, bucket), context=operation.context)
+
+    async def _execute(self, operation, bucket):
+        """Run one request, then release the next request of its thread"""
+        try:
+            with discord_request_seconds.time(operation=operation.operation):
+                result = await operation.call()
+        except Exception as e: # pylint: disable=broad-exception-caught
+            if not operation.future.done():
+                operation.future.set_exception(e)
+        else:
+            if not operation.future.done():
+                operation.future.set_result(result)
+        finally:
+            bucket.in_flight -= 1
+            self._in_flight -= 1
+            queue = self._queues[operation.queue_key]
+            queue.popleft()
+            if queue:
+                self._push(queue[0])
+            else:
+                del self._queues[operation.queue_key]
+                self._wake()
+
+    def pending(self):
+        """Number of requests waiting to be sent"""
+        return sum(len(queue) for queue in self._queues.values()) - self._in_flight
+
+    def stats(self):
+        """Return queue depth, 429 counts and queue wait times in seconds per priority"""
+        waits = {}
+        for priority, name in PRIORITY_NAMES.items():
+            samples = sorted(self._waits[priority])
+            waits[name] = {
+                'count': len(samples),
+                'p50': round(samples[len(samples) // 2], 4) if samples else None,
+                'p95': round(samples[min(int(len(samples) * 0.95), len(samples) - 1)], 4)
+                       if samples else None,
+                'max': round(samples[-1], 4) if samples else None,
+            }
+        return {
+            'pending': self.pending(),
+            'in_flight': self._in_flight,
+            'dispatched': self.dispatched,
+            'rate_limited': self.rate_limited,
+            'global_rate_limited': self.global_rate_limited,
+            'buckets': len(self._buckets),
+            'queue_wait': waits,
+        }
+
+
+#Singleton instance for global use
+discord_scheduler = DiscordScheduler(max_in_flight=DISCORD_MAX_IN_FLIGHT)
@@ -0,0 +1,227 @@
+"""
+Per-story cache of Taiga user story history entries
+"""
+import bisect
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from config.config import HISTORY_CACHE_SIZE  # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+
+MISSING = object()
+# Entries kept per story, the oldest are dropped first
+MAX_ENTRIES = 200
+# Pages fetched for one lookup before giving up on older entries
+MAX_PAGES = 10
+# Start of the covered range holding the oldest history entry of a story
+BEGINNING = datetime.min.replace(tzinfo=timezone.utc)
+
+
+def parse_time(value):
+    """Parse a Taiga timestamp, or pass a datetime through"""
+    if isinstance(value, str):
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return value
+
+
+class _StoryHistory:
+    """History entries of one story, sorted by parsed created_at
+
+    Every entry inside one of the covered (first, last) ranges is cached, so
+    a change inside a range that is not cached does not exist. Ranges fetched
+    by different lookups are merged where they overlap.
+    """
+    __slots__ = ('times', 'entries', 'keys', 'ranges', 'reach')
+
+    def __init__(self):
+        self.times = []
+        self.entries = []
+        self.keys = set()
+        # Disjoint covered ranges, oldest first
+        self.ranges = []
+        # Start of the covered range the pages of the lookup in progress reached
+        self.reach = None
+
+    def cover(self, first, last):
+        """Record that every entry from first to last is cached"""
+        ranges = []
+        for low, high in self.ranges:
+            if high < first or low > last:
+                ranges.append((low, high))
+            else:
+                first, last = min(first, low), max(last, high)
+        ranges.append((first, last))
+        ranges.sort()
+        self.ranges = ranges
+
+    def covers(self, start, end):
+        """Check whether start to end lies inside one covered range"""
+        return any(low <= start and end <= high for low, high in self.ranges)
+
+    def range_start(self, moment):
+        """Start of the covered range holding moment, or moment if there is none"""
+        return next((low for low, high in self.ranges if low <= moment <= high), moment)
+
+    def insert(self, key, created_at, entry):
+        """Add an entry in timestamp order"""
+        index = bisect.bisect_right(self.times, created_at)
+        self.times.insert(index, created_at)
+        self.entries.insert(index, entry)
+        self.keys.add(key)
+        if len(self.times) > MAX_ENTRIES:
+            self.times.pop(0)
+            dropped = self.entries.pop(0)
+            self.keys.discard(entry_key(dropped))
+            self.ranges = [(max(low, self.times[0]), high)
+                           for low, high in self.ranges if high >= self.times[0]]
+
+    def closest(self, target_time, threshold):
+        """Get the entry closest to target_time within threshold, or None"""
+        start = bisect.bisect_left(self.times, target_time - threshold)
+        end = bisect.bisect_right(self.times, target_time + threshold)
+        closest_entry = None
+        min_time_diff = threshold
+        for index in range(start, end):
+            time_diff = abs(self.times[index] - target_time)
+            if time_diff <= min_time_diff:
+                closest_entry = self.entries[index]
+                min_time_diff = time_diff
+        return closest_entry
+
+
+def entry_key(entry):
+    """Identify a history entry, by its id when Taiga sends one"""
+    return entry.get('id') or entry.get('created_at')
+
+
+class HistoryCache:
+    """LRU map {user_story_id: history entries indexed by timestamp}
+
+    A lookup first searches the cached entries. Only when the change is
+    outside the ranges known to be cached are pages fetched, newest first.
+    Once the pages reach a range that is already covered, the pages holding
+    it are skipped, and fetching stops at the first entry older than the
+    change. New history entries do not discard the ranges covered before, so
+    a burst of webhooks for one story reads each history entry about once,
+    and changes past the first page are still found.
+
+    Use `find`, and if it returns MISSING, fetch the pages `add_page` asks
+    for until it returns None, then `find` again with fetched=True.
+
+    Args:
+        max_stories: value[int]: Maximum cached stories, least recently used are evicted
+    """
+    def __init__(self, max_stories):
+        self.max_stories = max_stories
+        self._stories = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.pages = 0
+        self.deep_pages = 0
+
+    def find(self, story_id, target_time, time_threshold_ms=500, fetched=False):
+        """Get the history entry of a change from the cache
+
+        Args:
+            story_id: value[int]: The user story id
+            target_time: value[str|datetime]: Date of the change
+            time_threshold_ms: Optional[value[int]]: Maximum distance from target_time
+            fetched: Optional[value[bool]]: True after fetching pages for this lookup
+
+        Returns:
+            dict|None: The closest entry, None if there is none,
+                or MISSING if pages must be fetched first
+        """
+        target_time = parse_time(target_time)
+        threshold = timedelta(milliseconds=time_threshold_ms)
+        with self._lock:
+            story = self._stories.get(story_id)
+            if story is not None:
+                self._stories.move_to_end(story_id)
+                entry = story.closest(target_time, threshold)
+                if entry is not None or fetched:
+                    self._count(fetched)
+                    return entry
+                if story.covers(target_time - threshold, target_time + threshold):
+                    # Inside a covered range, the change has no history entry
+                    self._count(fetched)
+                    return None
+            elif fetched:
+                self._count(fetched)
+                return None
+            return MISSING
+
+    def _count(self, fetched):
+        """Count a lookup answered with or without fetching"""
+        if fetched:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+    def add_page(self, story_id, history_data, target_time, time_threshold_ms=500, # pylint: disable=too-many-arguments
+                 page=1, page_size=5):
+        """Cache a page of history entries, newest first
+
+        Args:
+            history_data: value[list|None]: The page as returned by the API, None if the call failed
+            page: Optional[value[int]]: The page number, from 1
+            page_size: Optional[value[int]]: Entries per page requested
+
+        Returns:
+            int|None: The next page to fetch, None once the change is covered
+        """
+        target_time = parse_time(target_time)
+        threshold = timedelta(milliseconds=time_threshold_ms)
+        with self._lock:
+            self.pages += 1
+            if page > 1:
+                self.deep_pages += 1
+            if not isinstance(history_data, list):
+                # The call failed, keep the covered ranges as they were
+                return None
+            story = self._stories.get(story_id)
+            if story is None:
+                story = self._stories[story_id] = _StoryHistory()
+                while len(self._stories) > self.max_stories:
+                    self._stories.popitem(last=False)
+            self._stories.move_to_end(story_id)
+            times = [parse_time(entry['created_at']) for entry in history_data]
+            # The first page starts at the newest entry, the next ones where the last one ended
+            last = (times[0] if times else None) if page == 1 else story.reach
+            if last is None:
+                return None
+            if len(history_data) < page_size:
+                # Reached the first change of the story
+                first = BEGINNING
+            else:
+                first = min(times[-1], last)
+            # Covered before inserting, so entries dropped from a full cache leave the range
+            story.cover(first, last)
+            for entry, created_at in zip(history_data, times):
+                key = entry_key(entry)
+                if key not in story.keys:
+                    story.insert(key, created_at, entry)
+            if first is BEGINNING:
+                return None
+            story.reach = story.range_start(last)
+            if story.reach <= target_time - threshold or page >= MAX_PAGES:
+                return None
+            # Skip the pages of entries covered before
+            contiguous = len(story.times) - bisect.bisect_left(story.times, story.reach)
+            return max(page + 1, contiguous // page_size + 1)
+
+    def stats(self):
+        """Return cache counters, hits are history API calls avoided"""
+        return {
+            'stories': len(self._stories),
+            'hits': self.hits,
+            'misses': self.misses,
+            'pages': self.pages,
+            'deep_pages': self.deep_pages,
+        }
+
+
+#Singleton instance for global use
+history_cache = HistoryCache(max_stories=HISTORY_CACHE_SIZE)
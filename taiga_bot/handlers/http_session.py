@@ -0,0 +1,100 @@
+"""
+Pooled, keep-alive HTTP session shared by the Taiga REST client
+"""
+import threading
+from urllib.parse import urlsplit
+import requests # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+from requests.adapters import HTTPAdapter # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+from config.config import (  # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+    TAIGA_HTTP_POOL_CONNECTIONS,
+    TAIGA_HTTP_POOL_MAXSIZE,
+    TAIGA_HTTP_KEEP_ALIVE
+    )
+from handlers.metrics import (  # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+    taiga_request_seconds,
+    http_responses_total,
+    path_template,
+    status_label
+    )
+
+
+class PooledSession:
+    """Thread-safe HTTP session backed by one shared connection pool
+
+    requests.Session keeps per-instance state (cookies, headers) that is not
+    safe to share between threads, so each thread gets its own Session. All of
+    them mount the same HTTPAdapter, whose urllib3 PoolManager is thread-safe,
+    so TCP/TLS connections are reused across threads.
+
+    Args:
+        pool_connections: value[int]: Number of per-host pools to keep
+        pool_maxsize: value[int]: Maximum open connections per host
+            Callers block for a free connection once the limit is reached
+        keep_alive: value[bool]: Reuse connections between requests
+    """
+    def __init__(self, pool_connections, pool_maxsize, keep_alive=True):
+        self.keep_alive = keep_alive
+        self.adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=True
+        )
+        self._local = threading.local()
+        self.requests = 0
+
+    def _session(self):
+        """Get the calling thread's Session, creating it on first use"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount('http://', self.adapter)
+            session.mount('https://', self.adapter)
+            if not self.keep_alive:
+                session.headers['Connection'] = 'close'
+            self._local.session = session
+        return session
+
+    def request(self, method, url, **kwargs):
+        """Send a request through the pool, same signature as requests.request"""
+        self.requests += 1
+        with taiga_request_seconds.time(endpoint=path_template(urlsplit(url).path)):
+            response = self._session().request(method, url, **kwargs)
+        status = status_label(response.status_code)
+        if status is not None:
+            http_responses_total.inc(service='taiga', status=status)
+        return response
+
+    def get(self, url, **kwargs):
+        """Send a GET request through the pool"""
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """Send a POST request through the pool"""
+        return self.request('POST', url, **kwargs)
+
+    def stats(self):
+        """Return connection reuse statistics
+
+        Counts come from the live urllib3 host pools, so keep
+        pool_connections at least as large as the number of hosts called.
+        """
+        pools = self.adapter.poolmanager.pools
+        connections_opened = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                connections_opened += pool.num_connections
+        return {
+            'requests': self.requests,
+            'connections_opened': connections_opened,
+            'connections_reused': max(self.requests - connections_opened, 0),
+            'host_pools': len(pools),
+        }
+
+
+#Singleton instance for global use
+taiga_session = PooledSession(
+    pool_connections=TAIGA_HTTP_POOL_CONNECTIONS,
+    pool_maxsize=TAIGA_HTTP_POOL_MAXSIZE,
+    keep_alive=TAIGA_HTTP_KEEP_ALIVE
+)
@@ -0,0 +1,45 @@
+"""
+Webhook signature verification and payload parsing
+"""
+import hashlib
+import hmac
+import json
+try:
+    import orjson # pylint: disable=import-error # pyright: ignore[reportMissingImports]
+except ImportError:
+    orjson = None
+
+
+def sign(body, key):
+    """Get the HMAC-SHA1 hex digest Taiga sends in X-Taiga-Webhook-Signature
+
+    Args:
+        body: value[bytes]: The raw request body
+        key: value[bytes]: The webhook secret of the project
+    """
+    return hmac.new(key, body, hashlib.sha1).hexdigest()
+
+
+def signature_valid(body, signature, key):
+    """Check a webhook signature in constant time
+
+    Args:
+        body: value[bytes]: The raw request body
+        signature: value[str]: The X-Taiga-Webhook-Signature header
+        key: value[bytes]: The webhook secret of the project
+    """
+    # Header values are latin-1 in WSGI, compare_digest only takes ASCII str
+    return hmac.compare_digest(sign(body, key).encode('ascii'),
+                               signature.encode('latin-1', 'replace'))
+
+
+def parse_payload(body):
+    """Decode a verified webhook body, with orjson when it is installed
+
+    Raises:
+        ValueError: If the body is not a JSON object
+    """
+    payload = orjson.loads(body) if orjson is not None else json.loads(body)
+    if not isinstance(payload, dict):
+        raise ValueError('Webhook body is not a JSON object')
+    return payload
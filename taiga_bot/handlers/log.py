@@ -0,0 +1,110 @@
+"""
+Structured logging with a per-webhook correlation id
+"""
+import atexit
+import contextvars
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import uuid
+from config.config import LOG_LEVEL, LOG_FORMAT, LOG_PAYLOAD_SAMPLE_RATE  # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+
+# Set for the lifetime of one webhook, copied into tasks and threads it starts
+correlation_id = contextvars.ContextVar('correlation_id', default=None)
+
+_listener = None
+
+
+def new_correlation_id():
+    """Get a short random id to tag the log lines of one webhook"""
+    return uuid.uuid4().hex[:12]
+
+
+class CorrelationFilter(logging.Filter):
+    """Adds the current correlation id to records, in the thread that logs them"""
+    def filter(self, record):
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Queues records with their message resolved but the traceback kept apart"""
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line
+
+    Fields passed as extra={'fields': {...}} are added to the object.
+    """
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.fromtimestamp(
+                record.created, datetime.UTC).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'correlation_id', None):
+            entry['correlation_id'] = record.correlation_id
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human readable lines for running in a terminal"""
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-7s %(name)s %(correlation)s%(message)s')
+
+    def format(self, record):
+        correlation = getattr(record, 'correlation_id', None)
+        record.correlation = f'[{correlation}] ' if correlation else ''
+        message = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            message += ' ' + json.dumps(fields, default=str)
+        return message
+
+
+def setup_logging(level=LOG_LEVEL, log_format=LOG_FORMAT):
+    """Route every logger through a queue to one stdout writer thread
+
+    Callers only put records on an unbounded queue, so a slow stdout never
+    blocks the webhook endpoint or the event loop. Safe to call more than once.
+    """
+    global _listener # pylint: disable=global-statement
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if log_format == 'json' else TextFormatter())
+    records = queue.SimpleQueue()
+    handler = _QueueHandler(records)
+    handler.addFilter(CorrelationFilter())
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def log_payload(logger, payload, message='Webhook payload'):
+    """Dump a webhook payload at debug level, or for a sample of webhooks at info level"""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(message, extra={'fields': {'payload': payload}})
+    elif LOG_PAYLOAD_SAMPLE_RATE > 0 and random.random() < LOG_PAYLOAD_SAMPLE_RATE:
+        logger.info(message, extra={'fields': {'payload': payload, 'sampled': True}})
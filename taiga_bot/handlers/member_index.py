@@ -0,0 +1,60 @@
+"""
+Index of guild members by lowercase name
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MemberIndex:
+    """Stores {guild_id: {lowercase_name: member_id}} for O(1) mention lookups
+
+    Built from the member cache when the bot is ready and kept current from
+    member join, update and remove gateway events.
+    """
+    def __init__(self):
+        self._by_name = {}
+        self._names = {}
+
+    def rebuild(self, guild_id, members):
+        """Replace the index for a guild with the provided members"""
+        self._by_name[guild_id] = {}
+        self._names[guild_id] = {}
+        for member in members:
+            self.add(guild_id, member)
+        logger.info("Member index built with %d members", len(self._by_name[guild_id]))
+
+    def add(self, guild_id, member):
+        """Index a member, replacing any name it was indexed under before"""
+        self.remove(guild_id, member.id)
+        name = member.name.lower()
+        self._by_name.setdefault(guild_id, {})[name] = member.id
+        self._names.setdefault(guild_id, {})[member.id] = name
+
+    def remove(self, guild_id, member_id):
+        """Drop a member from the index"""
+        name = self._names.get(guild_id, {}).pop(member_id, None)
+        if name is not None and self._by_name[guild_id].get(name) == member_id:
+            del self._by_name[guild_id][name]
+
+    def rename(self, user):
+        """Re-index a user in every guild they are indexed in, after a username change"""
+        for guild_id, names in self._names.items():
+            if user.id in names:
+                self.add(guild_id, user)
+
+    def contains(self, guild_id, member_id):
+        """Check whether a member is indexed for a guild"""
+        return member_id in self._names.get(guild_id, {})
+
+    def get(self, guild_id, name):
+        """Get the member id for a name, case insensitive, or None"""
+        return self._by_name.get(guild_id, {}).get(name.lower())
+
+    def stats(self):
+        """Return indexed member counts per guild"""
+        return {str(guild_id): len(names) for guild_id, names in self._by_name.items()}
+
+
+#Singleton instance for global use
+member_index = MemberIndex()
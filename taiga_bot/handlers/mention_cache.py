@@ -0,0 +1,91 @@
+"""
+Cache resolving Taiga users to Discord mentions
+"""
+import threading
+import time
+from collections import OrderedDict
+from config.config import MENTION_CACHE_SIZE, MENTION_CACHE_TTL  # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+
+MISSING = object()
+
+
+class MentionCache:
+    """TTL and LRU bounded map {taiga_user_id: (mention_name, {guild_id: discord_member_id})}
+
+    The mention name comes from the @name in the Taiga bio and is cached even
+    when it is None, so users without one are not fetched again. It is shared
+    by every project, as all of them are read with the same Taiga account.
+    The Discord member id is filled in per guild once the name was resolved
+    against that guild.
+
+    Args:
+        max_size: value[int]: Maximum cached users, least recently used are evicted
+        ttl: value[float]: Seconds an entry stays valid
+    """
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id):
+        """Get the cached mention name for a Taiga user
+
+        Returns:
+            str|None: The mention name, None if the user has none,
+                or MISSING if the user must be fetched from Taiga
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(user_id, None)
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id, name):
+        """Cache the mention name found in a Taiga user's bio"""
+        with self._lock:
+            self._entries[user_id] = [time.monotonic() + self.ttl, name, {}]
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def member_id(self, user_id, guild_id):
+        """Get the Discord member id resolved for a Taiga user in a guild, or None"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            return entry[2].get(guild_id) if entry is not None else None
+
+    def set_member(self, user_id, guild_id, member_id):
+        """Remember the guild member a Taiga user's mention name resolved to"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                entry[2][guild_id] = member_id
+
+    def invalidate(self, user_id):
+        """Forget a Taiga user, e.g. after their mention name did not resolve"""
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def stats(self):
+        """Return cache counters"""
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+        }
+
+
+#Singleton instance for global use
+mention_cache = MentionCache(max_size=MENTION_CACHE_SIZE, ttl=MENTION_CACHE_TTL)
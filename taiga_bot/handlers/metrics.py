@@ -0,0 +1,188 @@
+"""
+Prometheus text-format metrics
+"""
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds, from a cached Taiga lookup up to a Discord request stuck behind a rate limit
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+
+def path_template(path):
+    """Replace ids in a URL path so it can be used as a label, e.g. /api/v1/users/:id"""
+    return ID_SEGMENT.sub('/:id', path.split('?', 1)[0])
+
+
+def status_label(status):
+    """Group an HTTP status for the responses counter, None for statuses not counted"""
+    if status in (401, 429):
+        return str(status)
+    if status is not None and status >= 500:
+        return '5xx'
+    return None
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """Monotonic counter with optional labels
+
+    Args:
+        name: value[str]: Metric name
+        documentation: value[str]: HELP text
+        labels: Optional[value[tuple]]: Label names, passed as keyword arguments to inc
+    """
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        """Add to the counter"""
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    @property
+    def family(self):
+        """Name of the HELP, TYPE and sample lines, counters end in _total"""
+        return f'{self.name}_total'
+
+    def samples(self):
+        """Yield exposition lines"""
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f'{self.family}{_format_labels(self.labels, key)} {value}'
+
+
+class Histogram:
+    """Cumulative histogram with optional labels
+
+    Args:
+        name: value[str]: Metric name
+        documentation: value[str]: HELP text
+        labels: Optional[value[tuple]]: Label names, passed as keyword arguments to observe
+        buckets: Optional[value[tuple]]: Upper bounds, +Inf is added
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        """Record one observation"""
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+                    break
+            entry[1] += 1
+            entry[2] += value
+
+    @property
+    def family(self):
+        """Name of the HELP and TYPE lines, the samples add _bucket, _sum and _count"""
+        return self.name
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a block, also when it raises"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        """Yield exposition lines"""
+        with self._lock:
+            values = {key: (list(entry[0]), entry[1], entry[2])
+                      for key, entry in self._values.items()}
+        for key, (counts, count, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels, key, ('le', repr(float(bound))))
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            yield f'{self.name}_bucket{_format_labels(self.labels, key, ("le", "+Inf"))} {count}'
+            yield f'{self.name}_sum{_format_labels(self.labels, key)} {total}'
+            yield f'{self.name}_count{_format_labels(self.labels, key)} {count}'
+
+
+class Registry:
+    """Collection of metrics rendered together for the /metrics endpoint"""
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        """Add a metric, returns it for assignment"""
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.family} {metric.documentation}')
+            lines.append(f'# TYPE {metric.family} {metric.kind}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+#Singleton instances for global use
+registry = Registry()
+
+signature_seconds = registry.register(Histogram(
+    'taigabot_signature_verification_seconds', 'Time spent verifying webhook signatures',
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01)))
+handler_seconds = registry.register(Histogram(
+    'taigabot_handler_seconds', 'Time spent handling one webhook or merged burst', ('type',)))
+taiga_request_seconds = registry.register(Histogram(
+    'taigabot_taiga_request_seconds', 'Taiga API request time by endpoint', ('endpoint',)))
+discord_request_seconds = registry.register(Histogram(
+    'taigabot_discord_request_seconds', 'Discord request time by operation, excluding queueing',
+    ('operation',)))
+webhook_to_post_seconds = registry.register(Histogram(
+    'taigabot_webhook_to_post_seconds', 'Time from acknowledging a webhook to finishing its post'))
+warmup_seconds = registry.register(Histogram(
+    'taigabot_warmup_seconds', 'Time spent on each startup warm-up step', ('step',),
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)))
+webhooks_total = registry.register(Counter(
+    'taigabot_webhooks', 'Verified webhooks received by type and action', ('type', 'action')))
+taiga_retries_total = registry.register(Counter(
+    'taigabot_taiga_retries', 'Taiga API calls retried after a failed attempt'))
+auth_refreshes_total = registry.register(Counter(
+    'taigabot_auth_refreshes', 'Taiga tokens obtained by refresh or password authentication'))
+discord_writes_suppressed_total = registry.register(Counter(
+    'taigabot_discord_writes_suppressed',
+    'Discord writes skipped because they would not change the thread, by operation',
+    ('operation',)))
+http_responses_total = registry.register(Counter(
+    'taigabot_http_responses', '401, 429 and 5xx responses by service', ('service', 'status')))
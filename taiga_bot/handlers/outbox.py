@@ -0,0 +1,254 @@
+"""
+Queue of verified webhooks between ingress processes and the Discord sender
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from config.config import ( # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+    BOT_ROLE,
+    OUTBOX_PATH,
+    OUTBOX_POLL_INTERVAL,
+    WEBHOOK_MAX_ATTEMPTS
+)
+
+logger = logging.getLogger(__name__)
+
+# Rows read from the outbox at a time
+TAKE_BATCH = 100
+
+
+class Outbox:
+    """SQLite (WAL mode) queue written by any number of processes and read by one
+
+    Ingress processes write each verified webhook as it is accepted. SQLite
+    runs one write transaction at a time, so row ids grow in the order the
+    webhooks were accepted, whichever ingress took them, and the reader
+    only has to remember the last id it took.
+
+    Ingress processes only verify and store webhooks. Fetching from Taiga and
+    rendering stay in the sender, so more ingress processes accept webhooks
+    faster but do not fetch or render any faster.
+
+    For the sender's pipeline it is the durable store: rows stay until they
+    are acknowledged, and those left over from a restart are replayed, so
+    delivery is at-least-once. Acknowledgements do not wait, they are
+    deleted in batches by a writer thread.
+
+    Args:
+        path: value[str]: SQLite database file
+        max_attempts: value[int]: Replays after which a row is dropped
+    """
+    def __init__(self, path, max_attempts=5):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_attempts = max_attempts
+        # Other processes hold the write lock for short transactions only
+        self._conn = sqlite3.connect(
+            path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=FULL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS webhooks ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'body BLOB NOT NULL, '
+            'route INTEGER, '
+            'correlation_id TEXT, '
+            'created_at REAL NOT NULL, '
+            'attempts INTEGER NOT NULL DEFAULT 0)'
+        )
+        self._lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._acks = []
+        # Last row handed back by replay, newer rows are read with take
+        self.replayed_id = 0
+
+        # Counters
+        self.written = 0
+        self.acked = 0
+        self.replayed = 0
+        self.dropped = 0
+
+        self._writer = threading.Thread(target=self._ack_loop, daemon=True)
+        self._writer.start()
+
+    def put(self, body, request_id=None, route=None):
+        """Durably store a verified webhook
+
+        Args:
+            body: value[bytes]: The raw webhook body
+            request_id: Optional[value[str]]: Correlation id of the webhook
+            route: Optional[value[int]]: Project id of the route the webhook
+                was verified against, None for the default route
+
+        Raises:
+            sqlite3.Error: If the webhook could not be written
+        """
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO webhooks (body, route, correlation_id, created_at) '
+                'VALUES (?, ?, ?, ?)',
+                (body, route, request_id, time.time())
+            )
+        self.written += 1
+
+    def take(self, after_id, limit):
+        """Get the oldest rows after an id
+
+        Returns:
+            list: [(id, body, route, correlation_id, created_at)]
+        """
+        with self._lock:
+            return self._conn.execute(
+                'SELECT id, body, route, correlation_id, created_at FROM webhooks '
+                'WHERE id > ? ORDER BY id LIMIT ?', (after_id, limit)
+            ).fetchall()
+
+    def ack(self, item_id):
+        """Mark a row as handled, it is deleted with the next batch"""
+        with self._cond:
+            self._acks.append((item_id,))
+            self._cond.notify()
+
+    def _ack_loop(self):
+        """Delete acknowledged rows in batches"""
+        while True:
+            with self._cond:
+                while not self._acks:
+                    self._cond.wait()
+                acks, self._acks = self._acks, []
+            with self._lock:
+                try:
+                    self._conn.execute('BEGIN')
+                    self._conn.executemany('DELETE FROM webhooks WHERE id = ?', acks)
+                    self._conn.execute('COMMIT')
+                    self.acked += len(acks)
+                except sqlite3.Error as e:
+                    # Left in the outbox, they are replayed after a restart
+                    logger.error("Outbox acknowledgement failed: %s", e)
+                    if self._conn.in_transaction:
+                        self._conn.execute('ROLLBACK')
+
+    def replay(self):
+        """Return rows left over from a previous run of the sender, oldest first
+
+        Each replay counts as an attempt. Rows past max_attempts are dropped.
+
+        Returns:
+            list: [(item_id, body, route)]
+        """
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            self._conn.execute('UPDATE webhooks SET attempts = attempts + 1')
+            dropped = self._conn.execute(
+                'DELETE FROM webhooks WHERE attempts > ?', (self.max_attempts,)
+            ).rowcount
+            rows = self._conn.execute(
+                'SELECT id, body, route FROM webhooks ORDER BY id').fetchall()
+            self.replayed_id = self._conn.execute(
+                'SELECT COALESCE(MAX(id), 0) FROM webhooks').fetchone()[0]
+            self._conn.execute('COMMIT')
+        if dropped:
+            logger.error("Dropped %d webhooks after %d attempts", dropped, self.max_attempts)
+        self.dropped += dropped
+        self.replayed += len(rows)
+        return rows
+
+    def stats(self):
+        """Return the rows waiting in the outbox and this process's counters"""
+        with self._lock:
+            depth = self._conn.execute('SELECT COUNT(*) FROM webhooks').fetchone()[0]
+        return {
+            'depth': depth,
+            'written': self.written,
+            'acked': self.acked,
+            'replayed': self.replayed,
+            'dropped': self.dropped,
+        }
+
+
+class OutboxSender:
+    """Hands new outbox rows to the sender's webhook pipeline in outbox order
+
+    The pipeline handles the webhooks of one user story in the order it
+    was given them, so each story is posted in the order the ingress
+    processes accepted its webhooks. Rows are acknowledged by the pipeline
+    once handled. The reader waits while the pipeline is full.
+
+    Args:
+        outbox: value[Outbox]: The queue to drain
+        poll_interval: value[float]: Seconds between reads of an empty outbox
+    """
+    def __init__(self, outbox, poll_interval):
+        self.outbox = outbox
+        self.poll_interval = poll_interval
+        self._pipeline = None
+        self._task = None
+        self._last_id = 0
+
+        # Counters
+        self.read = 0
+        self.lag = None
+
+    def start(self, pipeline):
+        """Start reading the outbox on the running loop, safe to call more than once
+
+        Args:
+            pipeline: value[WebhookPipeline]: Started pipeline using the outbox as its
+                store, it already replayed the rows left over from a previous run
+        """
+        if self._task is not None:
+            return
+        self._pipeline = pipeline
+        self._last_id = self.outbox.replayed_id
+        self._task = asyncio.get_running_loop().create_task(self._read())
+        logger.info("Outbox sender started")
+
+    async def _read(self):
+        """Submit new outbox rows to the pipeline, oldest first"""
+        while True:
+            try:
+                rows = await asyncio.to_thread(self.outbox.take, self._last_id, TAKE_BATCH)
+            except sqlite3.Error as e:
+                logger.error("Reading the outbox failed: %s", e)
+                rows = []
+            for item_id, body, route, request_id, created_at in rows:
+                while self._pipeline.depth() >= self._pipeline.max_queue:
+                    await asyncio.sleep(self.poll_interval)
+                self._submit(item_id, body, route, request_id)
+                self._last_id = item_id
+                self.read += 1
+                self.lag = round(time.time() - created_at, 4)
+            if len(rows) < TAKE_BATCH:
+                await asyncio.sleep(self.poll_interval)
+
+    def _submit(self, item_id, body, route, request_id):
+        """Queue one row in the pipeline"""
+        try:
+            payload = json.loads(body)
+        except ValueError as e:
+            logger.error("Discarding unreadable outbox webhook %s: %s", item_id, e)
+            self.outbox.ack(item_id)
+            return
+        self._pipeline.submit(payload, request_id=request_id, route=route, item_id=item_id)
+
+    def stats(self):
+        """Return rows read and seconds from outbox to pipeline of the last row"""
+        return {
+            'read': self.read,
+            'lag': self.lag,
+            'outbox': self.outbox.stats(),
+        }
+
+
+#Singleton instances for global use, a single process bot does not use the outbox
+outbox = Outbox(OUTBOX_PATH, max_attempts=WEBHOOK_MAX_ATTEMPTS) if BOT_ROLE != 'all' else None
+outbox_sender = OutboxSender(
+    outbox,
+    poll_interval=OUTBOX_POLL_INTERVAL
+) if BOT_ROLE == 'sender' else None
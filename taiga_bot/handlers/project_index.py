@@ -0,0 +1,185 @@
+"""
+In-process index of Taiga project metadata
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .taiga_api import (
+    list_swimlanes,
+    list_userstory_statuses,
+    list_memberships,
+    list_user_stories
+)
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+# Seconds to wait before retrying a bulk load that failed
+LOAD_RETRY_SECONDS = 60
+
+
+class ProjectMetadata:
+    """Swimlanes, statuses, memberships and story swimlanes of one project"""
+    def __init__(self, project_id):
+        self.project_id = project_id
+        self.swimlanes = {}
+        self.statuses = {}
+        self.memberships = {}
+        self.story_swimlanes = {}
+        self.loaded_at = None
+
+    def swimlane_id(self, name):
+        """Get a swimlane id by name, or None"""
+        for swimlane_id, swimlane_name in self.swimlanes.items():
+            if swimlane_name == name:
+                return swimlane_id
+        return None
+
+
+class ProjectIndex:
+    """Project metadata loaded in bulk with one list call per kind
+
+    After the bulk load the index is patched from webhook payloads, so the
+    swimlane of a user story resolves without any per-webhook HTTP call.
+    Stories created after the load are fetched once and recorded.
+    """
+    def __init__(self):
+        self._projects = {}
+        self._failed_at = {}
+        self._locks = {}
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    def is_loaded(self, project_id):
+        """Check whether a project was bulk loaded"""
+        project = self._projects.get(project_id)
+        return project is not None and project.loaded_at is not None
+
+    def load(self, project_id):
+        """Bulk load a project's metadata from the Taiga API
+
+        Returns:
+            bool: True if every list call succeeded
+        """
+        project = ProjectMetadata(project_id)
+        # The four lists do not depend on each other
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            calls = [executor.submit(call, project_id) for call in (
+                list_swimlanes, list_userstory_statuses, list_memberships, list_user_stories)]
+            swimlanes, statuses, memberships, stories = [call.result() for call in calls]
+        if None in (swimlanes, statuses, memberships, stories):
+            logger.warning("Could not load metadata for project %s", project_id)
+            self._failed_at[project_id] = time.monotonic()
+            return False
+        project.swimlanes = {swimlane['id']: swimlane['name'] for swimlane in swimlanes}
+        project.statuses = {status['id']: status for status in statuses}
+        project.memberships = {
+            membership['user']: membership for membership in memberships
+            if membership.get('user') is not None
+        }
+        project.story_swimlanes = {story['id']: story.get('swimlane') for story in stories}
+        project.loaded_at = time.time()
+        self._projects[project_id] = project
+        self.loads += 1
+        logger.info("Project %s metadata loaded: %d swimlanes, %d statuses, %d memberships, "
+                    "%d user stories", project_id, len(project.swimlanes), len(project.statuses),
+                    len(project.memberships), len(project.story_swimlanes))
+        return True
+
+    def ensure_loaded(self, project_id):
+        """Load a project once, concurrent callers wait for the same load
+
+        Different projects load in parallel.
+        """
+        if project_id is None or self.is_loaded(project_id):
+            return
+        with self._locks.setdefault(project_id, threading.Lock()):
+            failed_at = self._failed_at.get(project_id)
+            if failed_at is not None and time.monotonic() - failed_at < LOAD_RETRY_SECONDS:
+                return
+            if not self.is_loaded(project_id):
+                self.load(project_id)
+
+    def reload_swimlanes(self, project_id):
+        """Refresh the swimlane list, e.g. after a swimlane was added"""
+        project = self._projects.get(project_id)
+        swimlanes = list_swimlanes(project_id)
+        if project is not None and swimlanes is not None:
+            project.swimlanes = {swimlane['id']: swimlane['name'] for swimlane in swimlanes}
+
+    def story_swimlane(self, project_id, story_id):
+        """Get the swimlane of a user story
+
+        Returns:
+            tuple: (swimlane_id, swimlane_name), both None if the story has no
+                swimlane, or MISSING if the story is not indexed
+        """
+        project = self._projects.get(project_id)
+        if project is None or story_id not in project.story_swimlanes:
+            self.misses += 1
+            return MISSING
+        self.hits += 1
+        swimlane_id = project.story_swimlanes[story_id]
+        if swimlane_id is None:
+            return None, None
+        return swimlane_id, project.swimlanes.get(swimlane_id)
+
+    def record_story(self, project_id, story_id, swimlane_id, swimlane_name=None):
+        """Record the swimlane of a user story fetched outside the bulk load"""
+        project = self._projects.get(project_id)
+        if project is None:
+            return
+        project.story_swimlanes[story_id] = swimlane_id
+        if swimlane_id is not None and swimlane_name is not None:
+            project.swimlanes[swimlane_id] = swimlane_name
+
+    def patch(self, payload):
+        """Apply the state carried by a user story webhook to the index"""
+        data = payload.get('data') or {}
+        project_id = (data.get('project') or {}).get('id')
+        project = self._projects.get(project_id)
+        story_id = data.get('id')
+        if project is None or story_id is None:
+            return
+        if payload.get('action') == 'delete':
+            project.story_swimlanes.pop(story_id, None)
+            return
+        status = data.get('status')
+        if isinstance(status, dict) and status.get('id') is not None:
+            project.statuses[status['id']] = {**project.statuses.get(status['id'], {}), **status}
+        swimlane_diff = ((payload.get('change') or {}).get('diff') or {}).get('swimlane')
+        if isinstance(swimlane_diff, dict) and 'to' in swimlane_diff:
+            if swimlane_diff['to'] is None:
+                project.story_swimlanes[story_id] = None
+                return
+            swimlane_id = project.swimlane_id(swimlane_diff['to'])
+            if swimlane_id is None:
+                # Unknown name, let the next lookup fetch the story again
+                project.story_swimlanes.pop(story_id, None)
+            else:
+                project.story_swimlanes[story_id] = swimlane_id
+
+    def stats(self):
+        """Return index sizes and lookup counters"""
+        return {
+            'projects': {
+                str(project_id): {
+                    'swimlanes': len(project.swimlanes),
+                    'statuses': len(project.statuses),
+                    'memberships': len(project.memberships),
+                    'user_stories': len(project.story_swimlanes),
+                }
+                for project_id, project in self._projects.items()
+            },
+            'hits': self.hits,
+            'misses': self.misses,
+            'loads': self.loads,
+        }
+
+
+#Singleton instance for global use
+project_index = ProjectIndex()
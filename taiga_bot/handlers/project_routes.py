@@ -0,0 +1,123 @@
+"""
+Routing of Taiga projects to Discord forums and webhook secrets
+"""
+from dataclasses import dataclass
+from config.config import ( # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+    FORUM_ID,
+    SECRET_KEY,
+    TAIGA_PROJECT_ID,
+    TAIGA_PROJECTS
+)
+
+
+def payload_project_id(payload):
+    """Get the Taiga project id of a webhook payload, or None"""
+    project = (payload.get('data') or {}).get('project')
+    return project.get('id') if isinstance(project, dict) else None
+
+
+@dataclass(frozen=True)
+class ProjectRoute:
+    """Where the webhooks of a Taiga project are verified and posted
+
+    project_id is None for the default route, which serves every project
+    without a route of its own.
+    """
+    project_id: int | None
+    forum_id: int
+    secret_key: bytes
+
+
+class ProjectRoutes:
+    """Maps Taiga project ids to routes, and forum ids back to them
+
+    Each forum belongs to one route, because thread lookups by ref are
+    scoped per forum and refs are only unique within a project.
+
+    Args:
+        projects: value[dict]: {project_id: {'forum_id': int, 'secret_key': str}}
+        default: Optional[ProjectRoute]: Route for projects missing from projects
+
+    Raises:
+        ValueError: If an entry is incomplete or two routes share a forum
+    """
+    def __init__(self, projects, default=None):
+        self.default = default
+        self._by_project = {}
+        self._by_forum = {}
+        for project_id, entry in projects.items():
+            if not entry.get('forum_id') or not entry.get('secret_key'):
+                raise ValueError(f"Project {project_id} needs a forum_id and a secret_key")
+            route = ProjectRoute(
+                int(project_id), int(entry['forum_id']), entry['secret_key'].encode('utf-8'))
+            self._by_project[route.project_id] = route
+            self._add_forum(route)
+        if default is not None:
+            self._add_forum(default)
+
+    def _add_forum(self, route):
+        """Index a route by its forum"""
+        if route.forum_id in self._by_forum:
+            raise ValueError(f"Forum {route.forum_id} is routed to more than one project")
+        self._by_forum[route.forum_id] = route
+
+    def for_webhook(self, project_id=None):
+        """Get the route whose secret signs webhooks posted for a project
+
+        Args:
+            project_id: Optional[value[int]]: The id in the webhook URL,
+                None for the default route
+
+        Returns:
+            ProjectRoute|None: None if nothing is routed there
+        """
+        if project_id is None:
+            return self.default
+        return self._by_project.get(project_id)
+
+    def serves(self, route, project_id):
+        """Check that webhooks verified against a route may be about a project
+
+        A project route serves only its own project, the default route only
+        projects without a route of their own, so no secret can post to
+        another project's forum.
+
+        Args:
+            route: value[ProjectRoute]: The route the webhook was verified against
+            project_id: Optional[value[int]]: The project of the payload, None if it has none
+        """
+        if project_id is None:
+            return True
+        if route.project_id is not None:
+            return project_id == route.project_id
+        return project_id not in self._by_project
+
+    def for_forum(self, forum_id):
+        """Get the route posting to a forum, or None"""
+        return self._by_forum.get(forum_id)
+
+    def routes(self):
+        """Get every route, one per forum"""
+        return list(self._by_forum.values())
+
+    def project_ids(self):
+        """Get the ids of the projects to load at startup"""
+        ids = list(self._by_project)
+        if TAIGA_PROJECT_ID is not None and TAIGA_PROJECT_ID not in self._by_project:
+            ids.append(TAIGA_PROJECT_ID)
+        return ids
+
+    def stats(self):
+        """Return the forum of every routed project"""
+        routes = {str(project_id): route.forum_id for project_id, route in self._by_project.items()}
+        if self.default is not None:
+            routes['default'] = self.default.forum_id
+        return routes
+
+
+#Singleton instance for global use
+project_routes = ProjectRoutes(
+    TAIGA_PROJECTS,
+    default=ProjectRoute(None, FORUM_ID, SECRET_KEY.encode('utf-8'))
+    if FORUM_ID is not None and SECRET_KEY else None
+)
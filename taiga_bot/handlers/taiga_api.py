@@ -1,10 +1,16 @@
 """
 Handler for Taiga API calls
 """
+import logging
 from datetime import datetime, timedelta
 import requests # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
 from config.config import TAIGA_BASE_URL  # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+from handlers.http_session import taiga_session  # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
 from handlers.taiga_api_auth import taiga_auth  # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+from handlers.metrics import taiga_retries_total  # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+from handlers.history_cache import history_cache, MISSING  # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+
+logger = logging.getLogger(__name__)
 
 def get_user_story_history(
     user_story_id,
@@ -24,7 +30,7 @@ def get_user_story_history(
                 If target_time is provided, will return the entry 
                 that is closest to target_time within this threshold
                 default: 500ms
-        limit: Optional[value[int]]: Number of entries to search and return
+        limit: Optional[value[int]]: Number of entries per page fetched
             default: 5
         retries: Optional[value[int]]: Number of retries if API call fails
             default: 3
@@ -32,17 +38,46 @@ def get_user_story_history(
     Returns:
         list: User story history if successful, None if failed
     """
-    # If target_time is a string, parse it to datetime
-    if isinstance(target_time, str):
-        target_time = datetime.fromisoformat(target_time.replace('Z', '+00:00'))
+    if not target_time:
+        # Make request to get user story history with pagination
+        history_data = generic_api_call(history_url(user_story_id, limit), retries)
+        return find_history_entry(history_data, target_time, time_threshold_ms)
 
-    # Make request to get user story history with pagination
-    history_url = (
+    # Fetch only entries newer than the cached ones, and older pages if needed
+    entry = history_cache.find(user_story_id, target_time, time_threshold_ms)
+    if entry is not MISSING:
+        return entry
+    page = 1
+    while page is not None:
+        page = history_cache.add_page(
+            user_story_id, generic_api_call(history_url(user_story_id, limit, page), retries),
+            target_time, time_threshold_ms, page, limit)
+    return history_cache.find(user_story_id, target_time, time_threshold_ms, fetched=True)
+
+
+def history_url(user_story_id, limit=5, page=1):
+    """Build the user story history URL, newest entries first"""
+    return (
         f"{TAIGA_BASE_URL}/api/v1/history/userstory/"
-        f"{user_story_id}?page_size={limit}&order_by=-created_date"
+        f"{user_story_id}?page_size={limit}&page={page}&order_by=-created_date"
         )
 
-    history_data = generic_api_call(history_url, retries)
+
+def find_history_entry(history_data, target_time=None, time_threshold_ms=500):
+    """Pick the history entry closest to target_time
+
+    Args:
+        history_data: value[list|None]: History entries as returned by the API
+        target_time: Optional[value[str|datetime]]: Timestamp to match
+        time_threshold_ms: Optional[value[int]]: Maximum distance from target_time
+
+    Returns:
+        dict: The closest entry within the threshold, or None
+        list: All entries if no target_time was provided
+    """
+    # If target_time is a string, parse it to datetime
+    if isinstance(target_time, str):
+        target_time = datetime.fromisoformat(target_time.replace('Z', '+00:00'))
 
     if target_time:
         # Convert threshold to timedelta
@@ -50,7 +85,7 @@ def get_user_story_history(
         # Find the entry closest to target_time within threshold
         closest_entry = None
         min_time_diff = threshold
-        for entry in history_data:
+        for entry in history_data or []:
             entry_time = datetime.fromisoformat(entry['created_at'].replace('Z', '+00:00'))
             time_diff = abs(entry_time - target_time)
             if time_diff <= threshold and time_diff <= min_time_diff:
@@ -103,17 +138,96 @@ def get_swimlane(swimlane_id, retries=3):
 
     return generic_api_call(url, retries)
 
-def get_headers():
+def list_swimlanes(project_id, retries=3):
+    """List every swimlane of a project
+
+    Args:
+        project_id: value[int]: The ID of the project
+        retries: Optional[int]: Number of retries if API call fails
+
+    Returns:
+        list: Swimlanes if successful, None if failed
+    """
+    url = f"{TAIGA_BASE_URL}/api/v1/swimlanes?project={project_id}"
+
+    return generic_api_call(url, retries, paginate=False)
+
+def list_userstory_statuses(project_id, retries=3):
+    """List every user story status of a project
+
+    Args:
+        project_id: value[int]: The ID of the project
+        retries: Optional[int]: Number of retries if API call fails
+
+    Returns:
+        list: Statuses if successful, None if failed
+    """
+    url = f"{TAIGA_BASE_URL}/api/v1/userstory-statuses?project={project_id}"
+
+    return generic_api_call(url, retries, paginate=False)
+
+def list_memberships(project_id, retries=3):
+    """List every membership of a project
+
+    Args:
+        project_id: value[int]: The ID of the project
+        retries: Optional[int]: Number of retries if API call fails
+
+    Returns:
+        list: Memberships if successful, None if failed
+    """
+    url = f"{TAIGA_BASE_URL}/api/v1/memberships?project={project_id}"
+
+    return generic_api_call(url, retries, paginate=False)
+
+def list_user_stories(project_id, retries=3, page_size=100):
+    """List every user story of a project, one page at a time
+
+    Args:
+        project_id: value[int]: The ID of the project
+        retries: Optional[int]: Number of retries if API call fails
+        page_size: Optional[int]: User stories fetched per request
+
+    Returns:
+        list: User stories if successful, None if any page failed
+    """
+    url = f"{TAIGA_BASE_URL}/api/v1/userstories?project={project_id}&page_size={page_size}"
+    stories = []
+    page = 1
+    while True:
+        response = api_response(f"{url}&page={page}", retries)
+        if response is None:
+            return None
+        stories.extend(response.json())
+        # Taiga sets x-pagination-next to the next page's URL, empty on the last page
+        if not response.headers.get('x-pagination-next'):
+            return stories
+        page += 1
+
+def get_headers(token=None, paginate=True):
     """Get headers with valid authentication token"""
-    token = taiga_auth.get_token()
+    token = token or taiga_auth.get_token()
     if not token:
         return None
-    return {
+    headers = {
         "Authorization": f"Bearer {token}",
         "Content-Type": "application/json"
     }
+    if not paginate:
+        # Return the whole list in one response
+        headers["x-disable-pagination"] = "True"
+    return headers
 
-def generic_api_call(url, retries=3):
+def authorized_get(url, paginate=True):
+    """GET `url` with the cached token, renewing it once if Taiga answers 401"""
+    token = taiga_auth.get_token()
+    response = taiga_session.get(url, headers=get_headers(token, paginate), timeout=30)
+    if response.status_code == 401:
+        token = taiga_auth.handle_unauthorized(token)
+        response = taiga_session.get(url, headers=get_headers(token, paginate), timeout=30)
+    return response
+
+def generic_api_call(url, retries=3, paginate=True):
     """Make a generic API call to Taiga API
 
     Args:
@@ -121,29 +235,54 @@ def generic_api_call(url, retries=3):
             Full url should be provided i.e. 
                 https://taiga.example.com/api/v1/userstories/172
         retries: Optional[int]: Number of retries if API call fails
+        paginate: Optional[bool]: False to get list endpoints in a single page
 
     Returns:
         dict: Response data if successful, None if failed
     """
-    print(f"\nMaking API call: {url}")
+    response = api_response(url, retries, paginate)
+    if response is None:
+        return None
     try:
-        response = requests.get(url, headers=get_headers(), timeout=30)
+        return response.json()
+    except ValueError as e:
+        logger.error("Error decoding %s: %s", url, e)
+        return None
+
+def api_response(url, retries=3, paginate=True):
+    """GET a Taiga API URL, retrying failed calls
+
+    Args:
+        url: Value[str]: The full URL to call
+        retries: Optional[int]: Number of retries if API call fails
+        paginate: Optional[bool]: False to get list endpoints in a single page
+
+    Returns:
+        requests.Response: The successful response, None if failed
+    """
+    logger.debug("Making API call: %s", url)
+    try:
+        response = authorized_get(url, paginate)
         if response.status_code != 200:
             while retries > 0:
-                print(f"Retrying API call (attempt {3 - retries + 1})...")
+                logger.info("Retrying API call %s (attempt %d)...", url, 3 - retries + 1)
+                taiga_retries_total.inc()
                 response.status_code = None
-                response = requests.get(url, headers=get_headers(), timeout=30)
-                print(f"response.status_code: {response.status_code}")
+                response = authorized_get(url, paginate)
+                logger.debug("response.status_code: %s", response.status_code)
                 if response.status_code != 200:
                     retries -= 1
                 else:
-                    return response.json()
+                    return response
         response.raise_for_status()
-        return response.json()
+        return response
     except requests.exceptions.RequestException as e:
-        print(f"Error fetching: {e}")
+        logger.error("Error fetching %s: %s", url, e)
+        return None
+    except ValueError as e:
+        # Renewing the token failed
+        logger.error("Error authenticating for %s: %s", url, e)
         return None
-
 
 #if __name__ == "__main__":
 #    # Example usage
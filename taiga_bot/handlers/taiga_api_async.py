@@ -0,0 +1,179 @@
+"""
+Asyncio counterpart of handlers.taiga_api
+
+Runs Taiga lookups on the bot's event loop instead of one blocking
+requests call per OS thread. Authentication is shared with TaigaAuth:
+the cached token is read without I/O, and renewals run in a worker thread.
+"""
+import asyncio
+import logging
+import time
+from urllib.parse import urlsplit
+import aiohttp # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+import requests # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+from config.config import (  # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+    TAIGA_BASE_URL,
+    TAIGA_HTTP_POOL_MAXSIZE,
+    TAIGA_HTTP_KEEP_ALIVE
+    )
+from handlers.taiga_api import history_url, find_history_entry  # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+from handlers.history_cache import history_cache, MISSING  # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+from handlers.taiga_api_auth import taiga_auth  # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+from handlers.metrics import (  # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+    taiga_request_seconds,
+    taiga_retries_total,
+    http_responses_total,
+    path_template,
+    status_label
+    )
+
+logger = logging.getLogger(__name__)
+
+_session: aiohttp.ClientSession | None = None
+
+
+def _get_session():
+    """Get the shared ClientSession, creating it on the running loop"""
+    global _session # pylint: disable=global-statement
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit_per_host=TAIGA_HTTP_POOL_MAXSIZE,
+            force_close=not TAIGA_HTTP_KEEP_ALIVE
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=30)
+        )
+    return _session
+
+
+async def close():
+    """Close the shared ClientSession"""
+    if _session is not None and not _session.closed:
+        await _session.close()
+
+
+async def get_token():
+    """Get a valid token, renewing it off the event loop when needed"""
+    token = taiga_auth.cached_token()
+    if token:
+        return token
+    return await asyncio.to_thread(taiga_auth.get_token)
+
+
+def get_headers(token):
+    """Get headers for the provided authentication token"""
+    return {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json"
+    }
+
+
+async def _authorized_get(url):
+    """GET `url` with the cached token, renewing it once if Taiga answers 401
+
+    Returns:
+        tuple: (status, data) where data is the decoded JSON body or None
+    """
+    session = _get_session()
+    token = await get_token()
+    status, data = await _timed_get(session, url, token)
+    if status != 401:
+        return status, data
+    token = await asyncio.to_thread(taiga_auth.handle_unauthorized, token)
+    return await _timed_get(session, url, token)
+
+
+async def _timed_get(session, url, token):
+    """GET `url` once, recording its duration and error status
+
+    Returns:
+        tuple: (status, data) where data is the decoded JSON body or None
+    """
+    started = time.perf_counter()
+    try:
+        async with session.get(url, headers=get_headers(token)) as response:
+            data = await response.json() if response.status == 200 else None
+    finally:
+        taiga_request_seconds.observe(
+            time.perf_counter() - started, endpoint=path_template(urlsplit(url).path))
+    status = status_label(response.status)
+    if status is not None:
+        http_responses_total.inc(service='taiga', status=status)
+    return response.status, data
+
+
+async def generic_api_call(url, retries=3):
+    """Make a generic API call to Taiga API
+
+    Args:
+        url: Value[str]: The URL to call
+            Full url should be provided i.e.
+                https://taiga.example.com/api/v1/userstories/172
+        retries: Optional[int]: Number of retries if API call fails
+
+    Returns:
+        dict: Response data if successful, None if failed
+    """
+    logger.debug("Making async API call: %s", url)
+    attempt = 0
+    while True:
+        try:
+            status, data = await _authorized_get(url)
+            if status == 200:
+                return data
+            logger.debug("response.status_code: %s", status)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error("Error fetching %s: %s", url, e)
+        except (requests.RequestException, ValueError) as e:
+            # Renewing the token failed, Taiga auth may be down
+            logger.error("Error authenticating for %s: %s", url, e)
+        if attempt >= retries:
+            return None
+        attempt += 1
+        taiga_retries_total.inc()
+        logger.info("Retrying API call %s (attempt %d)...", url, attempt)
+
+
+async def get_user_story_history(
+    user_story_id,
+    target_time=None,
+    time_threshold_ms=500,
+    limit=5,
+    retries=3
+    ):
+    """Get user story history from Taiga API
+
+    See handlers.taiga_api.get_user_story_history for the arguments.
+    """
+    if not target_time:
+        history_data = await generic_api_call(history_url(user_story_id, limit), retries)
+        return find_history_entry(history_data, target_time, time_threshold_ms)
+
+    entry = history_cache.find(user_story_id, target_time, time_threshold_ms)
+    if entry is not MISSING:
+        return entry
+    page = 1
+    while page is not None:
+        page = history_cache.add_page(
+            user_story_id, await generic_api_call(history_url(user_story_id, limit, page), retries),
+            target_time, time_threshold_ms, page, limit)
+    return history_cache.find(user_story_id, target_time, time_threshold_ms, fetched=True)
+
+
+async def get_user_story(user_story_id, retries=3):
+    """Get a user story by ID from Taiga API"""
+    url = f"{TAIGA_BASE_URL}/api/v1/userstories/{user_story_id}"
+    return await generic_api_call(url, retries)
+
+
+async def get_user(user_id, retries=3):
+    """Get a user by ID from Taiga API"""
+    url = f"{TAIGA_BASE_URL}/api/v1/users/{user_id}"
+    return await generic_api_call(url, retries)
+
+
+async def get_swimlane(swimlane_id, retries=3):
+    """Get a swimlane by ID from Taiga API"""
+    url = f"{TAIGA_BASE_URL}/api/v1/swimlanes/{swimlane_id}"
+    return await generic_api_call(url, retries)
@@ -1,15 +1,31 @@
 """Authentication handler for Taiga API"""
+import logging
+import threading
 from datetime import datetime, timedelta
 import requests # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
 from config.config import (  # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
     TAIGA_BASE_URL,
     TAIGA_USERNAME,
-    TAIGA_PASSWORD
+    TAIGA_PASSWORD,
+    TAIGA_TOKEN_REFRESH_MARGIN
     )
+from handlers.http_session import taiga_session  # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+from handlers.metrics import auth_refreshes_total  # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+
+logger = logging.getLogger(__name__)
+
+# Seconds before a failed background refresh is retried, doubled on each failure in a row
+REFRESH_RETRY_SECONDS = 30
+REFRESH_RETRY_MAX_SECONDS = 600
 
 
 class TaigaAuth:
-    """Authentication handler for Taiga API"""
+    """Authentication handler for Taiga API
+
+    The token is cached until shortly before `token_expiry` and refreshed in the
+    background, so regular API calls never pay for a validation round-trip.
+    Callers report a 401 through `handle_unauthorized` to force a refresh.
+    """
     def __init__(self):
         self.base_url = TAIGA_BASE_URL
         self.username = TAIGA_USERNAME
@@ -18,6 +34,18 @@ class TaigaAuth:
         self.refresh_token = None
         self.token_expiry = None
         self.token_lifetime = timedelta(hours=24)  # Taiga tokens typically last 24 hours
+        self.refresh_margin = timedelta(seconds=TAIGA_TOKEN_REFRESH_MARGIN)
+
+        # Only held while a new token is being obtained, never on the cached path
+        self._renew_lock = threading.Lock()
+        self._refresh_timer = None
+        self._refresh_failures = 0
+
+        # Counters
+        self.round_trips_saved = 0
+        self.refreshes = 0
+        self.background_refreshes = 0
+        self.unauthorized = 0
 
         # Validate environment variables
         if not all([self.username, self.password]):
@@ -25,7 +53,7 @@ class TaigaAuth:
 
     def _authenticate(self):
         """Authenticate with Taiga API and get a new token"""
-        print("Generating new API token with password auth")
+        logger.info("Generating new API token with password auth")
         auth_url = f"{self.base_url}/api/v1/auth"
         payload = {
             "type": "normal",
@@ -34,7 +62,7 @@ class TaigaAuth:
         }
 
         try:
-            auth_response = requests.post(auth_url, json=payload, timeout=30)
+            auth_response = taiga_session.post(auth_url, json=payload, timeout=30)
             auth_response.raise_for_status()
             auth_data = auth_response.json()
 
@@ -48,14 +76,14 @@ class TaigaAuth:
             #set_key('.env', 'TAIGA_AUTH_TOKEN', self.token)
 
             # Validate the token immediately
-            print("Authenticated, validating token...")
+            logger.debug("Authenticated, validating token...")
             if not self._validate_token():
                 raise ValueError("Obtained token failed validation")
 
             return True
 
         except requests.exceptions.RequestException as e:
-            print(f"Authentication failed: {e}")
+            logger.error("Authentication failed: %s", e)
             self.token = None
             self.token_expiry = None
             return False
@@ -64,7 +92,7 @@ class TaigaAuth:
         """Validate the current auth token by making a test API call"""
         if not self.token:
             return False
-        print("Validating API token....")
+        logger.debug("Validating API token....")
         auth_headers = {
             "Authorization": f"Bearer {self.token}",
             "Content-Type": "application/json"
@@ -72,7 +100,7 @@ class TaigaAuth:
 
         try:
             # Make a lightweight API call to verify token
-            auth_response = requests.get(
+            auth_response = taiga_session.get(
                 f"{self.base_url}/api/v1/users/me",
                 headers=auth_headers,
                 timeout=30
@@ -89,43 +117,129 @@ class TaigaAuth:
         except requests.exceptions.RequestException:
             return False
 
+    def _refresh(self):
+        """Exchange the refresh token for a new token. Returns True on success."""
+        logger.debug("Refresh token detected, attempting to use it")
+        try:
+            refresh_url = f"{self.base_url}/api/v1/auth/refresh"
+            refresh_response = taiga_session.post(
+                refresh_url,
+                json={"refresh": self.refresh_token},
+                timeout=30
+            )
+            refresh_response.raise_for_status()
+
+            refresh_data = refresh_response.json()
+            self.token = refresh_data['access']
+            self.refresh_token = refresh_data['refresh']
+            self.token_expiry = datetime.now() + self.token_lifetime
+
+            logger.info("Token refreshed successfully")
+            return True
+
+        except requests.RequestException as e:
+            logger.warning("Token refresh failed: %s, falling back to password auth", e)
+            return False
+
+    def _is_fresh(self):
+        """Check whether the cached token is present and not expired"""
+        return bool(self.token and self.token_expiry and datetime.now() < self.token_expiry)
+
+    def _renew(self, stale_token):
+        """Obtain a new token unless another caller already replaced `stale_token`
+
+        Args:
+            stale_token: value[str|None]: The token the caller considers unusable
+
+        Returns:
+            str: A valid authentication token
+        """
+        with self._renew_lock:
+            if self.token != stale_token and self._is_fresh():
+                # Someone else renewed while we were waiting for the lock
+                return self.token
+
+            self.refreshes += 1
+            auth_refreshes_total.inc()
+            # If we have a refresh token, try to use it first
+            if not (self.refresh_token and self._refresh()):
+                # If refresh failed or we don't have a refresh token,
+                # authenticate with username/password
+                logger.info("No usable refresh token, falling back to password auth")
+                if not self._authenticate():
+                    raise ValueError("Authentication failed - check your credentials")
+            self._schedule_refresh()
+            return self.token
+
+    def _schedule_refresh(self, delay=None):
+        """Arm a timer that renews the token shortly before it expires
+
+        Args:
+            delay: Optional[value[float]]: Seconds until the renewal, by default
+                refresh_margin before token_expiry
+        """
+        if self._refresh_timer is not None:
+            self._refresh_timer.cancel()
+        if delay is None:
+            self._refresh_failures = 0
+            delay = (self.token_expiry - self.refresh_margin - datetime.now()).total_seconds()
+        self._refresh_timer = threading.Timer(max(delay, 0), self._background_refresh)
+        self._refresh_timer.daemon = True
+        self._refresh_timer.start()
+
+    def _background_refresh(self):
+        """Timer callback, renews the token ahead of expiry"""
+        logger.info("API token close to expiry, refreshing in the background...")
+        self.background_refreshes += 1
+        try:
+            self._renew(self.token)
+        except (requests.RequestException, ValueError, KeyError) as e:
+            # Retry ahead of the request path, which would otherwise block on the renewal
+            delay = min(REFRESH_RETRY_SECONDS * 2 ** self._refresh_failures,
+                        REFRESH_RETRY_MAX_SECONDS)
+            self._refresh_failures += 1
+            logger.error("Background token refresh failed, retrying in %ds: %s", delay, e)
+            self._schedule_refresh(delay)
+
+    def cached_token(self):
+        """Get the cached token without any network I/O, None if it must be renewed"""
+        token = self.token
+        if token and self._is_fresh():
+            # Previously every call validated the token against /users/me
+            self.round_trips_saved += 1
+            return token
+        return None
+
     def get_token(self):
         """Get a valid authentication token."""
-        # If we have a token, verify it's still valid with the API
-        if self.token:
-            if self._validate_token():
-                print("API token is valid, keeping it!")
-                return self.token
-            print("API token is missing, invalid or expired, refreshing...")
-
-        # If we have a refresh token, try to use it first
-        if self.refresh_token:
-            print("Refresh token detected, attempting to use it")
-            try:
-                refresh_url = f"{self.base_url}/api/v1/auth/refresh"
-                refresh_response = requests.post(
-                    refresh_url,
-                    json={"refresh": self.refresh_token},
-                    timeout=30
-                )
-                refresh_response.raise_for_status()
-
-                refresh_data = refresh_response.json()
-                self.token = refresh_data['access']
-                self.refresh_token = refresh_data['refresh']
-                self.token_expiry = datetime.now() + self.token_lifetime
-
-                print("Token refreshed successfully")
-                return self.token
+        token = self.cached_token()
+        if token:
+            return token
+        logger.info("API token is missing or expired, refreshing...")
+        return self._renew(self.token)
 
-            except requests.RequestException as e:
-                print(f"Token refresh failed: {e}, falling back to password auth")
+    def handle_unauthorized(self, token):
+        """Renew the token after an API call made with `token` came back 401
 
-        # If refresh failed or we don't have a refresh token, authenticate with username/password
-        print("No refresh token, falling back to password auth")
-        if not self._authenticate():
-            raise ValueError("Authentication failed - check your credentials")
-        return self.token
+        Args:
+            token: value[str]: The token that was rejected
+
+        Returns:
+            str: A new authentication token
+        """
+        self.unauthorized += 1
+        logger.warning("API token was rejected, refreshing...")
+        return self._renew(token)
+
+    def stats(self):
+        """Return token cache counters"""
+        return {
+            'round_trips_saved': self.round_trips_saved,
+            'refreshes': self.refreshes,
+            'background_refreshes': self.background_refreshes,
+            'unauthorized': self.unauthorized,
+            'token_expiry': self.token_expiry.isoformat() if self.token_expiry else None,
+        }
 
     def get_headers(self):
         """Get headers with valid authentication token"""
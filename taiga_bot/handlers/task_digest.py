@@ -0,0 +1,228 @@
+"""
+Task checklists rolled up per parent user story
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from config.config import DATA_DIR, TASK_DIGEST_INTERVAL  # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+
+logger = logging.getLogger(__name__)
+
+# Stories whose last edit time is kept before old ones are pruned
+MAX_TRACKED = 1000
+
+
+def _field(data, *keys):
+    """Get a nested payload value, or None"""
+    for key in keys:
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
+
+
+class TaskBoard:
+    """Last known state of every task, by parent user story, in SQLite
+
+    Task webhooks each describe one task, the board keeps them all so the
+    checklist of a story can be rendered whole from any one of them.
+
+    Args:
+        path: value[str]: SQLite database file, ':memory:' for a private board
+    """
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        # No fsync per commit, a task lost in a crash is back with its next webhook
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS tasks ('
+            'task_id INTEGER PRIMARY KEY, '
+            'story_id INTEGER NOT NULL, '
+            'story_ref INTEGER, '
+            'ref INTEGER, '
+            'subject TEXT, '
+            'status TEXT, '
+            'is_closed INTEGER NOT NULL DEFAULT 0, '
+            'is_blocked INTEGER NOT NULL DEFAULT 0, '
+            'assigned TEXT)'
+        )
+        if 'story_ref' not in {row[1] for row in self._conn.execute('PRAGMA table_info(tasks)')}:
+            # Boards written before tasks kept the ref of their story
+            self._conn.execute('ALTER TABLE tasks ADD COLUMN story_ref INTEGER')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS tasks_story_id ON tasks (story_id)')
+        self._lock = threading.Lock()
+
+        # Counters
+        self.events = 0
+        self.ignored = 0
+
+    def apply(self, payload):
+        """Record a task webhook and read back the checklists it changed
+
+        A task moved to another user story, or detached from its story, also
+        changes the checklist of the story it left.
+
+        Returns:
+            list: [(story_id, story_ref, tasks)] with tasks sorted by ref, the
+                story the task left first, empty if the task belongs to no user story
+        """
+        data = payload.get('data') if isinstance(payload.get('data'), dict) else {}
+        task_id = data.get('id')
+        story_id = _field(data, 'user_story', 'id')
+        story_ref = _field(data, 'user_story', 'ref')
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT story_id, story_ref FROM tasks WHERE task_id = ?', (task_id,)).fetchone()
+            if payload.get('action') == 'delete' or story_id is None:
+                self._conn.execute('DELETE FROM tasks WHERE task_id = ?', (task_id,))
+            elif task_id is not None:
+                self._conn.execute(
+                    'INSERT INTO tasks (task_id, story_id, story_ref, ref, subject, status, '
+                    'is_closed, is_blocked, assigned) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) '
+                    'ON CONFLICT(task_id) DO UPDATE SET '
+                    'story_id = excluded.story_id, story_ref = excluded.story_ref, '
+                    'ref = excluded.ref, '
+                    'subject = excluded.subject, status = excluded.status, '
+                    'is_closed = excluded.is_closed, is_blocked = excluded.is_blocked, '
+                    'assigned = excluded.assigned',
+                    (task_id, story_id, story_ref, data.get('ref'), data.get('subject'),
+                     _field(data, 'status', 'name'),
+                     int(bool(_field(data, 'status', 'is_closed'))),
+                     int(bool(data.get('is_blocked'))),
+                     _field(data, 'assigned_to', 'full_name'))
+                )
+            stories = []
+            if row is not None and row[0] != story_id:
+                # The story the task left loses it from its checklist
+                stories.append(row)
+            if story_id is not None:
+                stories.append((story_id, story_ref))
+            if not stories:
+                self.ignored += 1
+                return []
+            self.events += 1
+            return [(changed_id, changed_ref, self._tasks(changed_id))
+                    for changed_id, changed_ref in stories]
+
+    def _tasks(self, story_id):
+        """Read the tasks of a story, sorted by ref"""
+        return [
+            {'ref': ref, 'subject': subject, 'status': status, 'is_closed': bool(is_closed),
+             'is_blocked': bool(is_blocked), 'assigned': assigned}
+            for ref, subject, status, is_closed, is_blocked, assigned in self._conn.execute(
+                'SELECT ref, subject, status, is_closed, is_blocked, assigned FROM tasks '
+                'WHERE story_id = ? ORDER BY ref', (story_id,))
+        ]
+
+    def forget_story(self, story_id):
+        """Drop the tasks of a deleted user story"""
+        with self._lock:
+            self._conn.execute('DELETE FROM tasks WHERE story_id = ?', (story_id,))
+
+    def stats(self):
+        """Return task count and counters"""
+        with self._lock:
+            tasks = self._conn.execute('SELECT COUNT(*) FROM tasks').fetchone()[0]
+        return {
+            'tasks': tasks,
+            'events': self.events,
+            'ignored': self.ignored,
+        }
+
+
+class DigestThrottle:
+    """Applies the task checklist of each story at most once per interval
+
+    A checklist carries the whole state of a story's tasks, so only the
+    newest one waiting for a story is applied and the ones it replaced are
+    dropped. The first change after a quiet interval is applied at once.
+    Every submitted checklist gets a future that is done once it, or a
+    newer one that replaced it, was applied.
+
+    Args:
+        interval: value[float]: Minimum seconds between two applies for one story
+    """
+    def __init__(self, interval):
+        self.interval = interval
+        self._pending = {}
+        self._timers = {}
+        self._last = {}
+
+        # Counters
+        self.applied = 0
+        self.coalesced = 0
+
+    def submit(self, post, apply):
+        """Queue the newest checklist of a story, must be called on the event loop
+
+        Args:
+            post: value[dict]: The rendered checklist, keyed by post['story_id']
+            apply: value[coroutine function]: Called with the post when it is due
+
+        Returns:
+            asyncio.Future: Done once the checklist is applied, with the
+                exception of apply if that failed
+        """
+        key = post['story_id']
+        done = asyncio.get_running_loop().create_future()
+        waiting = []
+        if key in self._pending:
+            self.coalesced += 1
+            # The newer checklist covers the ones it replaces
+            waiting = self._pending[key][2]
+        waiting.append(done)
+        self._pending[key] = (post, apply, waiting)
+        if key not in self._timers:
+            self._schedule(key)
+        return done
+
+    def _schedule(self, key):
+        """Start the timer of a story's next apply"""
+        if len(self._last) > MAX_TRACKED:
+            now = time.monotonic()
+            self._last = {k: t for k, t in self._last.items() if now - t < self.interval}
+        delay = max(0.0, self._last.get(key, float('-inf')) + self.interval - time.monotonic())
+        self._timers[key] = asyncio.get_running_loop().call_later(delay, self._expire, key)
+
+    def _expire(self, key):
+        """Timer callback, schedules the apply"""
+        asyncio.get_running_loop().create_task(self._flush(key))
+
+    async def _flush(self, key):
+        """Apply the newest checklist of a story, the timer stays set until it is done"""
+        post, apply, waiting = self._pending.pop(key)
+        self._last[key] = time.monotonic()
+        try:
+            await apply(post)
+            self.applied += 1
+            for done in waiting:
+                done.set_result(None)
+        except Exception as e: # pylint: disable=broad-exception-caught
+            logger.exception("Task checklist update failed: %r", e)
+            for done in waiting:
+                done.set_exception(e)
+        finally:
+            del self._timers[key]
+            if key in self._pending:
+                self._schedule(key)
+
+    def stats(self):
+        """Return the interval, checklists waiting and counters"""
+        return {
+            'interval': self.interval,
+            'pending': len(self._pending),
+            'applied': self.applied,
+            'coalesced': self.coalesced,
+        }
+
+
+#Singleton instances for global use
+task_board = TaskBoard(os.path.join(DATA_DIR, 'tasks.db'))
+digest_throttle = DigestThrottle(interval=TASK_DIGEST_INTERVAL)
@@ -0,0 +1,290 @@
+"""
+Persistent index of user stories to Discord forum threads
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+from collections import Counter
+from config.config import DATA_DIR  # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+from .metrics import discord_writes_suppressed_total
+
+logger = logging.getLogger(__name__)
+
+REF_PATTERN = re.compile(r'^#(\d+)\b')
+
+
+def fingerprint(value):
+    """Short hash of a JSON serialisable value, to tell whether a write would change anything"""
+    return hashlib.sha1(
+        json.dumps(value, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+
+
+def embed_fingerprint(embed):
+    """Fingerprint of what an embed shows, leaving out its render timestamp"""
+    content = embed.to_dict()
+    content.pop('timestamp', None)
+    return fingerprint(content)
+
+
+def parse_ref(thread_name):
+    """Get the Taiga ref from a thread name like '#123 Subject', or None"""
+    match = REF_PATTERN.match(thread_name or '')
+    return int(match.group(1)) if match else None
+
+
+class ThreadIndex:
+    """Maps Taiga user story ids to forum thread ids, persisted in SQLite
+
+    Threads found by the startup scan only carry the story ref (from the
+    '#ref subject' name), so lookups fall back to (forum_id, ref) and record
+    the story id on the first hit. Both maps are held in memory for O(1)
+    lookups, SQLite only keeps them across restarts.
+
+    Each thread also remembers its starter message id, its status embed id
+    and whether the status embed is known to be pinned, so updates can edit
+    those messages directly instead of reading the thread history.
+
+    Fingerprints of the last applied tags, status embed and starter content
+    let updates skip writes that would not change what the thread shows.
+    The task checklist message of a thread is tracked the same way.
+
+    Args:
+        path: value[str]: SQLite database file
+    """
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        # Writes run on the event loop, commits must not wait on an fsync. A crash can
+        # lose the last commits, the startup scan and thread history rebuild them
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS threads ('
+            'thread_id INTEGER PRIMARY KEY, '
+            'forum_id INTEGER NOT NULL, '
+            'story_id INTEGER, '
+            'ref INTEGER)'
+        )
+        self._add_columns({
+            'starter_message_id': 'INTEGER',
+            'status_message_id': 'INTEGER',
+            'status_pinned': 'INTEGER NOT NULL DEFAULT 0',
+            'thread_fingerprint': 'TEXT',
+            'status_fingerprint': 'TEXT',
+            'starter_fingerprint': 'TEXT',
+            'digest_message_id': 'INTEGER',
+            'digest_fingerprint': 'TEXT',
+        })
+        self._rows = {}
+        self._by_story = {}
+        self._by_ref = {}
+        self._messages = {}
+        self._fingerprints = {}
+        self._digests = {}
+        for (thread_id, forum_id, story_id, ref,
+             starter_id, status_id, pinned,
+             thread_print, status_print, starter_print,
+             digest_id, digest_print) in self._conn.execute(
+                'SELECT thread_id, forum_id, story_id, ref, '
+                'starter_message_id, status_message_id, status_pinned, '
+                'thread_fingerprint, status_fingerprint, starter_fingerprint, '
+                'digest_message_id, digest_fingerprint FROM threads'):
+            self._index(thread_id, forum_id, story_id, ref)
+            self._messages[thread_id] = [starter_id, status_id, bool(pinned)]
+            self._fingerprints[thread_id] = [thread_print, status_print, starter_print]
+            if digest_id is not None:
+                self._digests[thread_id] = (digest_id, digest_print)
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.suppressed = Counter()
+
+    def _add_columns(self, columns):
+        """Add columns missing from a database created by an older version"""
+        existing = {row[1] for row in self._conn.execute('PRAGMA table_info(threads)')}
+        for name, definition in columns.items():
+            if name not in existing:
+                self._conn.execute(f'ALTER TABLE threads ADD COLUMN {name} {definition}')
+
+    def _index(self, thread_id, forum_id, story_id, ref):
+        """Add a row to the in-memory maps"""
+        self._unindex(thread_id)
+        self._rows[thread_id] = (forum_id, story_id, ref)
+        if story_id is not None:
+            self._by_story[story_id] = thread_id
+        if ref is not None:
+            self._by_ref[(forum_id, ref)] = thread_id
+
+    def _unindex(self, thread_id):
+        """Remove a row from the in-memory maps"""
+        row = self._rows.pop(thread_id, None)
+        if row is None:
+            return
+        forum_id, story_id, ref = row
+        if self._by_story.get(story_id) == thread_id:
+            del self._by_story[story_id]
+        if self._by_ref.get((forum_id, ref)) == thread_id:
+            del self._by_ref[(forum_id, ref)]
+
+    def get(self, story_id, forum_id=None, ref=None):
+        """Get the thread id for a user story, or None
+
+        Args:
+            story_id: value[int]: The Taiga user story id
+            forum_id: Optional[value[int]]: Forum to search by ref if the id is unknown
+            ref: Optional[value[int]]: The user story ref
+        """
+        thread_id = self._by_story.get(story_id)
+        if thread_id is None and ref is not None:
+            thread_id = self._by_ref.get((forum_id, ref))
+            if thread_id is not None and story_id is not None:
+                self.put(thread_id, forum_id, story_id, ref)
+        if thread_id is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return thread_id
+
+    def put(self, thread_id, forum_id, story_id=None, ref=None):
+        """Record a thread, keeping a story id that is already known for it"""
+        row = self._rows.get(thread_id)
+        if story_id is None and row is not None:
+            story_id = row[1]
+        self._index(thread_id, forum_id, story_id, ref)
+        self._conn.execute(
+            'INSERT INTO threads (thread_id, forum_id, story_id, ref) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT(thread_id) DO UPDATE SET '
+            'forum_id = excluded.forum_id, story_id = excluded.story_id, ref = excluded.ref',
+            (thread_id, forum_id, story_id, ref)
+        )
+
+    def messages(self, thread_id):
+        """Get the cached message ids of a thread
+
+        Returns:
+            tuple: (starter_message_id, status_message_id, status_pinned),
+                ids are None when unknown
+        """
+        starter_id, status_id, pinned = self._messages.get(thread_id, (None, None, False))
+        return starter_id, status_id, pinned
+
+    def set_messages(self, thread_id, starter_id=None, status_id=None, pinned=None):
+        """Remember message ids of an indexed thread, None leaves a value unchanged"""
+        if thread_id not in self._rows:
+            return
+        entry = self._messages.setdefault(thread_id, [None, None, False])
+        if starter_id is not None:
+            entry[0] = starter_id
+        if status_id is not None:
+            entry[1] = status_id
+        if pinned is not None:
+            entry[2] = pinned
+        self._conn.execute(
+            'UPDATE threads SET starter_message_id = ?, status_message_id = ?, '
+            'status_pinned = ? WHERE thread_id = ?',
+            (entry[0], entry[1], int(entry[2]), thread_id)
+        )
+
+    def fingerprints(self, thread_id):
+        """Get the fingerprints of what was last written to a thread
+
+        Returns:
+            tuple: (thread, status, starter) fingerprints, None when unknown
+        """
+        thread_print, status_print, starter_print = self._fingerprints.get(
+            thread_id, (None, None, None))
+        return thread_print, status_print, starter_print
+
+    def set_fingerprints(self, thread_id, thread=None, status=None, starter=None):
+        """Remember what was written to an indexed thread, None leaves a value unchanged"""
+        if thread_id not in self._rows:
+            return
+        entry = self._fingerprints.setdefault(thread_id, [None, None, None])
+        for index, value in enumerate((thread, status, starter)):
+            if value is not None:
+                entry[index] = value
+        self._conn.execute(
+            'UPDATE threads SET thread_fingerprint = ?, status_fingerprint = ?, '
+            'starter_fingerprint = ? WHERE thread_id = ?',
+            (entry[0], entry[1], entry[2], thread_id)
+        )
+
+    def digest(self, thread_id):
+        """Get the task checklist message of a thread
+
+        Returns:
+            tuple: (message_id, fingerprint), both None when there is none
+        """
+        return self._digests.get(thread_id, (None, None))
+
+    def set_digest(self, thread_id, message_id, digest_print):
+        """Remember the task checklist message of an indexed thread and what it shows"""
+        if thread_id not in self._rows:
+            return
+        self._digests[thread_id] = (message_id, digest_print)
+        self._conn.execute(
+            'UPDATE threads SET digest_message_id = ?, digest_fingerprint = ? '
+            'WHERE thread_id = ?', (message_id, digest_print, thread_id))
+
+    def suppress(self, operation):
+        """Count a Discord write skipped because it would not change anything"""
+        self.suppressed[operation] += 1
+        discord_writes_suppressed_total.inc(operation=operation)
+
+    def forget_status(self, thread_id):
+        """Forget a status embed that was deleted"""
+        if thread_id in self._messages:
+            self._messages[thread_id][1:] = [None, False]
+            if thread_id in self._fingerprints:
+                self._fingerprints[thread_id][1] = None
+            self._conn.execute(
+                'UPDATE threads SET status_message_id = NULL, status_pinned = 0, '
+                'status_fingerprint = NULL WHERE thread_id = ?', (thread_id,))
+
+    def remove(self, thread_id):
+        """Forget a deleted thread"""
+        if thread_id not in self._rows:
+            return
+        self._unindex(thread_id)
+        self._messages.pop(thread_id, None)
+        self._fingerprints.pop(thread_id, None)
+        self._digests.pop(thread_id, None)
+        self._conn.execute('DELETE FROM threads WHERE thread_id = ?', (thread_id,))
+
+    def rebuild(self, forum_id, threads):
+        """Replace the index for a forum with the provided threads
+
+        Args:
+            forum_id: value[int]: The forum channel id
+            threads: value[iterable]: Active and archived threads with .id and .name
+        """
+        seen = set()
+        self._conn.execute('BEGIN')
+        for thread in threads:
+            seen.add(thread.id)
+            self.put(thread.id, forum_id, ref=parse_ref(thread.name))
+        stale = [thread_id for thread_id, row in self._rows.items()
+                 if row[0] == forum_id and thread_id not in seen]
+        for thread_id in stale:
+            self.remove(thread_id)
+        self._conn.execute('COMMIT')
+        logger.info("Thread index built with %d threads", len(seen))
+
+    def stats(self):
+        """Return index size and lookup counters"""
+        return {
+            'threads': len(self._rows),
+            'hits': self.hits,
+            'misses': self.misses,
+            'suppressed_writes': dict(self.suppressed),
+        }
+
+
+#Singleton instance for global use
+thread_index = ThreadIndex(os.path.join(DATA_DIR, 'threads.db'))
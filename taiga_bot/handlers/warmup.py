@@ -0,0 +1,71 @@
+"""
+Concurrent startup warm-up of caches and indexes, and readiness
+"""
+import asyncio
+import logging
+import time
+from .metrics import warmup_seconds
+
+logger = logging.getLogger(__name__)
+
+
+class Warmup:
+    """Runs the startup loads side by side and reports how long each took
+
+    A failed step is logged and reported but does not hold readiness back,
+    whatever it would have loaded is fetched on first use instead. The bot
+    is ready once mark_ready is called after the warm-up. It runs once per
+    process, after a reconnect the thread and tag events keep the loaded
+    data current while webhooks are being posted.
+    """
+    def __init__(self):
+        self.steps = {}
+        self.seconds = None
+        self.started = False
+        self.ready = False
+
+    async def run(self, steps):
+        """Run warm-up steps concurrently and wait for all of them
+
+        Args:
+            steps: value[dict]: {step name: coroutine}
+        """
+        self.started = True
+        started = time.monotonic()
+        self.steps = {name: {'status': 'running', 'seconds': None} for name in steps}
+        await asyncio.gather(*(self._step(name, step) for name, step in steps.items()))
+        self.seconds = round(time.monotonic() - started, 3)
+        logger.info("Warm-up finished in %.3fs: %s", self.seconds, ', '.join(
+            f"{name} {entry['status']} in {entry['seconds']:.3f}s"
+            for name, entry in self.steps.items()))
+
+    async def _step(self, name, step):
+        """Run and time one step"""
+        started = time.monotonic()
+        entry = {'status': 'ok'}
+        try:
+            await step
+        except Exception as e: # pylint: disable=broad-exception-caught
+            logger.exception("Warm-up step %s failed: %r", name, e)
+            entry = {'status': 'failed', 'error': repr(e)}
+        seconds = time.monotonic() - started
+        warmup_seconds.observe(seconds, step=name)
+        self.steps[name] = {**entry, 'seconds': round(seconds, 3)}
+
+    def mark_ready(self):
+        """Report ready, once webhooks are being handled"""
+        if not self.ready:
+            self.ready = True
+            logger.info("Ready")
+
+    def stats(self):
+        """Return readiness and the outcome and seconds of each step"""
+        return {
+            'ready': self.ready,
+            'seconds': self.seconds,
+            'steps': self.steps,
+        }
+
+
+#Singleton instance for global use
+warmup = Warmup()
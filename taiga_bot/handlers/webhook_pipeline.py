@@ -0,0 +1,307 @@
+"""
+Acknowledge-then-process pipeline for verified webhooks
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from config.config import (  # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+    BOT_ROLE,
+    WEBHOOK_WORKERS,
+    WEBHOOK_QUEUE_SIZE,
+    STORY_DEBOUNCE_WINDOW
+    )
+from .data_handler import safe_get
+from .debounce import StoryDebouncer, merge_payloads
+from .webhook_queue import webhook_queue
+from .outbox import outbox
+from .metrics import handler_seconds, webhook_to_post_seconds
+from .log import correlation_id, new_correlation_id
+
+logger = logging.getLogger(__name__)
+
+# Queue entry telling a worker that a story's debounce window ended: (BURST_DUE, key)
+BURST_DUE = object()
+
+
+def order_key(payload):
+    """Key of the webhooks handled one at a time: the user story, or for tasks their story's checklist"""
+    if safe_get(payload, ['type']) == 'task':
+        return ('task', safe_get(payload, ['data', 'user_story', 'id'])
+                or safe_get(payload, ['data', 'id']))
+    return safe_get(payload, ['data', 'id'])
+
+
+class WebhookPipeline:
+    """Bounded queue of verified webhooks drained by a pool of workers
+
+    The webhook endpoint only calls `submit`, which is safe from any thread
+    and never waits on Taiga or Discord. Workers run on the bot's event loop.
+    Webhooks for the same user story are handled one at a time, in order,
+    and so are task webhooks of the same story.
+
+    With a durable store, each webhook is written to disk before it is
+    acknowledged and removed only after the handler finished, so webhooks
+    left over from a crash are replayed when the pipeline starts.
+
+    With a debounce window, bursts of change webhooks for one story are
+    merged and handled once when the window ends. Held webhooks still count
+    toward max_queue, and a burst is handled by a worker like any webhook:
+    the window's end is queued, and a webhook that cannot be merged takes
+    the burst before it and is handled right after it under the same hold
+    of the story lock.
+
+    A handler may return an awaitable for work it left to finish later,
+    such as a throttled task checklist edit. The webhook is acknowledged
+    only once that is done, without holding a worker or the story lock.
+
+    Args:
+        workers: value[int]: Number of concurrent worker tasks
+        max_queue: value[int]: Maximum webhooks waiting for a worker
+        store: Optional[DurableQueue]: On-disk store for queued webhooks
+        debounce: Optional[value[float]]: Per-story debounce window in seconds, 0 disables
+    """
+    def __init__(self, workers, max_queue, store=None, debounce=0):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.store = store
+        self.debouncer = StoryDebouncer(debounce, self._burst_due) if debounce > 0 else None
+        self._loop = None
+        self._queue = None
+        self._handler = None
+        self._tasks = []
+        self._depth = 0
+        self._depth_lock = threading.Lock()
+        self._story_locks = {}
+        self._settling = set()
+
+        # Counters
+        self.accepted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self._latencies = deque(maxlen=1000)
+
+    def start(self, handler):
+        """Start the workers on the running loop, safe to call more than once
+
+        Args:
+            handler: value[coroutine function]: Called with each payload and the
+                project id of the route it was verified against
+        """
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._handler = handler
+        if self.store is not None:
+            self._replay()
+        self._tasks = [
+            asyncio.get_running_loop().create_task(self._worker()) for _ in range(self.workers)
+        ]
+        # Accept new webhooks only once the replayed ones are queued ahead of them
+        self._loop = asyncio.get_running_loop()
+        logger.info("Webhook pipeline started with %d workers", self.workers)
+
+    def _replay(self):
+        """Queue webhooks that were stored but not finished by a previous run"""
+        replayed = self.store.replay()
+        for item_id, body, route in replayed:
+            try:
+                payload = json.loads(body)
+            except ValueError as e:
+                logger.error("Discarding unreadable stored webhook %s: %s", item_id, e)
+                self.store.ack(item_id)
+                continue
+            with self._depth_lock:
+                self._depth += 1
+            self._queue.put_nowait(
+                (time.monotonic(), payload, item_id, new_correlation_id(), route))
+        if replayed:
+            logger.warning("Replaying %d unfinished webhooks", len(replayed))
+
+    def submit(self, payload, body=None, request_id=None, route=None, item_id=None): # pylint: disable=too-many-arguments
+        """Queue a verified webhook for processing
+
+        Args:
+            payload: value[dict]: The parsed webhook
+            body: Optional[value[bytes]]: The raw body, written to the durable store
+            request_id: Optional[value[str]]: Correlation id the webhook's log lines are tagged with
+            route: Optional[value[int]]: Project id of the route the webhook was
+                verified against, None for the default route
+            item_id: Optional[value[int]]: Id of the webhook if it is already
+                in the durable store, e.g. an outbox row
+
+        Returns:
+            bool: False if the pipeline is not running, the queue is full
+                or the webhook could not be stored
+        """
+        if self._loop is None:
+            self.rejected += 1
+            return False
+        with self._depth_lock:
+            if self._depth >= self.max_queue:
+                self.rejected += 1
+                return False
+            self._depth += 1
+        if self.store is not None and item_id is None:
+            try:
+                item_id = self.store.enqueue(
+                    body if body is not None else json.dumps(payload), route)
+            except sqlite3.Error:
+                with self._depth_lock:
+                    self._depth -= 1
+                self.rejected += 1
+                return False
+        self.accepted += 1
+        self._loop.call_soon_threadsafe(
+            self._queue.put_nowait, (time.monotonic(), payload, item_id, request_id, route))
+        return True
+
+    @asynccontextmanager
+    async def _story_order(self, key):
+        """Serialise webhooks that share a user story id"""
+        entry = self._story_locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._story_locks[key]
+
+    def _burst_due(self, key):
+        """Debounce timer callback, queues the end of a story's window for a worker"""
+        self._queue.put_nowait((BURST_DUE, key))
+
+    def _take_burst(self, key):
+        """Take the burst held for a story, it no longer counts as waiting"""
+        burst = self.debouncer.take(key) if self.debouncer is not None else None
+        if burst:
+            with self._depth_lock:
+                self._depth -= len(burst)
+        return burst
+
+    async def _worker(self):
+        """Take webhooks off the queue and run the handler on them"""
+        while True:
+            item = await self._queue.get()
+            if item[0] is BURST_DUE:
+                key = item[1]
+                burst = self._take_burst(key)
+                if burst:
+                    await self._run(key, [burst])
+                continue
+            payload = item[1]
+            key = order_key(payload)
+            if self.debouncer is not None and self.debouncer.add(key, item, payload):
+                # Held in the burst, still counted in the depth
+                continue
+            with self._depth_lock:
+                self._depth -= 1
+            # Anything that cannot be merged goes after the burst before it
+            burst = self._take_burst(key)
+            await self._run(key, [burst, [item]] if burst else [[item]])
+
+    async def _run(self, key, batches):
+        """Handle batches of one story in order, under a single hold of its story lock
+
+        The burst is taken before the lock is awaited and the lock is fair,
+        so batches of a story are handled in the order they left the queue.
+        """
+        async with self._story_order(key):
+            for items in batches:
+                await self._process(items)
+
+    async def _process(self, items):
+        """Run the handler once for one webhook or a merged burst of them"""
+        if len(items) > 1:
+            payload = merge_payloads([item[1] for item in items])
+        else:
+            payload = items[0][1]
+        # A merged burst is logged under the id of its first webhook
+        token = correlation_id.set(items[0][3] or new_correlation_id())
+        if len(items) > 1:
+            logger.info("Handling %d merged webhooks: %s", len(items),
+                        ', '.join(str(item[3]) for item in items))
+        try:
+            await self._handle(items, payload)
+        finally:
+            correlation_id.reset(token)
+
+    async def _handle(self, items, payload):
+        """Run the handler and acknowledge the webhooks it covered, the story lock is held"""
+        try:
+            with handler_seconds.time(type=safe_get(payload, ['type'], 'unknown')):
+                # A burst is about one story, so its webhooks share a route
+                pending = await self._handler(payload, items[-1][4])
+        except Exception as e: # pylint: disable=broad-exception-caught
+            self.failed += len(items)
+            logger.exception("Webhook processing failed: %r", e)
+            return
+        if pending is not None:
+            task = asyncio.get_running_loop().create_task(self._settle(items, pending))
+            self._settling.add(task)
+            task.add_done_callback(self._settling.discard)
+            return
+        self._finish(items)
+
+    async def _settle(self, items, pending):
+        """Acknowledge webhooks once the work their handler left pending is done"""
+        try:
+            await pending
+        except Exception: # pylint: disable=broad-exception-caught
+            # Already logged where it failed, the webhooks are replayed after a restart
+            self.failed += len(items)
+            return
+        self._finish(items)
+
+    def _finish(self, items):
+        """Count handled webhooks and acknowledge them in the durable store"""
+        now = time.monotonic()
+        for enqueued_at, _, item_id, _, _ in items:
+            self.processed += 1
+            self._latencies.append(now - enqueued_at)
+            webhook_to_post_seconds.observe(now - enqueued_at)
+            if item_id is not None:
+                self.store.ack(item_id)
+
+    def depth(self):
+        """Number of webhooks waiting for a worker or held in a burst"""
+        return self._depth
+
+    def stats(self):
+        """Return queue depth, counters and ack-to-post latency in seconds"""
+        latencies = sorted(self._latencies)
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(int(len(latencies) * p), len(latencies) - 1)], 4)
+        return {
+            'depth': self._depth,
+            'workers': self.workers,
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'processed': self.processed,
+            'failed': self.failed,
+            'settling': len(self._settling),
+            'ack_to_post_p50': percentile(0.50),
+            'ack_to_post_p95': percentile(0.95),
+            'ack_to_post_max': round(latencies[-1], 4) if latencies else None,
+            'store': self.store.stats() if self.store is not None else None,
+            'debounce': self.debouncer.stats() if self.debouncer is not None else None,
+        }
+
+
+#Singleton instance for global use
+webhook_pipeline = WebhookPipeline(
+    workers=WEBHOOK_WORKERS,
+    max_queue=WEBHOOK_QUEUE_SIZE,
+    # The sender handles the webhooks the ingress processes left in the outbox
+    store=webhook_queue if BOT_ROLE == 'all' else outbox,
+    debounce=STORY_DEBOUNCE_WINDOW
+)
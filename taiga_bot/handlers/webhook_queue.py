@@ -0,0 +1,174 @@
+"""
+Crash-safe on-disk queue for verified webhook payloads
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from config.config import DATA_DIR, BOT_ROLE, WEBHOOK_MAX_ATTEMPTS  # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingWrite:
+    """A payload waiting for the next group commit"""
+    __slots__ = ('body', 'route', 'item_id', 'error', 'done')
+
+    def __init__(self, body, route):
+        self.body = body
+        self.route = route
+        self.item_id = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class DurableQueue:
+    """SQLite (WAL mode) store that keeps webhooks until they are acknowledged
+
+    Enqueues from many threads are group-committed by a single writer thread:
+    every payload that arrives while a commit is in flight goes into the next
+    transaction, so one fsync covers the whole batch. `enqueue` returns only
+    once its payload is on disk. Acknowledgements are batched the same way but
+    do not wait. Anything not acknowledged is handed back by `replay` on the
+    next start, so delivery to the handler is at-least-once.
+
+    Args:
+        path: value[str]: SQLite database file
+        max_attempts: value[int]: Replays after which an item is dropped
+    """
+    def __init__(self, path, max_attempts=5):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_attempts = max_attempts
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=FULL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS webhooks ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'body BLOB NOT NULL, '
+            'enqueued_at REAL NOT NULL, '
+            'attempts INTEGER NOT NULL DEFAULT 0, '
+            'route INTEGER)'
+        )
+        if 'route' not in {row[1] for row in self._conn.execute('PRAGMA table_info(webhooks)')}:
+            # Queue created by an older version, its rows replay on the default route
+            self._conn.execute('ALTER TABLE webhooks ADD COLUMN route INTEGER')
+        self._db_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._writes = []
+        self._acks = []
+
+        # Counters
+        self.enqueued = 0
+        self.acked = 0
+        self.commits = 0
+        self.replayed = 0
+        self.dropped = 0
+
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def enqueue(self, body, route=None):
+        """Durably store a payload
+
+        Args:
+            body: value[bytes]: The raw webhook body
+            route: Optional[value[int]]: Project id of the route the webhook
+                was verified against, None for the default route
+
+        Returns:
+            int: The item id to acknowledge once the payload is handled
+
+        Raises:
+            sqlite3.Error: If the payload could not be written
+        """
+        write = _PendingWrite(body, route)
+        with self._cond:
+            self._writes.append(write)
+            self._cond.notify()
+        write.done.wait()
+        if write.error is not None:
+            raise write.error
+        self.enqueued += 1
+        return write.item_id
+
+    def ack(self, item_id):
+        """Mark an item as handled, it is deleted with the next commit"""
+        with self._cond:
+            self._acks.append((item_id,))
+            self._cond.notify()
+
+    def _write_loop(self):
+        """Commit queued writes and acknowledgements in batches"""
+        while True:
+            with self._cond:
+                while not self._writes and not self._acks:
+                    self._cond.wait()
+                writes, self._writes = self._writes, []
+                acks, self._acks = self._acks, []
+            now = time.time()
+            with self._db_lock:
+                try:
+                    self._conn.execute('BEGIN')
+                    for write in writes:
+                        cursor = self._conn.execute(
+                            'INSERT INTO webhooks (body, enqueued_at, route) VALUES (?, ?, ?)',
+                            (write.body, now, write.route)
+                        )
+                        write.item_id = cursor.lastrowid
+                    self._conn.executemany('DELETE FROM webhooks WHERE id = ?', acks)
+                    self._conn.execute('COMMIT')
+                    self.commits += 1
+                    self.acked += len(acks)
+                except sqlite3.Error as e:
+                    logger.error("Webhook queue commit failed: %s", e)
+                    if self._conn.in_transaction:
+                        self._conn.execute('ROLLBACK')
+                    for write in writes:
+                        write.error = e
+            for write in writes:
+                write.done.set()
+
+    def replay(self):
+        """Return unacknowledged items left over from a previous run, oldest first
+
+        Each replay counts as an attempt. Items past max_attempts are dropped.
+
+        Returns:
+            list: [(item_id, body, route)]
+        """
+        with self._db_lock:
+            self._conn.execute('BEGIN')
+            self._conn.execute('UPDATE webhooks SET attempts = attempts + 1')
+            dropped = self._conn.execute(
+                'DELETE FROM webhooks WHERE attempts > ?', (self.max_attempts,)
+            ).rowcount
+            rows = self._conn.execute(
+                'SELECT id, body, route FROM webhooks ORDER BY id').fetchall()
+            self._conn.execute('COMMIT')
+        if dropped:
+            logger.error("Dropped %d webhooks after %d attempts", dropped, self.max_attempts)
+        self.dropped += dropped
+        self.replayed += len(rows)
+        return rows
+
+    def stats(self):
+        """Return queue counters"""
+        return {
+            'enqueued': self.enqueued,
+            'acked': self.acked,
+            'commits': self.commits,
+            'replayed': self.replayed,
+            'dropped': self.dropped,
+        }
+
+
+#Singleton instance for global use, split processes queue webhooks in the outbox instead
+webhook_queue = DurableQueue(
+    os.path.join(DATA_DIR, 'webhook_queue.db'),
+    max_attempts=WEBHOOK_MAX_ATTEMPTS
+) if BOT_ROLE == 'all' else None
@@ -0,0 +1,5 @@
+"""
+End-to-end load test with fake Taiga and Discord backends
+
+Run from the taiga_bot directory, e.g. python -m loadtest.run
+"""
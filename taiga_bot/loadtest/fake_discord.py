@@ -0,0 +1,141 @@
+"""
+In-process stand-in for the Discord forum and thread calls made by send_post
+"""
+import asyncio
+import itertools
+import random
+from collections import Counter
+from types import SimpleNamespace
+import discord
+
+
+class FakeDiscord:
+    """Counts Discord calls and adds latency to them
+
+    Args:
+        latency: value[float]: Mean seconds per call, jittered by +-50%
+    """
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self._ids = itertools.count(10 ** 6)
+
+    def next_id(self):
+        """A new snowflake-like id"""
+        return next(self._ids)
+
+    async def call(self, operation):
+        """Record a call and wait like a Discord round-trip would"""
+        self.calls[operation] += 1
+        if self.latency > 0:
+            await asyncio.sleep(random.uniform(self.latency * 0.5, self.latency * 1.5))
+
+    def stats(self):
+        """Return calls per operation"""
+        return {'calls': dict(self.calls), 'total': sum(self.calls.values())}
+
+
+class FakeMessage:
+    """A message in a fake thread"""
+    def __init__(self, fake, message_id):
+        self._fake = fake
+        self.id = message_id
+
+    async def edit(self, **_fields):
+        """Edit the message"""
+        await self._fake.call('message.edit')
+
+    async def pin(self):
+        """Pin the message"""
+        await self._fake.call('message.pin')
+
+
+class FakeThread:
+    """A forum thread, its starter message shares its id"""
+    def __init__(self, fake, forum, name):
+        self._fake = fake
+        self._forum = forum
+        self.id = fake.next_id()
+        self.name = name
+        self.parent_id = forum.id
+        self.archived = False
+        self.messages = [FakeMessage(fake, self.id)]
+
+    async def edit(self, **fields):
+        """Edit the thread"""
+        await self._fake.call('thread.edit')
+        self.name = fields.get('name', self.name)
+        self.archived = fields.get('archived', self.archived)
+
+    async def delete(self):
+        """Delete the thread"""
+        await self._fake.call('thread.delete')
+        self._forum.remove_thread(self.id)
+
+    def get_partial_message(self, message_id):
+        """Reference a message by id, no call is made"""
+        return FakeMessage(self._fake, message_id)
+
+    async def history(self, limit=100, oldest_first=False):
+        """Iterate over the thread's messages"""
+        await self._fake.call('thread.history')
+        messages = self.messages if oldest_first else list(reversed(self.messages))
+        for message in messages[:limit]:
+            yield message
+
+    async def send(self, content=None, embed=None): # pylint: disable=unused-argument
+        """Post a message"""
+        await self._fake.call('thread.send')
+        message = FakeMessage(self._fake, self._fake.next_id())
+        self.messages.append(message)
+        return message
+
+
+class FakeForum(discord.ForumChannel):
+    """A forum channel that passes isinstance checks against discord.ForumChannel
+
+    Args:
+        fake: value[FakeDiscord]: Call counter shared by the forum and its threads
+        channel_id: value[int]: Forum id, use it as FORUM_ID
+        tags: value[dict]: {tag_name: tag_id}
+        members: value[list]: Guild members with .id and .name
+    """
+    def __init__(self, fake, channel_id, tags, members): # pylint: disable=super-init-not-called
+        self._fake = fake
+        self.id = channel_id
+        self.name = 'load-test'
+        self.guild = SimpleNamespace(id=channel_id + 1, members=members)
+        self._tags = [SimpleNamespace(id=tag_id, name=name) for name, tag_id in tags.items()]
+        self._threads = {}
+
+    @property
+    def available_tags(self):
+        return self._tags
+
+    @property
+    def threads(self):
+        return list(self._threads.values())
+
+    def get_thread(self, thread_id, /):
+        return self._threads.get(thread_id)
+
+    def remove_thread(self, thread_id):
+        """Forget a deleted thread"""
+        self._threads.pop(thread_id, None)
+
+    async def archived_threads(self, **_options): # pylint: disable=invalid-overridden-method
+        """No thread is ever archived in the load test"""
+        for thread in ():
+            yield thread
+
+    async def create_thread(self, *, name, content=None, **_options): # pylint: disable=arguments-differ
+        """Create a thread with its starter message"""
+        await self._fake.call('forum.create_thread')
+        thread = FakeThread(self._fake, self, name)
+        self._threads[thread.id] = thread
+        return SimpleNamespace(thread=thread, message=thread.messages[0])
+
+
+def fake_members(user_ids):
+    """Guild members named like the @mentions in the fake Taiga bios"""
+    return [SimpleNamespace(id=10 ** 5 + user_id, name=f'user{user_id}') for user_id in user_ids]
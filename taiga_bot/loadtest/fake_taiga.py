@@ -0,0 +1,166 @@
+"""
+Local stand-in for the Taiga REST endpoints the bot calls
+"""
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from benchmarks.corpus import USERSTORY, DESCRIPTION, DATE
+
+SWIMLANES = [{'id': 900, 'name': 'Backlog'}, {'id': 901, 'name': 'Backend'}]
+
+
+class FakeTaiga(ThreadingHTTPServer):
+    """Threaded HTTP server answering the Taiga API with canned data
+
+    Args:
+        port: value[int]: Port to listen on, 0 picks a free one
+        latency: value[float]: Mean seconds added to every response, jittered by +-50%
+        error_rate: value[float]: Fraction of GET requests answered with a 500
+    """
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.0, error_rate=0.0):
+        super().__init__(('127.0.0.1', port), FakeTaigaHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        """URL to use as TAIGA_BASE_URL"""
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def start(self):
+        """Serve requests on a daemon thread"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def count(self, endpoint):
+        """Record a call to an endpoint, return True if it should fail"""
+        with self._lock:
+            self.calls[endpoint] += 1
+            failed = random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        return failed
+
+    def delay(self):
+        """Sleep for the configured latency"""
+        if self.latency > 0:
+            time.sleep(random.uniform(self.latency * 0.5, self.latency * 1.5))
+
+    def stats(self):
+        """Return calls per endpoint and injected errors"""
+        return {'calls': dict(self.calls), 'total': sum(self.calls.values()),
+                'errors': self.errors}
+
+
+def user(user_id):
+    """A Taiga user whose bio carries a Discord mention"""
+    return {'id': user_id, 'username': f'user{user_id}', 'full_name': f'User {user_id}',
+            'bio': f'Discord: @user{user_id}'}
+
+
+def user_story(story_id):
+    """A user story, every fifth one without a swimlane"""
+    swimlane = None if story_id % 5 == 0 else SWIMLANES[story_id % 2]['id']
+    return {**USERSTORY, 'id': story_id, 'ref': story_id, 'swimlane': swimlane}
+
+
+class Page(list):
+    """One page of a list endpoint, has_next sets the x-pagination-next header"""
+    has_next = False
+
+
+def page(items, query):
+    """Slice a list endpoint like Taiga does for page and page_size"""
+    size = int(query.get('page_size', [len(items) or 1])[0])
+    number = int(query.get('page', ['1'])[0])
+    result = Page(items[(number - 1) * size:number * size])
+    result.has_next = number * size < len(items)
+    return result
+
+
+# (method, pattern, endpoint name, response builder taking the id and query)
+ROUTES = [
+    ('POST', re.compile(r'^/api/v1/auth$'), 'auth',
+     lambda _id, _query: {'auth_token': 'load-test-token', 'refresh': 'load-test-refresh'}),
+    ('POST', re.compile(r'^/api/v1/auth/refresh$'), 'auth_refresh',
+     lambda _id, _query: {'access': 'load-test-token', 'refresh': 'load-test-refresh'}),
+    ('GET', re.compile(r'^/api/v1/users/me$'), 'users_me',
+     lambda _id, _query: user(1)),
+    ('GET', re.compile(r'^/api/v1/users/(\d+)$'), 'users',
+     lambda user_id, _query: user(user_id)),
+    ('GET', re.compile(r'^/api/v1/userstories/(\d+)$'), 'userstories',
+     lambda story_id, _query: user_story(story_id)),
+    ('GET', re.compile(r'^/api/v1/userstories$'), 'userstories_list',
+     lambda _id, query: page([user_story(story_id) for story_id in range(1, 251)], query)),
+    ('GET', re.compile(r'^/api/v1/swimlanes/(\d+)$'), 'swimlanes',
+     lambda swimlane_id, _query: next(
+         (swimlane for swimlane in SWIMLANES if swimlane['id'] == swimlane_id), None)),
+    ('GET', re.compile(r'^/api/v1/swimlanes$'), 'swimlanes_list',
+     lambda _id, _query: SWIMLANES),
+    ('GET', re.compile(r'^/api/v1/userstory-statuses$'), 'statuses_list',
+     lambda _id, _query: [USERSTORY['status']]),
+    ('GET', re.compile(r'^/api/v1/memberships$'), 'memberships_list',
+     lambda _id, _query: [{'id': user_id, 'user': user_id} for user_id in range(10, 15)]),
+    ('GET', re.compile(r'^/api/v1/history/userstory/(\d+)$'), 'history',
+     lambda story_id, query: [{
+         'id': f'history-{story_id}',
+         'created_at': DATE,
+         'diff': {'description': [DESCRIPTION, DESCRIPTION + "\n#### Update\nFixed\n"]},
+     }][:int(query.get('page_size', ['5'])[0])] if query.get('page', ['1'])[0] == '1' else []),
+]
+
+
+class FakeTaigaHandler(BaseHTTPRequestHandler):
+    """Routes requests to ROUTES"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args): # pylint: disable=redefined-builtin
+        """Keep the load test output readable"""
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if isinstance(body, Page):
+            self.send_header('x-pagination-next', 'next' if body.has_next else '')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self, method):
+        if method == 'POST':
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        url = urlsplit(self.path)
+        for route_method, pattern, endpoint, build in ROUTES:
+            match = pattern.match(url.path)
+            if route_method != method or match is None:
+                continue
+            failed = self.server.count(endpoint)
+            self.server.delay()
+            if failed and method == 'GET':
+                self._reply(500, {'_error_message': 'Injected error'})
+                return
+            item_id = int(match.group(1)) if match.groups() else None
+            body = build(item_id, parse_qs(url.query))
+            self._reply(200 if body is not None else 404, body or {})
+            return
+        self.server.count('unknown')
+        self._reply(404, {'_error_message': f'No fake for {method} {url.path}'})
+
+    def do_GET(self): # pylint: disable=invalid-name
+        """Answer a GET"""
+        self._handle('GET')
+
+    def do_POST(self): # pylint: disable=invalid-name
+        """Answer a POST"""
+        self._handle('POST')
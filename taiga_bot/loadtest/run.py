@@ -0,0 +1,212 @@
+"""
+End-to-end load test of the webhook endpoint against fake Taiga and Discord backends
+
+Usage:
+    python -m loadtest.run [--webhooks N] [--stories N] [--concurrency N]
+                           [--taiga-latency S] [--taiga-error-rate F]
+                           [--discord-latency S] [--debounce S] [--digest-interval S] [--split]
+                           [--json results.json]
+"""
+import argparse
+import asyncio
+import contextlib
+import importlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+import requests # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+from .fake_taiga import FakeTaiga, SWIMLANES
+from .fake_discord import FakeDiscord, FakeForum, fake_members
+from .webhooks import generate
+
+FORUM_ID = 4242
+SECRET = 'load-test-secret'
+
+
+def configure(args, taiga):
+    """Point the bot's configuration at the fakes, before the bot is imported"""
+    os.environ.update({
+        'DISCORD_TOKEN': 'load-test',
+        'FORUM_ID': str(FORUM_ID),
+        'TAIGA_USERNAME': 'load-test',
+        'TAIGA_PASSWORD': 'load-test',
+        'TAIGA_BASE_URL': taiga.base_url,
+        'SECRET_KEY': SECRET,
+        'WEBHOOK_ROUTE': '/webhook',
+        'WEBHOOK_WORKERS': str(args.workers),
+        'STORY_DEBOUNCE_WINDOW': str(args.debounce),
+        'TASK_DIGEST_INTERVAL': str(args.digest_interval),
+        'DATA_DIR': tempfile.mkdtemp(prefix='taigabot-loadtest-'),
+        # The ingress side, the sender is started next to it in drive()
+        'BOT_ROLE': 'ingress' if args.split else 'all',
+    })
+
+
+def send_all(url, webhooks, concurrency):
+    """POST every webhook with a pool of senders
+
+    Returns:
+        list: (status_code, seconds) per webhook
+    """
+    local = threading.local()
+
+    def send(webhook):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        body, headers = webhook
+        started = time.perf_counter()
+        try:
+            status = local.session.post(url, data=body, headers=headers, timeout=30).status_code
+        except requests.RequestException:
+            status = 0
+        return status, time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(send, webhooks))
+
+
+def percentile(samples, p):
+    """Get a percentile of unsorted samples"""
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * p), len(samples) - 1)] if samples else None
+
+
+async def drive(bot, args, url, webhooks):
+    """Run the bot's pipeline on this loop while the webhooks are sent
+
+    Returns:
+        dict: Timings and counters of the run
+    """
+    fake = FakeDiscord(latency=args.discord_latency)
+    forum = FakeForum(fake, FORUM_ID,
+                      tags={swimlane['name']: swimlane['id'] for swimlane in SWIMLANES},
+                      members=fake_members(range(0, 700)))
+
+    async def fetch_channel(channel_id):
+        return forum if channel_id == forum.id else forum.get_thread(channel_id)
+
+    with mock.patch.object(bot.client, 'get_channel', lambda _channel_id: forum), \
+         mock.patch.object(bot.client, 'fetch_channel', fetch_channel):
+        bot.member_index.rebuild(forum.guild.id, forum.guild.members)
+        await bot.forum_tags.refresh(forum.id, bot.client.fetch_channel)
+        sender = None
+        bot.webhook_pipeline.start(bot.handle_webhook)
+        if args.split:
+            # The endpoint writes to the outbox as an ingress process, read it as the sender
+            outbox = importlib.import_module('handlers.outbox')
+            sender = outbox.OutboxSender(bot.outbox, poll_interval=0.05)
+            sender.start(bot.webhook_pipeline)
+        pipeline = bot.webhook_pipeline
+        started = time.monotonic()
+        responses = await asyncio.to_thread(send_all, url, webhooks, args.concurrency)
+        sent = time.monotonic()
+        accepted = sum(1 for status, _ in responses if status == 202)
+        deadline = sent + args.timeout
+        while pipeline.processed + pipeline.failed < accepted and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        while bot.digest_throttle.stats()['pending'] and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        finished = time.monotonic()
+        await importlib.import_module('handlers.taiga_api_async').close()
+    return {
+        'responses': responses,
+        'accepted': accepted,
+        'send_seconds': sent - started,
+        'total_seconds': finished - started,
+        'discord': fake.stats(),
+        'outbox': sender.stats() if sender is not None else None,
+    }
+
+
+def summarize(run, bot, taiga, startup_calls):
+    """Turn a run into the reported numbers"""
+    pipeline = bot.webhook_pipeline.stats()
+    processed = max(pipeline['processed'], 1)
+    taiga_calls = taiga.stats()
+    return {
+        'webhooks': len(run['responses']),
+        'responses': dict(Counter(status for status, _ in run['responses'])),
+        'processed': pipeline['processed'],
+        'failed': pipeline['failed'],
+        'ingress_per_s': round(run['accepted'] / run['send_seconds'], 1),
+        'end_to_end_per_s': round(pipeline['processed'] / run['total_seconds'], 1),
+        'response_p50_ms': round(percentile([s for _, s in run['responses']], 0.50) * 1000, 2),
+        'response_p95_ms': round(percentile([s for _, s in run['responses']], 0.95) * 1000, 2),
+        'ack_to_post_p50_s': pipeline['ack_to_post_p50'],
+        'ack_to_post_p95_s': pipeline['ack_to_post_p95'],
+        'discord_calls_per_webhook': round(run['discord']['total'] / processed, 2),
+        'discord_calls': run['discord']['calls'],
+        'taiga_calls_per_webhook': round((taiga_calls['total'] - startup_calls) / processed, 2),
+        'taiga_calls': taiga_calls['calls'],
+        'taiga_errors': taiga_calls['errors'],
+        'debounce': pipeline['debounce'],
+        'task_digests': bot.digest_throttle.stats(),
+        'outbox': run['outbox'],
+    }
+
+
+def main(argv=None):
+    """Start the fakes and the bot's endpoint, send the webhooks and report"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--webhooks', type=int, default=2000, help='Webhooks to send (default 2000)')
+    parser.add_argument('--stories', type=int, default=200,
+                        help='Distinct user stories the webhooks are spread over (default 200)')
+    parser.add_argument('--concurrency', type=int, default=16,
+                        help='Concurrent webhook senders (default 16)')
+    parser.add_argument('--workers', type=int, default=4, help='WEBHOOK_WORKERS (default 4)')
+    parser.add_argument('--taiga-latency', type=float, default=0.02,
+                        help='Mean seconds per Taiga call (default 0.02)')
+    parser.add_argument('--taiga-error-rate', type=float, default=0.0,
+                        help='Fraction of Taiga GETs answered with a 500 (default 0)')
+    parser.add_argument('--discord-latency', type=float, default=0.05,
+                        help='Mean seconds per Discord call (default 0.05)')
+    parser.add_argument('--debounce', type=float, default=3.0,
+                        help='STORY_DEBOUNCE_WINDOW (default 3)')
+    parser.add_argument('--digest-interval', type=float, default=2.0,
+                        help='TASK_DIGEST_INTERVAL (default 2)')
+    parser.add_argument('--split', action='store_true',
+                        help='Post through the outbox like separate ingress and sender processes')
+    parser.add_argument('--port', type=int, default=5055, help='Port of the webhook endpoint')
+    parser.add_argument('--timeout', type=float, default=300,
+                        help='Seconds to wait for the queue to drain (default 300)')
+    parser.add_argument('--verbose', action='store_true', help="Show the bot's own output")
+    parser.add_argument('--json', help='Write the results to this file')
+    args = parser.parse_args(argv)
+
+    taiga = FakeTaiga(latency=args.taiga_latency, error_rate=args.taiga_error_rate).start()
+    configure(args, taiga)
+    webhooks = generate(args.webhooks, args.stories, SECRET)
+
+    output = sys.stdout if args.verbose else open(os.devnull, 'w', encoding='utf-8') # pylint: disable=consider-using-with
+    if not args.verbose:
+        # Waitress warns about its task queue on every burst
+        logging.getLogger('waitress').setLevel(logging.ERROR)
+    with contextlib.redirect_stdout(output):
+        bot = importlib.import_module('main')
+        if args.verbose:
+            importlib.import_module('handlers.log').setup_logging()
+        from waitress import create_server # pylint: disable=import-outside-toplevel
+        server = create_server(bot.app, host='127.0.0.1', port=args.port, threads=8)
+        threading.Thread(target=server.run, daemon=True).start()
+        bot.initialize_taiga_api()
+        startup_calls = taiga.stats()['total']
+        run = asyncio.run(drive(bot, args, f'http://127.0.0.1:{args.port}/webhook', webhooks))
+        server.close()
+    results = summarize(run, bot, taiga, startup_calls)
+
+    for name, value in results.items():
+        print(f'{name:<28}{value}')
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump({'arguments': vars(args), 'results': results}, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Signed Taiga webhook generator
+"""
+import copy
+import hashlib
+import hmac
+import json
+import random
+from benchmarks.corpus import CORPUS, TASKS
+
+# Relative frequency of each corpus payload in the generated stream
+SCENARIO_WEIGHTS = {
+    'create': 2,
+    'comment': 6,
+    'comment_edit': 1,
+    'status': 4,
+    'swimlane': 1,
+    'due_date': 1,
+    'blocked': 1,
+    'description_diff': 2,
+    'long_description': 1,
+    'large_watchers': 1,
+    'delete': 0.5,
+    'task_create': 2,
+    'task_status': 4,
+    'task_done': 2,
+    'task_delete': 0.5,
+}
+# Tasks per user story the task webhooks are spread over
+TASKS_PER_STORY = 6
+
+
+def sign(secret, body):
+    """Sign a body like Taiga does, the HMAC-SHA1 hex digest checked by handlers.ingress"""
+    return hmac.new(secret.encode('utf-8'), msg=body, digestmod=hashlib.sha1).hexdigest()
+
+
+def generate(count, stories, secret, seed=0):
+    """Build signed webhooks spread over a number of user stories
+
+    Args:
+        count: value[int]: Number of webhooks
+        stories: value[int]: Number of distinct user stories
+        secret: value[str]: SECRET_KEY of the bot under test
+        seed: Optional[value[int]]: Seed for the scenario mix
+
+    Returns:
+        list: (body, headers) tuples ready to POST
+    """
+    rng = random.Random(seed)
+    scenarios = list(SCENARIO_WEIGHTS)
+    weights = list(SCENARIO_WEIGHTS.values())
+    webhooks = []
+    for index in range(count):
+        story_id = index % stories + 1
+        scenario = rng.choices(scenarios, weights)[0]
+        if scenario in TASKS:
+            payload = copy.deepcopy(TASKS[scenario])
+            task_id = story_id * 100 + rng.randrange(TASKS_PER_STORY)
+            payload['data'].update(id=task_id, ref=task_id, subject=f'Load test task {task_id}')
+            payload['data']['user_story'].update(
+                id=story_id, ref=story_id, subject=f'Load test story {story_id}')
+        else:
+            payload = copy.deepcopy(CORPUS[scenario])
+            payload['data'].update(
+                id=story_id, ref=story_id, subject=f'Load test story {story_id}')
+        body = json.dumps(payload).encode('utf-8')
+        webhooks.append((body, {
+            'Content-Type': 'application/json',
+            'X-Taiga-Webhook-Signature': sign(secret, body),
+        }))
+    return webhooks
@@ -5,96 +5,269 @@ This module handles webhook processing, API calls
 message formatting, and Discord communication.
 """
 import threading
-import hmac
-import hashlib
 import asyncio
+import logging
+import sqlite3
+from functools import partial
 import discord
 import requests # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
 from discord import (
     Intents,
     Client
 )
-from flask import Flask, request, abort
+from flask import Flask, request, abort, jsonify, Response
 from waitress import serve
 from handlers.data_handler import ( # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
-    process_webhook,
+    process_webhook_async,
     forum_tags
 )
 from handlers.taiga_api_auth import taiga_auth # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+from handlers.http_session import taiga_session # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+from handlers.webhook_pipeline import webhook_pipeline # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+from handlers.mention_cache import mention_cache # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+from handlers.history_cache import history_cache # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+from handlers.task_digest import task_board, digest_throttle # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+from handlers.description_store import description_store # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+from handlers.member_index import member_index # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+from handlers.thread_index import thread_index, parse_ref, fingerprint, embed_fingerprint # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+from handlers.project_index import project_index # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+from handlers.project_routes import project_routes, payload_project_id # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+from handlers.outbox import outbox, outbox_sender # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+from handlers.warmup import warmup # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+from handlers.ingress import signature_valid, parse_payload # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+from handlers.log import ( # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+    setup_logging,
+    correlation_id,
+    new_correlation_id
+)
+from handlers.metrics import ( # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+    registry as metrics_registry,
+    signature_seconds,
+    webhooks_total
+)
+from handlers.discord_scheduler import ( # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
+    discord_scheduler,
+    PRIORITY_STATUS,
+    PRIORITY_THREAD,
+    PRIORITY_CHANGE
+)
 from config.config import(  # pylint: disable=import-error # pyright: ignore[reportMissingModuleSource]
     DISCORD_TOKEN as TOKEN,
-    FORUM_ID,
-    SECRET_KEY,
-    WEBHOOK_ROUTE)
+    BOT_ROLE,
+    WEBHOOK_ROUTE,
+    WEBHOOK_MAX_BODY_SIZE)
+
+logger = logging.getLogger(__name__)
 
 # Create a Flask app
 app = Flask(__name__)
+# Larger bodies are answered with 413 before they are read
+app.config['MAX_CONTENT_LENGTH'] = WEBHOOK_MAX_BODY_SIZE
 
 def initialize_taiga_api():
-    """Initialize the Taiga API"""
-    print("Initializing Taiga API...")
+    """Initialize the Taiga API
+
+    Returns:
+        bool: True if a token was obtained
+    """
+    logger.info("Initializing Taiga API...")
     try:
         api_token = taiga_auth.get_token()
         if api_token:
-            print("Taiga API initialized!")
-        else:
-            print("Failed to obtain authentication token!")
-            print("Ensure TAIGA_USERNAME and TAIGA_PASSWORD are set in the environment variables")
+            logger.info("Taiga API initialized!")
+            return True
+        logger.error("Failed to obtain authentication token!")
+        logger.error("Ensure TAIGA_USERNAME and TAIGA_PASSWORD are set in the environment variables")
     except (requests.RequestException, ValueError, KeyError) as e:
         # Handle specific exceptions as e:
-        print(f"Error during authentication test: {e}")
+        logger.error("Error during authentication test: %s", e)
+    return False
 
 
 # Bot setup
 intents: Intents = Intents.default()
 intents.members = True
-client: Client = Client(intents=intents)
+client: Client = Client(intents=intents, http_trace=discord_scheduler.trace_config())
+
 
+@app.before_request
+def bind_correlation_id():
+    """Tag the log lines of each request with a new correlation id"""
+    correlation_id.set(new_correlation_id())
 
-# Webhook listener
+
+@app.teardown_request
+def unbind_correlation_id(_error=None):
+    """Stop tagging log lines of the waitress thread once the request is done"""
+    correlation_id.set(None)
+
+
+# Webhook listener, the default route and one route per project
 @app.route(WEBHOOK_ROUTE or '/webhook', methods=['POST'])
-def respond():
-    """Catch headers and payload, verify signature and pass payload along if verified"""
-    headers = dict(request.headers)
-    if 'X-Taiga-Webhook-Signature' not in headers:
-        print("Missing X-Taiga-Webhook-Signature header")
+@app.route(f"{(WEBHOOK_ROUTE or '/webhook').rstrip('/')}/<int:project_id>", methods=['POST'])
+def respond(project_id=None):
+    """Verify the signature over the raw body with the project's secret, then parse it once and queue it"""
+    route = project_routes.for_webhook(project_id)
+    if route is None or BOT_ROLE == 'sender':
+        logger.warning("No route for Taiga project %s", project_id)
+        abort(404)
+    signature = request.headers.get('X-Taiga-Webhook-Signature')
+    if signature is None:
+        logger.warning("Missing X-Taiga-Webhook-Signature header")
         abort(401)
-    signature = headers['X-Taiga-Webhook-Signature']
-    raw_data = request.get_data().decode('utf-8')
-    valid = verify_signature(SECRET_KEY, raw_data) == signature
-    payload = request.json
-    if valid:
-        print("Attempting to process webhook...")
-        thread, embed, embed2, flags = process_webhook(payload)
-        if isinstance(flags, dict) and 'is_test' in flags and flags['is_test']:
-            print("Test Webhook - Ignoring")
-            return '', 200
-        if isinstance(flags, dict) and 'delete' in flags and flags['delete']:
-            client.loop.create_task(delete_post(flags['user_story']))
-            return '', 200
-        if isinstance(flags, dict) and 'error' in flags and flags['error']:
-            print(f"Webhook - Error {flags['error']}")
-            return '', 500
-        post_args = {
-            'user_story': flags['user_story'], # pylint: disable=invalid-sequence-index
-            'embed': embed,
-            'embed2': embed2,
-            'new_thread': thread,
-            'description_new': flags['description_new'], # pylint: disable=invalid-sequence-index
-            'mention': flags['mention'] if 'mention' in flags else []
-            }
-
-        client.loop.create_task(send_post(**post_args))
-        return '', 200
-    else:
-        print("Signature verification failed")
+    body = request.get_data(cache=False)
+    with signature_seconds.time():
+        valid = signature_valid(body, signature, route.secret_key)
+    if not valid:
+        # Rejected before any JSON parsing
+        logger.warning("Signature verification failed")
         abort(401)
+    try:
+        payload = parse_payload(body)
+    except ValueError as e:
+        logger.warning("Malformed webhook body: %s", e)
+        abort(400)
+    if not project_routes.serves(route, payload_project_id(payload)):
+        # Signed with one route's secret, but about a project routed elsewhere
+        logger.warning("Webhook for project %s posted to the route of project %s",
+                       payload_project_id(payload), project_id or 'default')
+        abort(403)
+    webhooks_total.inc(
+        type=payload.get('type', 'unknown'), action=payload.get('action', 'unknown'))
+    logger.info("Queueing %s %s webhook...", payload.get('type'), payload.get('action'))
+    if BOT_ROLE == 'ingress':
+        if not queue_webhook(body, route.project_id):
+            return '', 503
+    elif not webhook_pipeline.submit(payload, body, correlation_id.get(), route.project_id):
+        logger.warning("Webhook queue full or not running - Rejecting")
+        return '', 503
+    return '', 202, {'X-Correlation-Id': correlation_id.get()}
+
+
+def queue_webhook(body, route_id):
+    """Leave a verified webhook in the outbox for the sender, in the order webhooks are accepted
+
+    Returns:
+        bool: False if the webhook could not be written
+    """
+    try:
+        outbox.put(body, correlation_id.get(), route_id)
+    except sqlite3.Error as e:
+        logger.error("Writing the webhook to the outbox failed - Rejecting: %s", e)
+        return False
+    return True
+
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    """Report queue depth, latency and cache counters"""
+    return jsonify({
+        'pipeline': webhook_pipeline.stats(),
+        'auth': taiga_auth.stats(),
+        'http': taiga_session.stats(),
+        'mentions': mention_cache.stats(),
+        'history': history_cache.stats(),
+        'descriptions': description_store.stats(),
+        'tasks': task_board.stats(),
+        'task_digests': digest_throttle.stats(),
+        'members': member_index.stats(),
+        'threads': thread_index.stats(),
+        'projects': project_index.stats(),
+        'routes': project_routes.stats(),
+        'forum_tags': forum_tags.stats(),
+        'warmup': warmup.stats(),
+        'discord': discord_scheduler.stats(),
+        'outbox': (outbox_sender.stats() if outbox_sender is not None
+                   else outbox.stats() if outbox is not None else None),
+    })
+
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Answer 200 once the startup warm-up finished and webhooks are handled, 503 before"""
+    return jsonify(warmup.stats()), 200 if warmup.ready else 503
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Expose timings and error counters in the Prometheus text format"""
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+async def render_webhook(payload, route_id):
+    """Turn a verified webhook into a post for the forum of the route it was verified against
 
+    Args:
+        payload: value[dict]: The parsed webhook
+        route_id: value[int|None]: Project id of the route, None for the default route
 
-def verify_signature(key, data):
-    """Verify signature with key"""
-    mac = hmac.new(key.encode("utf-8"), msg=data.encode("utf8"), digestmod=hashlib.sha1)
-    return mac.hexdigest()
+    Returns:
+        dict|None: The send_post, delete_post or update_digest arguments,
+            None if nothing is posted
+    """
+    route = project_routes.for_webhook(route_id)
+    if route is None or not project_routes.serves(route, payload_project_id(payload)):
+        # Routes changed since the webhook was queued
+        logger.error("No forum routed for Taiga project %s on route %s - Ignoring",
+                     payload_project_id(payload), route_id or 'default')
+        return None
+    thread, embed, embed2, flags = await process_webhook_async(payload)
+    if isinstance(flags, dict) and 'is_test' in flags and flags['is_test']:
+        logger.info("Test Webhook - Ignoring")
+        return None
+    if isinstance(flags, dict) and flags.get('ignore'):
+        return None
+    if isinstance(flags, dict) and flags.get('digest'):
+        return {'digest': True, 'checklists': [
+            {'forum_id': route.forum_id, **checklist} for checklist in flags['checklists']]}
+    if isinstance(flags, dict) and 'delete' in flags and flags['delete']:
+        return {'delete': True, 'forum_id': route.forum_id,
+                'story_id': flags['story_id'], 'ref': flags['ref']}
+    if isinstance(flags, dict) and 'error' in flags and flags['error']:
+        logger.error("Webhook - Error %s", flags['error'])
+        return None
+    return {
+        'forum_id': route.forum_id,
+        'user_story': flags['user_story'], # pylint: disable=invalid-sequence-index
+        'story_id': flags['story_id'], # pylint: disable=invalid-sequence-index
+        'ref': flags['ref'], # pylint: disable=invalid-sequence-index
+        'embed': embed,
+        'embed2': embed2,
+        'new_thread': thread,
+        'description_new': flags['description_new'], # pylint: disable=invalid-sequence-index
+        'mention': flags['mention'] if 'mention' in flags else []
+        }
+
+
+async def deliver(post):
+    """Apply a post from render_webhook to Discord
+
+    Returns:
+        asyncio.Future|None: For task checklists, done once they were applied
+    """
+    if post.get('delete'):
+        await delete_post(post['forum_id'], post['story_id'], post['ref'])
+        return None
+    if post.get('digest'):
+        # Task checklists are merged and edited at most once per TASK_DIGEST_INTERVAL,
+        # a task moved to another user story changes the checklists of both
+        return asyncio.gather(*(digest_throttle.submit(checklist, update_digest)
+                                for checklist in post['checklists']))
+    await send_post(**post)
+    return None
+
+
+async def handle_webhook(payload, route_id):
+    """Process a verified webhook on the bot's event loop and relay it to Discord
+
+    Returns:
+        asyncio.Future|None: For task webhooks, done once their checklist was
+            applied, the pipeline acknowledges them only then
+    """
+    post = await render_webhook(payload, route_id)
+    if post is None:
+        return None
+    return await deliver(post)
 
 
 def run_flask():
@@ -102,110 +275,210 @@ def run_flask():
     serve(app, host='0.0.0.0', port=5000)
 
 # MESSAGE FUNCTIONALITY
-async def delete_post(user_story):
+async def find_thread(channel, story_id, ref):
+    """Find the forum thread of a user story through the thread index
+
+    Archived threads are not in the channel cache and are fetched by id.
+    """
+    thread_id = thread_index.get(story_id, channel.id, ref)
+    if thread_id is None:
+        return None
+    thread = channel.get_thread(thread_id)
+    if thread is None:
+        try:
+            thread = await client.fetch_channel(thread_id)
+        except discord.NotFound:
+            logger.info('Indexed Forum Post no longer exists...')
+            thread_index.remove(thread_id)
+            return None
+    return thread
+
+async def delete_post(forum_id, story_id, ref):
     """Try to delete a post from the indicated forum via bot"""
-    print('Attempting to delete Forum Post...')
-    channel = client.get_channel(FORUM_ID)
+    logger.info('Attempting to delete Forum Post...')
+    channel = client.get_channel(forum_id)
     if isinstance(channel, discord.ForumChannel):
-        for thread in channel.threads:
-            if thread.name.lower() == user_story.lower():
-                await thread.delete()
-                print('Forum Post deleted in Discord...')
-                return
+        thread = await find_thread(channel, story_id, ref)
+        if thread is not None:
+            await discord_scheduler.run(
+                thread.id, 'DELETE', f'/channels/{thread.id}', PRIORITY_THREAD, thread.delete)
+            thread_index.remove(thread.id)
+            logger.info('Forum Post deleted in Discord...')
 
-async def send_post(user_story, embed, embed2, new_thread=None, description_new=None, mention=None):
+async def send_post(forum_id, user_story, story_id, ref, embed, embed2, # pylint: disable=too-many-arguments
+                    new_thread=None, description_new=None, mention=None):
     """Try to send provided message to the indicated forum via bot"""
-    is_thread = False
-    if len(mention) == 1 and mention[0] is None:
-        print('No mentions found')
-    else:
-        mention = await build_mentions(mention)
+    channel = client.get_channel(forum_id)
+    if not isinstance(channel, discord.ForumChannel):
+        logger.error('Forum Channel not found...')
+        return
+    mention = await build_mentions(channel.guild.id, mention)
     try:
-        print('Sending Forum Post to Discord...')
-        channel = client.get_channel(FORUM_ID)
-        # Get the applied tags from the new_thread if they exist
-        tag_ids = new_thread.get('applied_tags', [])
-        # Convert tag IDs to actual forum tag objects
-        applied_tags = [tag for tag in channel.available_tags if tag.id in tag_ids]
-        if isinstance(channel, discord.ForumChannel):
-            for thread in channel.threads:
-                if thread.name.lower() == user_story.lower():
-                    print('Attempting to update Forum Post...')
-                    await thread.edit(applied_tags=applied_tags)
-                    if description_new is not None:
-                        async for message in thread.history(limit=1, oldest_first=True):
-                            await message.edit(content=new_thread['content'], suppress=True)
+        logger.debug('Sending Forum Post to Discord...')
+        # Get the forum tag of the story's swimlane if it has one
+        swimlane = new_thread.get('swimlane')
+        tag_id = None
+        if swimlane:
+            tag_id = await forum_tags.lookup(forum_id, swimlane, client.fetch_channel)
+            if tag_id is None:
+                logger.debug('No forum tag named %s', swimlane)
+        # Convert the tag ID to the actual forum tag object
+        applied_tags = [tag for tag in channel.available_tags if tag.id == tag_id]
+        # Fingerprints of what each write shows, a write is skipped when it would change nothing
+        thread_print = fingerprint(sorted(tag.id for tag in applied_tags))
+        status_print = embed_fingerprint(embed2)
+        starter_print = fingerprint(new_thread['content'])
+        thread = await find_thread(channel, story_id, ref)
+        if thread is not None:
+            logger.debug('Attempting to update Forum Post...')
+            last_thread_print, last_status_print, last_starter_print = \
+                thread_index.fingerprints(thread.id)
+            thread_edits = {'applied_tags': applied_tags}
+            if thread.archived:
+                thread_edits['archived'] = False
+            if thread.name != user_story[:100]:
+                # The story was renamed in Taiga
+                thread_edits['name'] = user_story[:100]
+            if len(thread_edits) > 1 or thread_print != last_thread_print:
+                await discord_scheduler.run(
+                    thread.id, 'PATCH', f'/channels/{thread.id}', PRIORITY_THREAD,
+                    partial(thread.edit, **thread_edits))
+                thread_index.set_fingerprints(thread.id, thread=thread_print)
+            else:
+                thread_index.suppress('thread')
+            starter_id, status_id, pinned = thread_index.messages(thread.id)
+            if description_new is not None and starter_print == last_starter_print:
+                thread_index.suppress('starter')
+            elif description_new is not None:
+                # A forum thread's starter message shares the thread's id.
+                # Edits keep the embed suppression set when it was created.
+                starter = thread.get_partial_message(starter_id or thread.id)
+                await discord_scheduler.run(
+                    thread.id, 'PATCH', f'/channels/{thread.id}/messages/{starter.id}',
+                    PRIORITY_THREAD, partial(starter.edit, content=new_thread['content']))
+                thread_index.set_fingerprints(thread.id, starter=starter_print)
+            try:
+                if status_id is None:
+                    # Older threads: locate the status embed by position once
+                    messages = [message async for message in
+                    thread.history(limit=3, oldest_first=True)]
+                    if len(messages) >= 3:
+                        status_id = messages[2].id
+                        thread_index.set_messages(
+                            thread.id, starter_id=messages[0].id, status_id=status_id)
+                if status_id is not None:
+                    status_embed = thread.get_partial_message(status_id)
                     try:
-                        messages = [message async for message in
-                        thread.history(limit=3, oldest_first=True)]
-                        if len(messages) >= 3:
-                            #first_message = messages[0]
-                            #print(f"Message type: {first_message.type}, Author: "
-                            #f"{first_message.author}, System: {first_message.is_system()}")
-                            await messages[2].edit(embed=embed2)
-                            await messages[2].pin()
-                            await thread.send(f'{mention}', embed=embed)
+                        if status_print == last_status_print:
+                            thread_index.suppress('status')
                         else:
-                            await thread.send(embed=embed2)
-                            await asyncio.sleep(5)
-                            await thread.send(embed=embed)
-                    except discord.Forbidden as e:
-                        print(f"Forbidden error: {e}")
-                        #print(f"Message details: ID={first_message.id}, Type={first_message.type}")
-                    print('Forum Post updated in Discord...')
-                    is_thread = True
-                    return
-            if not is_thread:
-                print('Creating new Forum Post...')
-                thread_with_message = await channel.create_thread(
-                    name=new_thread['name'],
-                    content=new_thread['content'],
-                    auto_archive_duration=new_thread['auto_archive_duration'],
-                    applied_tags=applied_tags,
-                    suppress_embeds=True
-                )
-
-                try:
-                    await thread_with_message.message.pin()
-                    print('Forum Post created and pinned in Discord...')
-                except discord.Forbidden:
-                    print('Forum Post created in Discord...'
-                          '(Could not pin message - Missing Manage Messages permission)')
-
-                status_embed = await thread_with_message.thread.send(embed=embed2)
-                print('Post status embed in new thread.')
-
-                try:
-                    await status_embed.pin()
-                    print('Status embed posted and pinned in Discord...')
-                except discord.Forbidden:
-                    print('Status embed created in Discord...'
-                          '(Could not pin message - Missing Manage Messages permission)')
-
-                # Post the change embed in the new thread
-                if embed:
-                    await asyncio.sleep(5)
-                    await thread_with_message.thread.send(embed=embed)
-                    print('Change embed posted in new thread...')
-        else:
-            print('Forum Channel not found...')
+                            await discord_scheduler.run(
+                                thread.id, 'PATCH',
+                                f'/channels/{thread.id}/messages/{status_id}',
+                                PRIORITY_STATUS, partial(status_embed.edit, embed=embed2))
+                            thread_index.set_fingerprints(thread.id, status=status_print)
+                    except discord.NotFound:
+                        logger.info('Status embed was deleted, posting a new one...')
+                        thread_index.forget_status(thread.id)
+                        status_id = None
+                if status_id is not None:
+                    if not pinned:
+                        await discord_scheduler.run(
+                            thread.id, 'PUT', f'/channels/{thread.id}/pins/{status_id}',
+                            PRIORITY_STATUS, status_embed.pin)
+                        thread_index.set_messages(thread.id, pinned=True)
+                    await discord_scheduler.run(
+                        thread.id, 'POST', f'/channels/{thread.id}/messages', PRIORITY_CHANGE,
+                        partial(thread.send, f'{mention}', embed=embed))
+                else:
+                    status_embed = await discord_scheduler.run(
+                        thread.id, 'POST', f'/channels/{thread.id}/messages', PRIORITY_STATUS,
+                        partial(thread.send, embed=embed2))
+                    thread_index.set_messages(thread.id, status_id=status_embed.id)
+                    thread_index.set_fingerprints(thread.id, status=status_print)
+                    try:
+                        await discord_scheduler.run(
+                            thread.id, 'PUT', f'/channels/{thread.id}/pins/{status_embed.id}',
+                            PRIORITY_STATUS, status_embed.pin)
+                        thread_index.set_messages(thread.id, pinned=True)
+                    except discord.Forbidden:
+                        logger.warning('Status embed posted in Discord...'
+                                       '(Could not pin message - Missing Manage Messages permission)')
+                    await discord_scheduler.run(
+                        thread.id, 'POST', f'/channels/{thread.id}/messages', PRIORITY_CHANGE,
+                        partial(thread.send, f'{mention}', embed=embed))
+            except discord.Forbidden as e:
+                logger.error("Forbidden error: %s", e)
+            logger.info('Forum Post updated in Discord...')
+            return
+        if thread is None:
+            logger.debug('Creating new Forum Post...')
+            thread_with_message = await discord_scheduler.run(
+                channel.id, 'POST', f'/channels/{channel.id}/threads', PRIORITY_THREAD,
+                partial(channel.create_thread,
+                        name=new_thread['name'],
+                        content=new_thread['content'],
+                        auto_archive_duration=new_thread['auto_archive_duration'],
+                        applied_tags=applied_tags,
+                        suppress_embeds=True))
+            new_thread_id = thread_with_message.thread.id
+            thread_index.put(new_thread_id, channel.id, story_id, ref)
+            thread_index.set_messages(
+                new_thread_id, starter_id=thread_with_message.message.id)
+            thread_index.set_fingerprints(
+                new_thread_id, thread=thread_print, starter=starter_print)
+
+            try:
+                await discord_scheduler.run(
+                    new_thread_id, 'PUT',
+                    f'/channels/{new_thread_id}/pins/{thread_with_message.message.id}',
+                    PRIORITY_THREAD, thread_with_message.message.pin)
+                logger.info('Forum Post created and pinned in Discord...')
+            except discord.Forbidden:
+                logger.warning('Forum Post created in Discord...'
+                               '(Could not pin message - Missing Manage Messages permission)')
+
+            status_embed = await discord_scheduler.run(
+                new_thread_id, 'POST', f'/channels/{new_thread_id}/messages', PRIORITY_STATUS,
+                partial(thread_with_message.thread.send, embed=embed2))
+            thread_index.set_messages(new_thread_id, status_id=status_embed.id)
+            thread_index.set_fingerprints(new_thread_id, status=status_print)
+            logger.debug('Post status embed in new thread.')
+
+            try:
+                await discord_scheduler.run(
+                    new_thread_id, 'PUT', f'/channels/{new_thread_id}/pins/{status_embed.id}',
+                    PRIORITY_STATUS, status_embed.pin)
+                thread_index.set_messages(new_thread_id, pinned=True)
+                logger.debug('Status embed posted and pinned in Discord...')
+            except discord.Forbidden:
+                logger.warning('Status embed created in Discord...'
+                               '(Could not pin message - Missing Manage Messages permission)')
+
+            # Post the change embed in the new thread
+            if embed:
+                await discord_scheduler.run(
+                    new_thread_id, 'POST', f'/channels/{new_thread_id}/messages',
+                    PRIORITY_CHANGE, partial(thread_with_message.thread.send, embed=embed))
+                logger.debug('Change embed posted in new thread...')
     except (discord.HTTPException, discord.Forbidden, discord.NotFound) as e:
-        print(f'Discord API error: {e}')
+        logger.error('Discord API error: %s', e)
 
-async def build_mentions(mentions):
-    """Builds a list of mentions from a list of user IDs"""
-    channel = await client.fetch_channel(FORUM_ID)
-    print('Building mentions...')
+async def build_mentions(guild_id, mentions):
+    """Builds a mention string from a list of (taiga_user_id, mention_name) for a guild"""
+    logger.debug('Building mentions...')
     mention_string = ''
-    for user_id in mentions:
-        user = next(
-            (member for member in channel.guild.members
-            if member.name.lower() == user_id.lower()), None
-            )
-        if not user:
-            print(f"User {user_id} not found for mention.")
+    for taiga_user_id, name in mentions:
+        member_id = mention_cache.member_id(taiga_user_id, guild_id)
+        if member_id is None or not member_index.contains(guild_id, member_id):
+            member_id = member_index.get(guild_id, name)
+        if member_id is None:
+            logger.info("User %s not found for mention.", name)
+            # The bio may have changed, fetch it from Taiga again next time
+            mention_cache.invalidate(taiga_user_id)
             continue
-        mention_string += f'{user.mention}'
+        mention_cache.set_member(taiga_user_id, guild_id, member_id)
+        mention_string += f'<@{member_id}>'
     return mention_string
 
 async def get_members(forum_id: int):
@@ -214,54 +487,204 @@ async def get_members(forum_id: int):
     members = []
     async for member in channel.guild.fetch_members():
         members.append(member)
-    print("Members fetched:", [member.name for member in members])
+    logger.debug("Members fetched: %s", [member.name for member in members])
     return
 
-async def get_forum_tags(forum_id: int):
-    """Fetches available forum tags and stores them in a dataclass with a dictionary."""
-    forum = await client.fetch_channel(forum_id)  # Fetch the forum channel
-
-    if not isinstance(forum, discord.ForumChannel):
-        print("This is not a forum channel!")
-        return
-
-    # Create a dictionary {tag_name: tag_id}
-    tags_dict = {tag.name: tag.id for tag in forum.available_tags}
-
-    # Store in the dataclass forum_tags
-    forum_tags.tags = tags_dict
-    #print("Forum tags updated:", forum_tags.tags)
+async def load_forum_tags(forums):
+    """Store the tags of the forums from the gateway cache, without fetching them"""
+    for forum in forums:
+        forum_tags.update(forum)
 
 
-async def update_forum_tags_periodically():
-    """Updates forum tags every 5 minutes"""
-    while True:
-        await get_forum_tags(FORUM_ID)
-        await asyncio.sleep(300)  # Sleep for 5 minutes (300 seconds)
+@client.event
+async def on_guild_channel_update(before, after) -> None:
+    """Keep the tags of routed forums current as they are edited in Discord"""
+    if (isinstance(after, discord.ForumChannel)
+            and project_routes.for_forum(after.id) is not None):
+        forum_tags.update(after)
+        if before.available_tags != after.available_tags:
+            logger.info("Tags of forum %s updated", after.id)
 
 
 # HANDLING THE STARTUP FOR BOT
 @client.event
 async def on_ready() -> None:
     """Print verification to console that bot is running"""
-    print(f'{client.user} is now running')
-    # Initial tags fetch
-    await get_forum_tags(FORUM_ID)
-    # Start periodic updates
-    client.loop.create_task(update_forum_tags_periodically())
+    logger.info('%s is now running', client.user)
+    if warmup.started:
+        # A reconnect, rebuilding the thread index now could drop threads being posted
+        logger.info("Reconnected, keeping the warm-up data")
+        return
+    forums = []
+    for route in project_routes.routes():
+        forum = client.get_channel(route.forum_id)
+        if forum is None:
+            logger.error("Forum %s not found", route.forum_id)
+            continue
+        forums.append(forum)
+    await warmup.run({
+        'forum_tags': load_forum_tags(forums),
+        'members': load_members(forums),
+        'threads': asyncio.gather(*(rebuild_thread_index(forum) for forum in forums)),
+        'auth': load_token(),
+        'projects': load_projects(),
+    })
+    webhook_pipeline.start(handle_webhook)
+    if BOT_ROLE == 'sender':
+        # After the pipeline replayed the outbox rows left over from the last run
+        outbox_sender.start(webhook_pipeline)
+    warmup.mark_ready()
     #client.loop.create_task(get_members(FORUM_ID))
 
 
+async def load_projects():
+    """Load the metadata of every routed project into the project index, in parallel"""
+    await asyncio.gather(*(asyncio.to_thread(project_index.ensure_loaded, project_id)
+                           for project_id in project_routes.project_ids()))
+
+
+async def load_token():
+    """Obtain the Taiga API token before the first webhook needs it"""
+    if not await asyncio.to_thread(initialize_taiga_api):
+        raise RuntimeError("No Taiga API token")
+
+
+async def load_members(forums):
+    """Index the members of the guilds of the forums, forums of one guild share its index"""
+    guilds = {forum.guild.id: forum.guild for forum in forums}
+    for guild in guilds.values():
+        if not guild.chunked:
+            await guild.chunk()
+        member_index.rebuild(guild.id, guild.members)
+
+
+async def rebuild_thread_index(forum):
+    """Index every active and archived thread of the forum"""
+    threads = list(forum.threads)
+    async for thread in forum.archived_threads(limit=None):
+        threads.append(thread)
+    thread_index.rebuild(forum.id, threads)
+
+
+@client.event
+async def on_thread_create(thread) -> None:
+    """Index threads created in the forum"""
+    if project_routes.for_forum(thread.parent_id) is not None:
+        thread_index.put(thread.id, thread.parent_id, ref=parse_ref(thread.name))
+
+
+@client.event
+async def on_thread_update(before, after) -> None:
+    """Re-index forum threads whose name changed"""
+    if project_routes.for_forum(after.parent_id) is not None and before.name != after.name:
+        thread_index.put(after.id, after.parent_id, ref=parse_ref(after.name))
+
+
+async def update_digest(post):
+    """Post or edit in place the task checklist in the thread of a user story"""
+    channel = client.get_channel(post['forum_id'])
+    if not isinstance(channel, discord.ForumChannel):
+        logger.error('Forum Channel not found...')
+        return
+    thread = await find_thread(channel, post['story_id'], post['ref'])
+    if thread is None:
+        logger.info('No Forum Post for user story %s, task checklist not posted', post['story_id'])
+        return
+    embed = post['embed']
+    digest_id, last_digest_print = thread_index.digest(thread.id)
+    digest_print = embed_fingerprint(embed)
+    if digest_id is not None and digest_print == last_digest_print:
+        thread_index.suppress('digest')
+        return
+    try:
+        if thread.archived:
+            await discord_scheduler.run(
+                thread.id, 'PATCH', f'/channels/{thread.id}', PRIORITY_THREAD,
+                partial(thread.edit, archived=False))
+        if digest_id is not None:
+            digest = thread.get_partial_message(digest_id)
+            try:
+                await discord_scheduler.run(
+                    thread.id, 'PATCH', f'/channels/{thread.id}/messages/{digest_id}',
+                    PRIORITY_STATUS, partial(digest.edit, embed=embed))
+                thread_index.set_digest(thread.id, digest_id, digest_print)
+                logger.info('Task checklist updated in Discord...')
+                return
+            except discord.NotFound:
+                logger.info('Task checklist was deleted, posting a new one...')
+        digest = await discord_scheduler.run(
+            thread.id, 'POST', f'/channels/{thread.id}/messages', PRIORITY_STATUS,
+            partial(thread.send, embed=embed))
+        thread_index.set_digest(thread.id, digest.id, digest_print)
+        logger.info('Task checklist posted in Discord...')
+    except (discord.HTTPException, discord.Forbidden) as e:
+        logger.error('Discord API error: %s', e)
+
+@client.event
+async def on_guild_channel_pins_update(channel, _last_pin) -> None:
+    """Track whether a thread's status embed is still pinned after pins change"""
+    _, status_id, _ = thread_index.messages(channel.id)
+    if status_id is None:
+        return
+    try:
+        pins = await channel.pins()
+    except discord.HTTPException as e:
+        logger.warning('Could not read pins: %s', e)
+        return
+    thread_index.set_messages(
+        channel.id, pinned=any(message.id == status_id for message in pins))
+
+
+@client.event
+async def on_raw_thread_delete(payload) -> None:
+    """Drop deleted threads from the index, cached or not"""
+    thread_index.remove(payload.thread_id)
+
+
+@client.event
+async def on_member_join(member) -> None:
+    """Index new guild members for mentions"""
+    member_index.add(member.guild.id, member)
+
+
+@client.event
+async def on_member_update(_before, after) -> None:
+    """Keep the member index current"""
+    member_index.add(after.guild.id, after)
+
+
+@client.event
+async def on_user_update(before, after) -> None:
+    """Re-index members whose username changed"""
+    if before.name != after.name:
+        member_index.rename(after)
+
+
+@client.event
+async def on_member_remove(member) -> None:
+    """Drop members that left the guild from the member index"""
+    member_index.remove(member.guild.id, member.id)
+
+
 # MAIN ENTRY POINT
 def main() -> None:
     """Kick everything off"""
-    print('running client')
-    client.run(token=TOKEN)
+    if BOT_ROLE not in ('all', 'ingress', 'sender'):
+        raise ValueError("BOT_ROLE must be all, ingress or sender")
+    if BOT_ROLE == 'ingress':
+        logger.info('running ingress')
+        # Webhooks go straight to the outbox, there is nothing to warm up
+        warmup.mark_ready()
+        threading.Event().wait()
+        return
+    logger.info('running client')
+    # Without a handler of its own, discord.py logs through the root logger set up below
+    client.run(token=TOKEN, log_handler=None)
 
 
 if __name__ == '__main__':
+    setup_logging()
     flask_thread = threading.Thread(target=run_flask)
     flask_thread.daemon = True
     flask_thread.start()
-    initialize_taiga_api()
     main()